@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .env import bool_env, float_env
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[1] / "data" / ".cache" / "llm_cache.sqlite3"
+
+_WS_RE = re.compile(r"\s+")
+
+
+class ResponseCache:
+    """Two-level cache for LLM completions.
+
+    An in-memory LRU with a TTL sits in front of a SQLite table, so cached
+    answers survive restarts and are shared by every uvicorn worker that points
+    at the same file. Keys hash the model name, the whitespace-normalized
+    prompt and the kid-safe flag. Hit/miss counters are kept per endpoint label.
+    ``get_async``/``set_async`` serve the LRU inline and run SQLite in a worker
+    thread, so the event loop never waits on disk I/O or the SQLite lock.
+    """
+
+    def __init__(self, path: Optional[Path] = DEFAULT_CACHE_PATH, max_entries: int = 2048, ttl_seconds: float = 7 * 24 * 3600):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl_seconds
+        self._lru: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes the shared SQLite connection; never held with _lock
+        self._db_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._writes = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            try:
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(path), timeout=5.0, check_same_thread=False, isolation_level=None)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+                )
+            except sqlite3.Error as e:
+                print(f"LLM cache: disk store unavailable ({e}); using memory only")
+                self._db = None
+
+    @staticmethod
+    def make_key(model_name: str, prompt: str, kid_safe: bool) -> str:
+        normalized = _WS_RE.sub(" ", prompt).strip()
+        raw = json.dumps([model_name, normalized, bool(kid_safe)], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, endpoint: str, field: str) -> None:
+        counters = self._stats.setdefault(endpoint, {"hits": 0, "misses": 0})
+        counters[field] += 1
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return None
+            if now - entry[0] <= self.ttl:
+                self._lru.move_to_end(key)
+                return entry[1]
+            del self._lru[key]
+            return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or now - row[1] > self.ttl:
+            return None
+        with self._lock:
+            self._remember(key, row[1], row[0])
+        return row[0]
+
+    def _counted(self, endpoint: str, value: Optional[str]) -> Optional[str]:
+        with self._lock:
+            self._count(endpoint, "misses" if value is None else "hits")
+        return value
+
+    def get(self, key: str, endpoint: str = "generate") -> Optional[str]:
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None:
+            value = self._disk_get(key, now)
+        return self._counted(endpoint, value)
+
+    async def get_async(self, key: str, endpoint: str = "generate") -> Optional[str]:
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None and self._db is not None:
+            value = await asyncio.to_thread(self._disk_get, key, now)
+        return self._counted(endpoint, value)
+
+    def _remember(self, key: str, created: float, value: str) -> None:
+        self._lru[key] = (created, value)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def _disk_set(self, key: str, value: str, now: float) -> None:
+        if self._db is None:
+            return
+        with self._db_lock:
+            try:
+                self._db.execute("INSERT OR REPLACE INTO llm_cache (key, value, created) VALUES (?, ?, ?)", (key, value, now))
+                self._writes += 1
+                if self._writes % 256 == 0:
+                    self._db.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+            except sqlite3.Error as e:
+                print(f"LLM cache write failed: {e}")
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        self._disk_set(key, value, now)
+
+    async def set_async(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, value, now)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            per_endpoint = {k: dict(v) for k, v in self._stats.items()}
+            size = len(self._lru)
+        hits = sum(v["hits"] for v in per_endpoint.values())
+        misses = sum(v["misses"] for v in per_endpoint.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            "memory_entries": size,
+            "persistent": self._db is not None,
+            "endpoints": per_endpoint,
+        }
+
+
+def cache_bypassed(endpoint: str) -> bool:
+    """True if LLM_CACHE_BYPASS (comma-separated endpoint labels, or "*") lists ``endpoint``."""
+    raw = os.getenv("LLM_CACHE_BYPASS", "")
+    names = {x.strip() for x in raw.split(",") if x.strip()}
+    return "*" in names or endpoint in names
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide response cache configured from env, or None if LLM_CACHE=0.
+
+    LLM_CACHE_PATH (SQLite file, "" for memory only), LLM_CACHE_SIZE (LRU
+    entries) and LLM_CACHE_TTL (seconds) are read on first use.
+    """
+    global _cache
+    if not bool_env("LLM_CACHE", True):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path_env = os.getenv("LLM_CACHE_PATH")
+                path = DEFAULT_CACHE_PATH if path_env is None else (Path(path_env) if path_env.strip() else None)
+                _cache = ResponseCache(
+                    path=path,
+                    max_entries=int(float_env("LLM_CACHE_SIZE", 2048)),
+                    ttl_seconds=float_env("LLM_CACHE_TTL", 7 * 24 * 3600),
+                )
+    return _cache
@@ -1,8 +1,82 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from .llm import GeminiClient
+from .llm import GeminiClient, LLMRequest, get_gemini_client
+from .prompts import context_budget, context_lines
+
+_FIELDS = ("sinhala", "english", "transliteration", "pos", "example_si", "example_en")
+
+_ENTRY_KEYS = (
+    "{\"english\", \"sinhala\", \"transliteration\", \"pos\", \"definition_en\", \"examples_en\": [2], "
+    "\"explanation_si\", \"examples_si\": [2], \"synonyms_en\": [<=5], \"notes_si\"}"
+)
+
+
+def _input_fields(base: Dict[str, str]) -> Dict[str, str]:
+    return {k: (base.get(k) or "").strip() for k in _FIELDS}
+
+
+def _corpus_block(context_rows: Optional[List[Dict[str, str]]], endpoint: str, limit: int = 10,
+                  budget: Optional[int] = None) -> str:
+    # Build a compact corpus block, within the context token budget
+    rows = [it for it in context_rows or [] if (it.get("sinhala") or "").strip() or (it.get("english") or "").strip()]
+    return "\n".join(context_lines(rows, lambda c: f"- Sinhala: {c['sinhala']}\n  English: {c['english']}", endpoint, limit, budget))
+
+
+def headword_key(text: str) -> str:
+    """Store key for a headword: lowercased, whitespace-collapsed English text."""
+    return " ".join((text or "").lower().split())
+
+
+def entry_base(tf, fields: Dict[str, str], k: int = 8) -> Tuple[Dict[str, str], List[Dict[str, str]]]:
+    """Assemble the entry base from ``fields``, prefilled from the closest
+    dataset row, plus the ``k`` context rows used to ground the prompt."""
+    base = {f: (fields.get(f) or "").strip() for f in _FIELDS}
+    # If no direct fields given, try to find row from dataset by query
+    query = base["english"] or base["sinhala"]
+    ctx: List[Dict[str, str]] = []
+    if query:
+        ctx = tf.retrieve_context(query, k=k)
+        # Use the top context row to prefill any missing fields
+        if ctx:
+            top = ctx[0]
+            for f in _FIELDS:
+                if not base.get(f):
+                    base[f] = str(top.get(f, "") or "")
+    return base, ctx
+
+
+def moderation_text(entry: Dict[str, object]) -> str:
+    """The generated text of an entry, as sent to moderation."""
+    return "\n".join([
+        entry.get("definition_en", ""),
+        " ".join(entry.get("examples_en", [])),
+        entry.get("explanation_si", ""),
+        " ".join(entry.get("examples_si", [])),
+    ]).strip()
+
+
+def _clean_entry(data: Dict[str, object], fields: Dict[str, str]) -> Dict[str, object]:
+    # Ensure required keys exist
+    cleaned = {
+        "english": str(data.get("english", fields["english"])).strip(),
+        "sinhala": str(data.get("sinhala", fields["sinhala"])).strip(),
+        "transliteration": str(data.get("transliteration", fields["transliteration"])).strip(),
+        "pos": str(data.get("pos", fields["pos"])).strip(),
+        "definition_en": str(data.get("definition_en", "")).strip(),
+        "examples_en": list(data.get("examples_en", []))[:2],
+        "explanation_si": str(data.get("explanation_si", "")).strip(),
+        "examples_si": list(data.get("examples_si", []))[:2],
+        "synonyms_en": list(data.get("synonyms_en", []))[:5],
+        "notes_si": str(data.get("notes_si", "")).strip(),
+    }
+    # Coerce list items to strings
+    cleaned["examples_en"] = [str(x).strip() for x in cleaned["examples_en"] if str(x).strip()]
+    cleaned["examples_si"] = [str(x).strip() for x in cleaned["examples_si"] if str(x).strip()]
+    cleaned["synonyms_en"] = [str(x).strip() for x in cleaned["synonyms_en"] if str(x).strip()]
+    return cleaned
 
 
 class DictionaryEnricher:
@@ -10,89 +84,109 @@ class DictionaryEnricher:
         self.kid_safe = kid_safe
 
     def enrich(self, base: Dict[str, str], context_rows: Optional[List[Dict[str, str]]] = None, level: str = "A1/A2") -> Dict[str, object]:
-        si = (base.get("sinhala") or "").strip()
-        en = (base.get("english") or "").strip()
-        translit = (base.get("transliteration") or "").strip()
-        pos = (base.get("pos") or "").strip()
-        ex_si = (base.get("example_si") or "").strip()
-        ex_en = (base.get("example_en") or "").strip()
-
-        # Build a compact corpus block
-        corpus_lines: List[str] = []
-        if context_rows:
-            for it in context_rows[:10]:
-                _si = (it.get("sinhala") or "").strip()
-                _en = (it.get("english") or "").strip()
-                if _si or _en:
-                    corpus_lines.append(f"- Sinhala: {_si}\n  English: {_en}")
-        corpus_block = "\n".join(corpus_lines)
+        gem, req = self._request(base, context_rows, level)
+        return gem._run(req)
+
+    async def enrich_async(self, base: Dict[str, str], context_rows: Optional[List[Dict[str, str]]] = None, level: str = "A1/A2") -> Dict[str, object]:
+        gem, req = self._request(base, context_rows, level)
+        return await gem._run_async(req)
+
+    def enrich_many(self, items: Sequence[Tuple[Dict[str, str], Optional[List[Dict[str, str]]]]], level: str = "A1/A2") -> List[Optional[Dict[str, object]]]:
+        """Enrich several ``(base, context_rows)`` pairs with one prompt per batch.
+        Entries the batch reply drops are enriched one by one; None where that fails too."""
+        gem = get_gemini_client()
+
+        def single(item) -> Optional[Dict[str, object]]:
+            try:
+                return self.enrich(item[0], item[1], level)
+            except Exception:
+                return None
+
+        return gem._run_batched(items, lambda chunk: self._batch_request(gem, chunk, level), single)
+
+    async def enrich_many_async(self, items: Sequence[Tuple[Dict[str, str], Optional[List[Dict[str, str]]]]], level: str = "A1/A2") -> List[Optional[Dict[str, object]]]:
+        gem = get_gemini_client()
+
+        async def single(item) -> Optional[Dict[str, object]]:
+            try:
+                return await self.enrich_async(item[0], item[1], level)
+            except Exception:
+                return None
+
+        return await gem._run_batched_async(items, lambda chunk: self._batch_request(gem, chunk, level), single)
+
+    def _request(self, base: Dict[str, str], context_rows: Optional[List[Dict[str, str]]], level: str) -> Tuple[GeminiClient, LLMRequest]:
+        fields = _input_fields(base)
+        corpus_block = _corpus_block(context_rows, "dictionary_enrich")
 
         # Prompt for learner's dictionary entry
         guidance = (
             "Create a learner's dictionary entry for Sinhala learners of English. "
             "Focus on a single English headword (not a sentence). "
             "Use simple English at the specified CEFR level and keep it kid-friendly if requested. "
-            "Return STRICT JSON (no markdown) with keys: "
-            "{\"english\", \"sinhala\", \"transliteration\", \"pos\", \"definition_en\", \"examples_en\": [2], \"explanation_si\", \"examples_si\": [2], \"synonyms_en\": [<=5], \"notes_si\"}. "
+            f"Return STRICT JSON (no markdown) with keys: {_ENTRY_KEYS}. "
             "Make examples short and clear. If inputs are sentences, extract the headword."
         )
 
         pieces: List[str] = [guidance, f"\nLevel: {level}"]
         if corpus_block:
             pieces.append("\nUse this parallel corpus to stay consistent:\n" + corpus_block)
-        pieces.append("\nInput fields (may be noisy):\n" + str({
-            "sinhala": si,
-            "english": en,
-            "transliteration": translit,
-            "pos": pos,
-            "example_si": ex_si,
-            "example_en": ex_en,
-        }))
+        pieces.append("\nInput fields (may be noisy):\n" + str(fields))
         prompt = "\n".join(pieces)
 
-        gem = GeminiClient()
+        gem = get_gemini_client()
         if getattr(gem, "_kid_guidelines", None) and self.kid_safe:
             prompt = gem._kid_guidelines() + prompt  # reuse shared kid guidelines
 
-        if getattr(gem, "_provider", "v2") == "v2":
-            resp = gem._client.models.generate_content(model=gem.model_name, contents=prompt)
-            raw = (getattr(resp, "text", "") or "").strip()
-        else:
-            resp = gem._client.generate_content(prompt)
-            raw = (getattr(resp, "text", "") or "").strip()
+        # Routed through the shared client so responses hit the LLM response cache
+        return gem, LLMRequest(prompt, "dictionary_enrich", self.kid_safe, lambda raw: self._parse(gem, raw.strip(), fields))
 
-        import json
-        try:
-            data = json.loads(raw)
-            # Ensure required keys exist
-            cleaned = {
-                "english": str(data.get("english", en)).strip(),
-                "sinhala": str(data.get("sinhala", si)).strip(),
-                "transliteration": str(data.get("transliteration", translit)).strip(),
-                "pos": str(data.get("pos", pos)).strip(),
-                "definition_en": str(data.get("definition_en", "")).strip(),
-                "examples_en": list(data.get("examples_en", []))[:2],
-                "explanation_si": str(data.get("explanation_si", "")).strip(),
-                "examples_si": list(data.get("examples_si", []))[:2],
-                "synonyms_en": list(data.get("synonyms_en", []))[:5],
-                "notes_si": str(data.get("notes_si", "")).strip(),
-            }
-            # Coerce list items to strings
-            cleaned["examples_en"] = [str(x).strip() for x in cleaned["examples_en"] if str(x).strip()]
-            cleaned["examples_si"] = [str(x).strip() for x in cleaned["examples_si"] if str(x).strip()]
-            cleaned["synonyms_en"] = [str(x).strip() for x in cleaned["synonyms_en"] if str(x).strip()]
+    def _batch_request(self, gem: GeminiClient, items: Sequence[Tuple[Dict[str, str], Optional[List[Dict[str, str]]]]], level: str) -> LLMRequest:
+        fields = [_input_fields(base) for base, _ in items]
+        guidance = (
+            "Create a learner's dictionary entry for Sinhala learners of English for EACH numbered item below. "
+            "Focus on a single English headword per item (not a sentence). "
+            "Use simple English at the specified CEFR level and keep it kid-friendly if requested. "
+            "Make examples short and clear. If inputs are sentences, extract the headword.\n"
+            f"Return STRICT JSON (no markdown): {{\"items\": [{{\"id\": 1, ...}}, ...]}} where each entry has the item's id and the keys {_ENTRY_KEYS}."
+        )
+        pieces: List[str] = [guidance, f"\nLevel: {level}"]
+        # The context budget is shared by the items of a batch
+        budget = context_budget() // len(items) if context_budget() else 0
+        for i, (f, (_, context_rows)) in enumerate(zip(fields, items), 1):
+            pieces.append(f"\nItem {i}. Input fields (may be noisy):\n{f}")
+            corpus_block = _corpus_block(context_rows, "dictionary_enrich_batch", limit=4, budget=budget)
+            if corpus_block:
+                pieces.append("Parallel corpus for this item:\n" + corpus_block)
+        prompt = "\n".join(pieces)
+        if self.kid_safe:
+            prompt = gem._kid_guidelines() + prompt
+
+        def entry(data: Dict[str, object]) -> Dict[str, object]:
+            # Validated against the input fields of the item it answers
+            cleaned = _clean_entry(data, fields[int(data["id"]) - 1])
+            if not cleaned["definition_en"]:
+                raise ValueError("missing definition")
             return cleaned
+
+        return LLMRequest(prompt, "dictionary_enrich_batch", self.kid_safe, lambda raw: gem._parse_batch(raw, len(items), entry))
+
+    def _parse(self, gem: GeminiClient, raw: str, fields: Dict[str, str]) -> Dict[str, object]:
+        if raw.startswith("[Gemini Error"):
+            raise RuntimeError(raw)
+        try:
+            return _clean_entry(json.loads(gem._clean_json_response(raw)), fields)
         except Exception:
             # Fallback minimal entry
             return {
-                "english": en,
-                "sinhala": si,
-                "transliteration": translit,
-                "pos": pos,
+                "english": fields["english"],
+                "sinhala": fields["sinhala"],
+                "transliteration": fields["transliteration"],
+                "pos": fields["pos"],
                 "definition_en": raw,
-                "examples_en": [ex_en] if ex_en else [],
+                "examples_en": [fields["example_en"]] if fields["example_en"] else [],
                 "explanation_si": "",
-                "examples_si": [ex_si] if ex_si else [],
+                "examples_si": [fields["example_si"]] if fields["example_si"] else [],
                 "synonyms_en": [],
                 "notes_si": "",
             }
@@ -0,0 +1,274 @@
+"""Precomputed learner's-dictionary entries.
+
+``DictionaryStore`` is a SQLite table of enriched entries keyed by headword,
+CEFR level and kid-safe flag, served by ``/dictionary/enrich`` before falling
+back to live generation. ``python -m agent.dictionary_store`` fills it offline
+with parallel workers, a request rate limit and resume from where a previous
+run stopped (entries already stored are skipped).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .dictionary import DictionaryEnricher, entry_base, headword_key, moderation_text
+from .env import bool_env
+from .ratelimit import TokenBucket
+
+DEFAULT_STORE_PATH = Path(__file__).resolve().parents[1] / "data" / "dictionary.sqlite3"
+
+SUBSETS = ("simple", "all")
+
+
+class DictionaryStore:
+    """Enriched entries keyed by (headword, level, kid_safe).
+
+    Entries blocked by moderation during the job are kept with status
+    "blocked" so reruns skip them, but are never served.
+    """
+
+    def __init__(self, path: Path = DEFAULT_STORE_PATH, readonly: bool = False):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        if readonly:
+            self._db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), timeout=10.0, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " headword TEXT NOT NULL, level TEXT NOT NULL, kid_safe INTEGER NOT NULL,"
+                " status TEXT NOT NULL, moderated INTEGER NOT NULL, entry TEXT, created REAL NOT NULL,"
+                " PRIMARY KEY (headword, level, kid_safe))"
+            )
+
+    def get(self, headword: str, level: str, kid_safe: bool) -> Optional[Tuple[Dict[str, object], bool]]:
+        """``(entry, moderated)`` for a servable entry, else None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT entry, moderated FROM entries WHERE headword = ? AND level = ? AND kid_safe = ? AND status = 'ok'",
+                (headword_key(headword), level, int(kid_safe)),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), bool(row[1])
+
+    def done(self, level: str, kid_safe: bool) -> Set[str]:
+        """Headwords already processed (stored or blocked) for this level and flag."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT headword FROM entries WHERE level = ? AND kid_safe = ?", (level, int(kid_safe))
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def put_many(self, rows: Iterable[Tuple[str, str, bool, Optional[Dict[str, object]], bool]]) -> None:
+        """Insert ``(headword, level, kid_safe, entry, moderated)`` rows in one
+        transaction; an entry of None records a moderation block."""
+        now = time.time()
+        params = [
+            (headword_key(h), level, int(kid), "ok" if entry is not None else "blocked", int(moderated),
+             json.dumps(entry, ensure_ascii=False) if entry is not None else None, now)
+            for h, level, kid, entry, moderated in rows
+        ]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", params)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT level, kid_safe, status, COUNT(*) FROM entries GROUP BY level, kid_safe, status"
+            ).fetchall()
+        return {
+            "path": str(self.path),
+            "entries": [{"level": lv, "kid_safe": bool(kid), "status": st, "count": n} for lv, kid, st, n in rows],
+        }
+
+
+_store: Optional[DictionaryStore] = None
+_store_checked = False
+_store_lock = threading.Lock()
+
+
+def get_dictionary_store() -> Optional[DictionaryStore]:
+    """The store at DICTIONARY_STORE (default data/dictionary.sqlite3), opened
+    read-only, or None when the file does not exist (run the job first).
+    DICTIONARY_STORE=0 disables it."""
+    global _store, _store_checked
+    if _store_checked:
+        return _store
+    with _store_lock:
+        if not _store_checked:
+            raw = (os.getenv("DICTIONARY_STORE") or "").strip()
+            if raw.lower() not in {"0", "false", "no", "off"}:
+                path = Path(raw) if raw else DEFAULT_STORE_PATH
+                if path.exists():
+                    try:
+                        _store = DictionaryStore(path, readonly=True)
+                    except sqlite3.Error as e:
+                        print(f"Dictionary store unavailable ({e}); serving live entries only")
+            _store_checked = True
+    return _store
+
+
+def select_headwords(tf, subset: str) -> List[str]:
+    """Distinct headwords to enrich, in vocabulary order. "simple" is the
+    kid-friendly word pool behind the simple-word MCQs (the first English word of
+    each row when it is a short alphabetic word); "all" is every English entry."""
+    if subset not in SUBSETS:
+        raise ValueError(f"Unknown subset: {subset!r}")
+    if subset == "simple":
+        words = [w for w, ok in zip(tf.en_first_word, tf.en_is_simple) if ok]
+    else:
+        words = [w for w in tf.vocab["english"].tolist() if isinstance(w, str)]
+    seen: Set[str] = set()
+    out: List[str] = []
+    for w in words:
+        key = headword_key(w)
+        if key and key not in seen:
+            seen.add(key)
+            out.append(key)
+    return out
+
+
+def run_enrichment(
+    tf,
+    store: DictionaryStore,
+    headwords: Sequence[str],
+    *,
+    level: str = "A1/A2",
+    kid_safe: bool = False,
+    moderate: bool = False,
+    workers: int = 4,
+    rate: float = 1.0,
+    batch_size: int = 10,
+) -> Dict[str, int]:
+    """Enrich ``headwords`` missing from ``store`` and write them as they complete.
+
+    Work is split into batches of ``batch_size`` headwords (one batched LLM
+    prompt each) run on ``workers`` threads; starting a batch takes a token from
+    a bucket refilled at ``rate`` per second. Each finished batch is committed,
+    so an interrupted run resumes where it stopped. Headwords that fail are not
+    stored and are retried by the next run, as are entries the moderator gave
+    no verdict for when ``moderate`` is set.
+    """
+    done = store.done(level, kid_safe)
+    todo = [h for h in headwords if h not in done]
+    counts = {
+        "total": len(headwords), "skipped": len(headwords) - len(todo),
+        "stored": 0, "blocked": 0, "failed": 0, "no_verdict": 0,
+    }
+    if not todo:
+        return counts
+
+    enricher = DictionaryEnricher(kid_safe=kid_safe)
+    bucket = TokenBucket(rate, burst=max(1, workers))
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    counts_lock = threading.Lock()
+    start = time.perf_counter()
+
+    def work(batch: List[str]) -> None:
+        items = [entry_base(tf, {"english": h}) for h in batch]
+        bucket.acquire()
+        entries = enricher.enrich_many(items, level=level)
+        verdicts: List[Optional[Dict[str, object]]] = [None] * len(entries)
+        unsettled = set()
+        if moderate:
+            from .llm import get_gemini_client
+
+            idx = [i for i, e in enumerate(entries) if e and moderation_text(e)]
+            bucket.acquire()
+            mods = get_gemini_client().moderate_texts([moderation_text(entries[i]) for i in idx], allow_none=True)
+            for i, mod in zip(idx, mods):
+                verdicts[i] = mod
+                if mod is None:
+                    unsettled.add(i)
+        rows = []
+        stored = blocked = failed = no_verdict = 0
+        for i, (h, entry, verdict) in enumerate(zip(batch, entries, verdicts)):
+            if entry is None:
+                failed += 1
+            elif i in unsettled:
+                # Not stored, so the next run retries it instead of serving it as moderated
+                no_verdict += 1
+            elif verdict is not None and not verdict.get("safe", True):
+                rows.append((h, level, kid_safe, None, True))
+                blocked += 1
+            else:
+                rows.append((h, level, kid_safe, entry, moderate))
+                stored += 1
+        if rows:
+            store.put_many(rows)
+        with counts_lock:
+            counts["stored"] += stored
+            counts["blocked"] += blocked
+            counts["failed"] += failed
+            counts["no_verdict"] += no_verdict
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="enrich") as pool:
+        futures = {pool.submit(work, b): b for b in batches}
+        try:
+            for n, fut in enumerate(as_completed(futures), 1):
+                try:
+                    fut.result()
+                except Exception as e:
+                    print(f"Batch failed: {e}")
+                    with counts_lock:
+                        counts["failed"] += len(futures[fut])
+                if n % 10 == 0 or n == len(batches):
+                    elapsed = time.perf_counter() - start
+                    print(f"{n}/{len(batches)} batches, {counts['stored']} stored, {elapsed:.0f}s elapsed")
+        except KeyboardInterrupt:
+            for fut in futures:
+                fut.cancel()
+            print("Interrupted; finished batches are saved and the next run resumes from there.")
+            raise
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute learner's dictionary entries into a SQLite store.")
+    parser.add_argument("--input", default=os.path.join("data", "vocab_clean.csv"), help="Vocabulary CSV path")
+    parser.add_argument("--store", default=str(DEFAULT_STORE_PATH), help="SQLite store path")
+    parser.add_argument("--subset", choices=SUBSETS, default="simple", help="Headwords to enrich (default: simple word pool)")
+    parser.add_argument("--level", default="A1/A2", help="CEFR level of the entries")
+    parser.add_argument("--kid-safe", action="store_true", default=bool_env("KID_SAFE_MODE"),
+                        help="Generate kid-safe entries (default: KID_SAFE_MODE)")
+    parser.add_argument("--moderate", action="store_true", help="Moderate entries and skip unsafe ones")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel workers")
+    parser.add_argument("--rate", type=float, default=1.0, help="Max LLM requests started per second")
+    parser.add_argument("--batch-size", type=int, default=10, help="Headwords per batched prompt")
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N headwords")
+    args = parser.parse_args()
+
+    import pandas as pd
+    from .functions import TutorFunctions
+
+    tf = TutorFunctions(TutorFunctions.normalize(pd.read_csv(args.input)))
+    headwords = select_headwords(tf, args.subset)
+    if args.limit is not None:
+        headwords = headwords[:args.limit]
+    store = DictionaryStore(Path(args.store))
+    counts = run_enrichment(
+        tf, store, headwords,
+        level=args.level, kid_safe=args.kid_safe, moderate=args.moderate,
+        workers=args.workers, rate=args.rate, batch_size=max(1, args.batch_size),
+    )
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
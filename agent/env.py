@@ -0,0 +1,26 @@
+"""Readers for the optional settings the backend takes from environment variables."""
+from __future__ import annotations
+
+import os
+
+_TRUE = {"1", "true", "yes", "on"}
+_FALSE = {"0", "false", "no", "off"}
+
+
+def bool_env(name: str, default: bool = False) -> bool:
+    """True for 1/true/yes/on, False for 0/false/no/off (any case); ``default``
+    when ``name`` is unset, empty or anything else."""
+    val = (os.getenv(name) or "").strip().lower()
+    if val in _TRUE:
+        return True
+    if val in _FALSE:
+        return False
+    return default
+
+
+def float_env(name: str, default: float) -> float:
+    """``name`` as a number, or ``default`` when it is unset, empty or malformed."""
+    try:
+        return float(os.getenv(name, "") or default)
+    except ValueError:
+        return default
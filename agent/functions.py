@@ -1,15 +1,93 @@
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import datetime
+import hashlib
 import random
+import threading
+import numpy as np
 import pandas as pd
 import re
 
+from .kidsafe import AhoCorasick, KidSafeView, normalize_terms
+from .store import StringColumn, VocabStore
+from .retrieval import BM25Index, FuzzyIndex, NgramIndex, TokenIndex, all_tokens, tokenize
+
+_WORD_RE = re.compile(r"\b\w+\b", flags=re.UNICODE)
+_VOCAB_COLUMNS = ["sinhala", "english", "transliteration", "pos", "example_si", "example_en"]
+
+
+def _word_count(s: str) -> int:
+    if not isinstance(s, str) or not s.strip():
+        return 0
+    return len(_WORD_RE.findall(s))
+
+
+def _first_word(text: str) -> str:
+    if not isinstance(text, str):
+        return ""
+    m = _WORD_RE.search(text)
+    return m.group(0) if m else text.strip()
+
+
+def _is_simple_word(w: str) -> bool:
+    """Kid-mode heuristic: alphabetic, 2-8 letters, not one repeated letter ('mmm')."""
+    if not w or not w.isalpha():
+        return False
+    wl = w.lower()
+    if len(wl) < 2 or len(wl) > 8:
+        return False
+    if len(set(wl)) == 1 and len(wl) > 2:
+        return False
+    return True
+
+
 class TutorFunctions:
     """Encapsulates functions for the tutor agent."""
 
-    def __init__(self, vocab_df: pd.DataFrame):
-        """Initializes with a vocabulary DataFrame."""
+    RETRIEVAL_MODES = ("overlap", "bm25")
+    # Bump when normalize() output changes so vocabulary snapshots are rebuilt
+    NORMALIZE_VERSION = 1
+
+    def __init__(self, vocab_df: pd.DataFrame, retrieval_mode: str = "overlap", compact: bool = False):
+        """Initializes with a vocabulary DataFrame.
+
+        ``retrieval_mode`` picks the default scorer for ``retrieve_context``:
+        "overlap" (distinct shared tokens) or "bm25" (ranked BM25 weights).
+        With ``compact=True`` (normalized frames only) the rows are kept in a
+        ``VocabStore`` after the indexes are built, and ``self.vocab`` is that
+        store; drop other references to ``vocab_df`` to release its memory.
+        """
+        if retrieval_mode not in self.RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode!r}")
         self.vocab = vocab_df
+        self.retrieval_mode = retrieval_mode
         self._create_single_word_vocab() # Create the filtered vocab on init
+        self._compute_word_stats()
+        self._build_pos_index()
+        # Token postings and BM25 matrix for retrieve_context, built once per vocabulary
+        self._token_index = TokenIndex(self.vocab, columns=("sinhala", "english"))
+        self._bm25_index = BM25Index(self.vocab, columns=("sinhala", "english"))
+        # Trigram index behind search() over the three searchable columns
+        self._ngram_index = NgramIndex(self.vocab, columns=("sinhala", "english", "transliteration"))
+        # Deletion dictionary for typo-tolerant Singlish lookups
+        self._fuzzy_index = FuzzyIndex(self.vocab, column="transliteration", max_distance=2)
+        if compact:
+            self.vocab = VocabStore.from_frame(vocab_df)
+            self.en_first_word = StringColumn.from_values(self.en_first_word)
+            # gen_mcq's distractor pools hold most English strings a second time
+            self._all_options = StringColumn.from_values(self._all_options)
+            self._pos_options = {tag: StringColumn.from_values(opts) for tag, opts in self._pos_options.items()}
+
+    def __getstate__(self):
+        # Locks and request-time caches are not part of a snapshot
+        state = self.__dict__.copy()
+        state.pop("_kid_view_lock", None)
+        state["_kid_view"] = None
+        state["_pools"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._kid_view_lock = threading.Lock()
 
     def _create_single_word_vocab(self):
         """
@@ -26,68 +104,257 @@ class TutorFunctions:
         
         self.single_word_vocab = df[sinhala_is_single & english_is_single].copy()
 
-    def get_word_of_the_day(self) -> Dict[str, str]:
-        """Return a random word of the day as a dictionary with sinhala, english, and transliteration."""
-        import datetime
-        # Seed random with current date for reproducibility
-        random.seed(datetime.datetime.now().date())
-        # Sample a random row
-        sample = self.vocab.sample(1)
-        if sample.empty:
-            return {"sinhala": "", "english": "", "transliteration": ""}
-        row = sample.iloc[0]
+    def _compute_word_stats(self):
+        """Precompute the per-row word statistics the samplers filter on, so a
+        request only draws from cached row-index arrays."""
+        vocab = self.vocab
+        si = vocab["sinhala"].tolist() if "sinhala" in vocab.columns else [""] * len(vocab)
+        en = vocab["english"].tolist() if "english" in vocab.columns else [""] * len(vocab)
+        self.si_word_count = np.fromiter((_word_count(x) for x in si), dtype=np.int32, count=len(si))
+        self.en_word_count = np.fromiter((_word_count(x) for x in en), dtype=np.int32, count=len(en))
+        self.en_first_word = [_first_word(x) for x in en]
+        self.en_is_simple = np.fromiter((_is_simple_word(w) for w in self.en_first_word), dtype=bool, count=len(en))
+        self.is_single_word_pair = (self.si_word_count <= 1) & (self.en_word_count <= 1)
+        self._has_text = np.fromiter(
+            (isinstance(a, str) and len(a) > 0 and isinstance(b, str) and len(b) > 0 for a, b in zip(si, en)),
+            dtype=bool,
+            count=len(si),
+        )
+        present = [c for c in _VOCAB_COLUMNS if c in vocab.columns]
+        self._complete = vocab[present].notna().all(axis=1).to_numpy()
+        self._en_notna = vocab["english"].notna().to_numpy() if "english" in vocab.columns else np.zeros(len(vocab), dtype=bool)
+        # Lazily filled {key: row positions / option lists}; see _rows and _options
+        self._pools: Dict[Tuple, object] = {}
+        self._kid_view: Optional[KidSafeView] = None
+        self._kid_view_lock = threading.Lock()
+
+    def _build_pos_index(self):
+        """Map each normalized POS tag to its row positions and its deduplicated
+        English options, so POS filters and distractor draws avoid column scans."""
+        if "pos" in self.vocab.columns:
+            tags = self.vocab["pos"].fillna("").astype(str).str.strip().str.lower()
+        else:
+            tags = pd.Series([""] * len(self.vocab), index=self.vocab.index)
+        en = self.vocab["english"].tolist() if "english" in self.vocab.columns else [""] * len(self.vocab)
+        codes, names = pd.factorize(tags, sort=False)
+        # Per-row tag as a small code array plus the tag names
+        self._pos_codes = codes.astype(np.int32)
+        self._pos_names = list(names)
+        self._pos_rows: Dict[str, np.ndarray] = {}
+        if len(codes):
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+            for i, tag in enumerate(self._pos_names):
+                self._pos_rows[tag] = order[bounds[i]:bounds[i + 1]].astype(np.int64)
+        self._pos_options: Dict[str, Sequence[str]] = {
+            tag: self._english_options(en, rows) for tag, rows in self._pos_rows.items()
+        }
+        self._all_options = self._english_options(en, range(len(en)))
+
+    @staticmethod
+    def _english_options(english: List[object], rows) -> List[str]:
+        return list(dict.fromkeys(e for e in (english[i] for i in rows) if isinstance(e, str) and e.strip()))
+
+    def rows_for_pos(self, pos: str) -> np.ndarray:
+        """Sorted row positions whose POS tag equals ``pos`` (case/space-insensitive)."""
+        return self._pos_rows.get((pos or "").strip().lower(), np.empty(0, dtype=np.int64))
+
+    @staticmethod
+    def _pool_key(key: Tuple, view: Optional[KidSafeView]) -> Tuple:
+        return key if view is None else key + ("view", view.version)
+
+    def _rows(self, key: Tuple, mask: Callable[[], np.ndarray], view: Optional[KidSafeView] = None) -> np.ndarray:
+        """Row positions where ``mask()`` holds (and ``view`` allows), cached
+        under ``key`` and the view version."""
+        key = self._pool_key(key, view)
+        rows = self._pools.get(key)
+        if rows is None:
+            rows = self._pools[key] = np.flatnonzero(mask() if view is None else mask() & view.mask)
+        return rows
+
+    def _options(self, key: Tuple, rows: np.ndarray, view: Optional[KidSafeView] = None) -> List[str]:
+        """Deduplicated English first words of ``rows`` (first-seen order)."""
+        key = self._pool_key(key, view)
+        opts = self._pools.get(key)
+        if opts is None:
+            first = self.en_first_word
+            opts = self._pools[key] = list(dict.fromkeys(w for w in (first[i] for i in rows) if w))
+        return opts
+
+    def kid_safe_view(self, banned: Sequence[str]) -> KidSafeView:
+        """Cached kid-safe view of the vocabulary for this banned-term list.
+        Rebuilt (with a new version) only when the normalized term list changes."""
+        terms = normalize_terms(banned)
+        view = self._kid_view
+        if view is not None and view.terms == terms:
+            return view
+        with self._kid_view_lock:
+            view = self._kid_view
+            if view is not None and view.terms == terms:
+                return view
+            version = view.version + 1 if view is not None else 1
+            new_view = KidSafeView(self.vocab, terms, version)
+            if view is not None:
+                # Drop sampler pools cached for the superseded view
+                for key in list(self._pools):
+                    if key[-2:] == ("view", view.version):
+                        self._pools.pop(key, None)
+            self._kid_view = new_view
+            return new_view
+
+    @staticmethod
+    def _pick_rows(rows: np.ndarray, n: int) -> np.ndarray:
+        """``n`` distinct random entries of ``rows`` in O(n)."""
+        return rows[random.sample(range(len(rows)), n)]
+
+    @staticmethod
+    def _draw_distractors(options: Sequence[str], exclude: str, k: int) -> List[str]:
+        """Up to ``k`` distinct random entries of the deduplicated ``options`` other than ``exclude``."""
+        if k <= 0:
+            return []
+        if len(options) <= 4 * (k + 1):
+            pool = [o for o in options if o != exclude]
+            return random.sample(pool, min(k, len(pool)))
+        picked: List[str] = []
+        seen = {exclude}
+        while len(picked) < k:
+            w = options[random.randrange(len(options))]
+            if w not in seen:
+                seen.add(w)
+                picked.append(w)
+        return picked
+
+    def _word_base(self, n: int, pairs_only: bool, view: Optional[KidSafeView]) -> Tuple[bool, Callable[[], np.ndarray]]:
+        """Base mask for the MCQ word generators: single-word pairs when
+        ``pairs_only`` and there are enough of them, else every row."""
+        if pairs_only:
+            pairs = self._rows(("pairs",), lambda: self.is_single_word_pair, view)
+            if len(pairs) >= max(3, n):
+                return True, lambda: self.is_single_word_pair
+        return False, lambda: np.ones(len(self.vocab), dtype=bool)
+
+    def _mcq_item(self, record: Dict[str, object], correct: str, options: Sequence[str], choices: int) -> Dict[str, object]:
+        opts = [correct] + self._draw_distractors(options, correct, choices - 1)
+        random.shuffle(opts)
         return {
-            "sinhala": row["sinhala"],
-            "english": row["english"],
-            "transliteration": row.get("transliteration", ""),
+            "sinhala": record.get("sinhala", ""),
+            "transliteration": record.get("transliteration", ""),
+            "pos": record.get("pos", ""),
+            "options": opts,
+            "answer_index": opts.index(correct),
+            "answer": correct,
         }
 
+    # Days of words of the day computed at once (a year from today)
+    WORD_OF_THE_DAY_DAYS = 366
+
+    def _word_of_the_day_rows(self, view: Optional[KidSafeView]) -> np.ndarray:
+        rows = self._rows(("wotd",), lambda: self._has_text & self.is_single_word_pair, view)
+        if len(rows) == 0:
+            rows = self._rows(("wotd_any",), lambda: self._has_text, view)
+        return rows
+
+    @staticmethod
+    def _word_of_the_day_pick(rows: np.ndarray, day: datetime.date, version: str) -> int:
+        # A generator seeded by a hash of the date and vocabulary version: the same
+        # pick on every worker, without touching the shared global RNGs
+        digest = hashlib.sha256(f"{version}|{day.isoformat()}".encode("utf-8")).digest()
+        rng = np.random.default_rng(int.from_bytes(digest[:8], "big"))
+        return int(rows[rng.integers(len(rows))])
+
+    def word_of_the_day_calendar(self, start: datetime.date, days: int, version: str = "",
+                                 view: Optional[KidSafeView] = None) -> Dict[datetime.date, int]:
+        """Row position of the word of the day for ``days`` dates from ``start``.
+        Each date's pick depends only on that date and ``version``."""
+        rows = self._word_of_the_day_rows(view)
+        if len(rows) == 0:
+            return {}
+        return {
+            day: self._word_of_the_day_pick(rows, day, version)
+            for day in (start + datetime.timedelta(days=i) for i in range(max(0, days)))
+        }
+
+    def get_word_of_the_day(self, day: Optional[datetime.date] = None, version: str = "",
+                            view: Optional[KidSafeView] = None) -> Dict[str, str]:
+        """Word of the day (default: today) with sinhala, english, transliteration and pos.
+
+        Looked up in a precomputed calendar covering a year from today, which
+        is only rebuilt once today passes its last date, so a requested date
+        never replaces it. Dates outside it are computed directly, uncached.
+        """
+        today = datetime.date.today()
+        day = day or today
+        key = self._pool_key(("wotd_calendar", version), view)
+        cached = self._pools.get(key)
+        if cached is None or today > cached[0]:
+            days = self.WORD_OF_THE_DAY_DAYS
+            calendar = self.word_of_the_day_calendar(today, days, version, view)
+            cached = self._pools[key] = (today + datetime.timedelta(days=days - 1), calendar)
+        calendar = cached[1]
+        row = calendar[day] if day in calendar else self.word_of_the_day_calendar(day, 1, version, view).get(day)
+        if row is None:
+            return {"date": day.isoformat(), "sinhala": "", "english": "", "transliteration": "", "pos": ""}
+        rec = self.vocab.iloc[[row]].to_dict(orient="records")[0]
+        out = {"date": day.isoformat()}
+        for col in ("sinhala", "english", "transliteration", "pos"):
+            value = rec.get(col, "")
+            out[col] = value if isinstance(value, str) else ""
+        return out
+
     @staticmethod
     def filter_offensive(df: pd.DataFrame, banned: List[str]) -> pd.DataFrame:
         """Return a DataFrame with rows containing banned terms (in Sinhala or English) removed.
         Matching is case-insensitive and uses simple substring containment.
         """
-        if not banned:
-            return df
-        # Build regex pattern for banned terms (escape special chars)
-        safe_terms = [re.escape(t.strip()) for t in banned if t.strip()]
-        if not safe_terms:
+        matcher = AhoCorasick(banned or [])
+        if matcher.empty:
             return df
-        pattern = re.compile(r"(" + "|".join(safe_terms) + r")", flags=re.IGNORECASE)
-        mask_en = df["english"].str.contains(pattern, na=False)
-        mask_si = df["sinhala"].str.contains(pattern, na=False)
-        return df[~(mask_en | mask_si)]
+        return df[~matcher.match_mask(df, columns=("english", "sinhala"))]
 
-    def search(self, query: str) -> pd.DataFrame:
+    def search(self, query: str, fuzzy: bool = False, max_distance: int = 2, pos: Optional[str] = None, view: Optional[KidSafeView] = None) -> pd.DataFrame:
+        """Rows whose sinhala, english or transliteration contain ``query``
+        (case-insensitive, literal substring), in vocabulary order.
+
+        With ``fuzzy=True`` the query words are matched against transliteration
+        words within ``max_distance`` edits instead, closest matches first.
+        ``pos`` keeps only rows with that POS tag; ``view`` only kid-safe rows.
+        """
         if not query:
-            return self.vocab
-        q = query.strip().lower()
-        df = self.vocab
-        return df[
-            df["sinhala"].str.contains(q, case=False, na=False)
-            | df["english"].str.contains(q, case=False, na=False)
-            | df["transliteration"].str.contains(q, case=False, na=False)
-        ]
+            rows = self.rows_for_pos(pos) if pos else None
+            if view is not None:
+                rows = view.rows if rows is None else rows[view.mask[rows]]
+            return self.vocab if rows is None else self.vocab.iloc[rows]
+        if fuzzy:
+            rows = self._fuzzy_index.search(query, max_distance=max_distance)
+        else:
+            rows = self._ngram_index.search(self.vocab, query)
+        if pos:
+            rows = rows[np.isin(rows, self.rows_for_pos(pos), assume_unique=True)]
+        if view is not None:
+            rows = rows[view.mask[rows]]
+        return self.vocab.iloc[rows]
+
+    # Largest word-count limit sample_items caches a row set for
+    MAX_ITEM_WORDS = 10
 
     def sample_items(self, n: int = 10, *, words_only: bool = False, max_words_si: int = 2, max_words_en: int = 2) -> List[Dict[str, str]]:
-        cols = ["sinhala", "english", "transliteration", "pos", "example_si", "example_en"]
-        df = self.vocab[cols].dropna()
+        complete = self._rows(("complete",), lambda: self._complete)
+        rows = complete
         if words_only:
-            def wc(s: str) -> int:
-                import re as _re
-                if not isinstance(s, str) or not s.strip():
-                    return 0
-                return len(_re.findall(r"\b\w+\b", s, flags=_re.UNICODE))
-            si_wc = df["sinhala"].apply(wc)
-            en_wc = df["english"].apply(wc)
-            df = df[(si_wc <= max_words_si) & (en_wc <= max_words_en) & (df["sinhala"].str.len() > 0) & (df["english"].str.len() > 0)]
-            if df.empty:
-                df = self.vocab[cols].dropna()
-        n = min(n, len(df))
+            # Clamped, so the cached row sets stay bounded whatever callers pass
+            max_words_si = max(1, min(int(max_words_si), self.MAX_ITEM_WORDS))
+            max_words_en = max(1, min(int(max_words_en), self.MAX_ITEM_WORDS))
+            rows = self._rows(
+                ("items", max_words_si, max_words_en),
+                lambda: self._complete & self._has_text & (self.si_word_count <= max_words_si) & (self.en_word_count <= max_words_en),
+            )
+            if len(rows) == 0:
+                rows = complete
+        n = min(n, len(rows))
         if n <= 0:
             return []
-        df = df.sample(n)
-        return df.to_dict(orient="records")
+        cols = [c for c in _VOCAB_COLUMNS if c in self.vocab.columns]
+        return self.vocab.iloc[self._pick_rows(rows, n)][cols].to_dict(orient="records")
 
     @staticmethod
     def normalize(df: pd.DataFrame) -> pd.DataFrame:
@@ -108,27 +375,17 @@ class TutorFunctions:
     def gen_mcq(self, n: int = 5, choices: int = 4) -> List[Dict[str, object]]:
         n = max(1, min(n, len(self.vocab)))
         choices = max(2, min(choices, max(2, len(self.vocab))))
-        rows = self.vocab.sample(n).to_dict(orient="records")
+        picks = self._pick_rows(np.arange(len(self.vocab)), n)
+        rows = self.vocab.iloc[picks].to_dict(orient="records")
         result: List[Dict[str, object]] = []
-        for row in rows:
+        for r, row in zip(picks.tolist(), rows):
             correct = row["english"]
-            pos = (row.get("pos") or "").lower()
+            pos = self._pos_names[self._pos_codes[r]]
             # Pool for distractors: same POS if possible
-            pool = self.vocab
-            if pos:
-                same = pool[pool["pos"].str.lower() == pos]
-                if len(same) >= choices:
-                    pool = same
-            # Build options
-            opts = set([correct])
-            candidates = pool["english"].dropna().unique().tolist()
-            random.shuffle(candidates)
-            for cand in candidates:
-                if len(opts) >= choices:
-                    break
-                if isinstance(cand, str) and cand.strip() and cand != correct:
-                    opts.add(cand)
-            opts_list = list(opts)
+            options = self._all_options
+            if pos and len(self._pos_rows[pos]) >= choices:
+                options = self._pos_options[pos]
+            opts_list = [correct] + self._draw_distractors(options, correct, choices - 1)
             random.shuffle(opts_list)
             answer_index = opts_list.index(correct)
             result.append({
@@ -141,50 +398,29 @@ class TutorFunctions:
             })
         return result
 
-    def gen_mcq_strict_words(self, n: int = 5, choices: int = 4) -> List[Dict[str, object]]:
+    def gen_mcq_strict_words(self, n: int = 5, choices: int = 4, *, pairs_only: bool = False, view: Optional[KidSafeView] = None) -> List[Dict[str, object]]:
         """Generate MCQs ensuring English answer and options are single words.
-        Falls back to first token if multi-word strings appear."""
-        import re as _re
-        def first_word(text: str) -> str:
-            if not isinstance(text, str):
-                return ""
-            m = _re.search(r"\b\w+\b", text)
-            return m.group(0) if m else text.strip()
-        # Filter vocab to single-word English entries first
-        df = self.vocab.copy()
-        def word_count(s: str) -> int:
-            return len(_re.findall(r"\b\w+\b", s or "", flags=_re.UNICODE))
-        df_words = df[df["english"].apply(word_count) <= 1]
-        if df_words.empty:
-            df_words = df
-        n = max(1, min(n, len(df_words)))
-        rows = df_words.sample(n).to_dict(orient="records")
-        english_pool = [first_word(e) for e in df_words["english"].dropna().tolist() if first_word(e)]
-        english_unique = list(dict.fromkeys(english_pool))  # preserve order
-        random.shuffle(english_unique)
-        result: List[Dict[str, object]] = []
-        for row in rows:
-            correct_full = row.get("english", "")
-            correct = first_word(correct_full)
-            opts = [correct]
-            for w in english_unique:
-                if len(opts) >= choices:
-                    break
-                if w != correct:
-                    opts.append(w)
-            random.shuffle(opts)
-            answer_index = opts.index(correct)
-            result.append({
-                "sinhala": row.get("sinhala", ""),
-                "transliteration": row.get("transliteration", ""),
-                "pos": row.get("pos", ""),
-                "options": opts,
-                "answer_index": answer_index,
-                "answer": correct,
-            })
-        return result
+        Falls back to first token if multi-word strings appear.
+
+        ``pairs_only`` prefers rows where both sides are single words; ``view``
+        (see ``kid_safe_view``) restricts every pool to its allowed rows.
+        """
+        paired, base = self._word_base(n, pairs_only, view)
+        rows = self._rows(("strict", paired), lambda: base() & (self.en_word_count <= 1), view)
+        if len(rows) == 0:
+            rows = self._rows(("base", paired), base, view)
+        if len(rows) == 0:
+            return []
+        n = max(1, min(n, len(rows)))
+        options = self._options(("strict_options", paired), rows, view)
+        picks = self._pick_rows(rows, n)
+        records = self.vocab.iloc[picks].to_dict(orient="records")
+        return [
+            self._mcq_item(rec, self.en_first_word[r], options, choices)
+            for r, rec in zip(picks.tolist(), records)
+        ]
 
-    def gen_mcq_simple_words(self, n: int = 5, choices: int = 4) -> List[Dict[str, object]]:
+    def gen_mcq_simple_words(self, n: int = 5, choices: int = 4, *, pairs_only: bool = False, view: Optional[KidSafeView] = None) -> List[Dict[str, object]]:
         """Generate MCQs restricted to simpler English words for kid mode.
         Heuristics:
         - Single word (already enforced by strict generator logic)
@@ -193,112 +429,68 @@ class TutorFunctions:
         - Exclude words that are just repeated single character (e.g. 'mmm')
         Falls back to strict words if pool too small.
         """
-        import re as _re
-        def first_word(text: str) -> str:
-            if not isinstance(text, str):
-                return ""
-            m = _re.search(r"\b\w+\b", text)
-            return m.group(0) if m else text.strip()
-        def is_simple(w: str) -> bool:
-            if not w:
-                return False
-            if not w.isalpha():
-                return False
-            wl = w.lower()
-            if len(wl) < 2 or len(wl) > 8:
-                return False
-            if len(set(wl)) == 1 and len(wl) > 2:  # exclude 'mmm', 'aaaa'
-                return False
-            return True
-        df = self.vocab.copy()
-        def word_count(s: str) -> int:
-            return len(_re.findall(r"\b\w+\b", s or "", flags=_re.UNICODE))
-        df_words = df[df["english"].apply(word_count) <= 1]
-        if df_words.empty:
-            df_words = df
-        # Apply simplicity filter
-        simple_mask = df_words["english"].apply(lambda x: is_simple(first_word(str(x))))
-        df_simple = df_words[simple_mask]
+        paired, base = self._word_base(n, pairs_only, view)
+        rows = self._rows(("simple", paired), lambda: base() & (self.en_word_count <= 1) & self.en_is_simple, view)
         # If too small, fallback to strict words
-        if df_simple.shape[0] < max(3, n):
-            return self.gen_mcq_strict_words(n=n, choices=choices)
-        n = max(1, min(n, len(df_simple)))
-        rows = df_simple.sample(n).to_dict(orient="records")
-        english_pool = [first_word(e) for e in df_simple["english"].dropna().tolist() if first_word(e)]
-        english_unique = list(dict.fromkeys(english_pool))
-        random.shuffle(english_unique)
-        result: List[Dict[str, object]] = []
-        for row in rows:
-            correct = first_word(row.get("english", ""))
-            # Build options by sampling random distractors from the full vocabulary
-            # Exclude the correct answer
-            full_pool = [first_word(e) for e in self.vocab["english"].dropna().tolist() if first_word(e)]
-            # Deduplicate while preserving order
-            full_unique = list(dict.fromkeys(full_pool))
-            # Remove the correct answer from candidate distractors
-            candidates = [w for w in full_unique if w and w != correct]
-            # If not enough candidates, fall back to english_unique ordering
-            if len(candidates) < (choices - 1):
-                candidates = [w for w in english_unique if w and w != correct]
-            # Sample distractors randomly
-            distractors = []
-            try:
-                distractors = random.sample(candidates, k=min(len(candidates), choices - 1))
-            except ValueError:
-                # If sampling fails, just take from candidates sequentially
-                distractors = candidates[: max(0, choices - 1)]
-            opts = [correct] + distractors
-            random.shuffle(opts)
-            answer_index = opts.index(correct)
-            result.append({
-                "sinhala": row.get("sinhala", ""),
-                "transliteration": row.get("transliteration", ""),
-                "pos": row.get("pos", ""),
-                "options": opts,
-                "answer_index": answer_index,
-                "answer": correct,
-            })
-        return result
+        if len(rows) < max(3, n):
+            return self.gen_mcq_strict_words(n=n, choices=choices, pairs_only=pairs_only, view=view)
+        n = max(1, min(n, len(rows)))
+        # Distractors come from the whole (base) vocabulary, not only simple words
+        base_rows = self._rows(("base_en", paired), lambda: base() & self._en_notna, view)
+        options = self._options(("simple_options", paired), base_rows, view)
+        if len(options) < choices:
+            options = self._options(("simple_only_options", paired), rows, view)
+        picks = self._pick_rows(rows, n)
+        records = self.vocab.iloc[picks].to_dict(orient="records")
+        return [
+            self._mcq_item(rec, self.en_first_word[r], options, choices)
+            for r, rec in zip(picks.tolist(), records)
+        ]
+
+    def _pad_random_rows(self, rows: List[int], k: int, seed: str | None = None) -> List[int]:
+        """Top up ``rows`` with distinct random row positions until it has ``k`` entries.
+        With ``seed`` the padding is the same every time for that seed."""
+        n = len(self.vocab)
+        needed = min(k, n) - len(rows)
+        if needed <= 0:
+            return rows
+        rng = random.Random(seed) if seed is not None else random
+        chosen = set(rows)
+        if n - len(chosen) <= 4 * needed:
+            # Small vocabulary: draw from the explicit remainder
+            pool = [i for i in range(n) if i not in chosen]
+            return rows + rng.sample(pool, needed)
+        extra: List[int] = []
+        while len(extra) < needed:
+            r = rng.randrange(n)
+            if r not in chosen:
+                chosen.add(r)
+                extra.append(r)
+        return rows + extra
 
-    def retrieve_context(self, text: str, k: int = 5) -> List[Dict[str, str]]:
-        """Return top-k rows most similar to the query text using simple token overlap
-        across sinhala and english fields.
+    def retrieve_context(self, text: str, k: int = 5, mode: str | None = None) -> List[Dict[str, str]]:
+        """Return top-k rows most similar to the query text across sinhala and english fields.
+
+        ``mode`` overrides the instance default: "overlap" counts distinct shared
+        tokens from the prebuilt postings, "bm25" ranks with precomputed BM25 weights.
         """
+        mode = mode or self.retrieval_mode
+        if mode not in self.RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode!r}")
         if not isinstance(text, str) or not text.strip():
             return self.vocab.head(k).to_dict(orient="records")
 
-        # Tokenize (letters/digits) and lower for comparison
-        def tokenize(s: str) -> set:
-            if not isinstance(s, str):
-                return set()
-            # Keep unicode word characters; this will include Sinhala letters
-            return set([t.lower() for t in re.findall(r"\w+", s, flags=re.UNICODE) if t.strip()])
-
         q_tokens = tokenize(text)
         if not q_tokens:
             return self.vocab.head(k).to_dict(orient="records")
 
-        def score_row(row) -> int:
-            si = str(row.get("sinhala", ""))
-            en = str(row.get("english", ""))
-            tokens = tokenize(si) | tokenize(en)
-            return len(tokens & q_tokens)
-
-        df = self.vocab.copy()
-        scores = df.apply(score_row, axis=1)
-        df = df.assign(_score=scores)
-        df = df.sort_values(by="_score", ascending=False)
-        top = df[df["_score"] > 0].head(k)
-        # If no good matches are found, return a random sample to provide some context
-        if len(top) < k:
-            remaining_needed = k - len(top)
-            # Exclude already selected items to avoid duplicates
-            pool = df[~df.index.isin(top.index)]
-            # If the pool is smaller than what we need, take what's available
-            if len(pool) < remaining_needed:
-                remaining_needed = len(pool)
-            # Append a random sample of remaining items
-            random_sample = pool.sample(remaining_needed)
-            top = pd.concat([top, random_sample])
-
-        return top.drop(columns=["_score"], errors="ignore").to_dict(orient="records")
+        if mode == "bm25":
+            rows = self._bm25_index.top_k(all_tokens(text), k).tolist()
+        else:
+            rows = self._token_index.top_overlap(q_tokens, k).tolist()
+        # If no good matches are found, pad with a random sample to provide some context.
+        # Seeded by the query so identical questions build identical prompts
+        # (cacheable, and coalesced while in flight).
+        if len(rows) < k:
+            rows = self._pad_random_rows(rows, k, seed=" ".join(sorted(q_tokens)))
+        return self.vocab.iloc[rows].to_dict(orient="records")
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import os
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Default banned terms for the kid-safe vocabulary filter; KID_SAFE_BANNED adds more
+DEFAULT_BANNED = [
+    "sex", "sexual", "fuck", "fucking", "tits", "breast", "kill", "die", "suicide", "weapon", "gun", "drugs", "drug",
+]
+
+
+def banned_terms_from_env() -> List[str]:
+    """Default banned terms plus the comma-separated KID_SAFE_BANNED env value."""
+    banned = list(DEFAULT_BANNED)
+    extra = os.getenv("KID_SAFE_BANNED", "")
+    if extra.strip():
+        banned.extend([x.strip() for x in extra.split(",") if x.strip()])
+    return banned
+
+
+def normalize_terms(terms: Iterable[str]) -> Tuple[str, ...]:
+    """Canonical (lowercased, deduplicated, sorted) form of a banned-term list."""
+    return tuple(sorted({t.strip().lower() for t in terms if isinstance(t, str) and t.strip()}))
+
+
+class AhoCorasick:
+    """Case-insensitive multi-pattern substring matcher (Aho-Corasick automaton).
+
+    One pass over a text finds whether any pattern occurs, independent of the
+    number of patterns.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = normalize_terms(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[bool] = [False]
+        self._ends: List[Tuple[int, ...]] = [()]  # pattern indexes ending at each state
+        for idx, pat in enumerate(self.patterns):
+            state = 0
+            for ch in pat:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(False)
+                    self._ends.append(())
+                state = nxt
+            self._out[state] = True
+            self._ends[state] = (idx,)
+        self.empty = len(self._goto) == 1
+
+        # Breadth-first failure links; a state matches if any suffix state does
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] or self._out[self._fail[nxt]]
+                self._ends[nxt] = self._ends[nxt] + self._ends[self._fail[nxt]]
+
+    def contains(self, text: str) -> bool:
+        """True if any pattern occurs in ``text`` (case-insensitive)."""
+        if self.empty or not isinstance(text, str):
+            return False
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text.lower():
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                return True
+        return False
+
+    def find_all(self, text: str) -> Iterator[Tuple[int, str]]:
+        """``(start, pattern)`` for every occurrence of a pattern in ``text``,
+        overlapping ones included, in order of where they end."""
+        if self.empty or not isinstance(text, str):
+            return
+        goto, fail, ends, patterns = self._goto, self._fail, self._ends, self.patterns
+        state = 0
+        for i, ch in enumerate(text.lower()):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for idx in ends[state]:
+                yield i + 1 - len(patterns[idx]), patterns[idx]
+
+    def match_mask(self, df: pd.DataFrame, columns: Sequence[str] = ("english", "sinhala")) -> np.ndarray:
+        """Boolean array: rows of ``df`` where any of ``columns`` contains a pattern."""
+        cols = [df[c].tolist() for c in columns if c in df.columns]
+        if self.empty or not cols:
+            return np.zeros(len(df), dtype=bool)
+        return np.fromiter(
+            (any(self.contains(v) for v in values) for values in zip(*cols)),
+            dtype=bool,
+            count=len(df),
+        )
+
+
+class KidSafeView:
+    """Kid-safe subset of a vocabulary: the banned-term config it was built
+    from, a version number, the allowed-row mask and its row positions."""
+
+    def __init__(self, df: pd.DataFrame, terms: Sequence[str], version: int):
+        self.terms = normalize_terms(terms)
+        self.version = version
+        self.mask = ~AhoCorasick(self.terms).match_mask(df, columns=("english", "sinhala"))
+        self.rows = np.flatnonzero(self.mask)
@@ -4,7 +4,22 @@ import os
 import json
 import re
 import random
-from typing import List, Dict, Any, Optional
+import asyncio
+import textwrap
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from pathlib import Path
+from typing import List, Dict, Any, AsyncIterator, Awaitable, Callable, Iterator, NamedTuple, Optional, Sequence, Tuple, TypeVar
+
+from .cache import ResponseCache, cache_bypassed, get_response_cache
+from .env import bool_env, float_env
+from .moderation import get_moderation
+from .prompts import PromptTemplate, context_budget, context_lines, telemetry
+from .resilience import CircuitBreaker, LLMUnavailable, endpoint_deadline, hedge_after
+from .providers import DEFAULT_RECORDING_PATH, LLMProvider, RecordingProvider, ReplayProvider, StubProvider
+from .singleflight import AsyncSingleFlight, SingleFlight
 
 # We will standardize on the google.generativeai library (referred to as v1 in previous logic)
 # as it is the current standard. This avoids conflicts and simplifies the client.
@@ -13,94 +28,398 @@ try:
 except ImportError:
     raise RuntimeError("Required library not found. Please install it by running: pip install google-generativeai")
 
-class GeminiClient:
-    """Client for interacting with the Gemini LLM."""
+def _resolve_api_key(api_key: Optional[str] = None) -> str:
+    key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or ""
+    key = key.strip().strip('"').strip("'")
+    if not key:
+        raise ValueError("Gemini API key not found! Set GEMINI_API_KEY or GOOGLE_API_KEY")
+    return key
 
-    def __init__(self, api_key: Optional[str] = None, model_name: str | None = None):
-        """
-        Initializes the Gemini client, standardizing on the google.generativeai library.
-        """
-        key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or ""
-        key = key.strip().strip('"').strip("'")
-        if not key:
-            raise ValueError("Gemini API key not found! Set GEMINI_API_KEY or GOOGLE_API_KEY")
 
-        # Configure the library with the API key
-        genai.configure(api_key=key)
+def _resolve_model_name(model_name: Optional[str] = None) -> str:
+    return (model_name or os.getenv("GEMINI_MODEL") or "gemini-1.5-flash").strip()
 
-        # Get model name from environment or use a default
-        self.model_name = (model_name or os.getenv("GEMINI_MODEL") or "gemini-1.5-flash").strip()
-        
-        # Create the generative model instance
-        self.model = genai.GenerativeModel(self.model_name)
 
-    def _clean_json_response(self, raw_text: str) -> str:
-        """Strips markdown code block fences from a raw string to get to the JSON."""
-        # Find the start of the JSON object
-        json_start = raw_text.find('{')
-        if json_start == -1:
-            return "{}" # Return empty JSON if no '{' found
-        # Find the end of the JSON object
-        json_end = raw_text.rfind('}')
-        if json_end == -1:
-            return "{}" # Return empty JSON if no '}' found
-        # Extract the JSON part
-        json_str = raw_text[json_start : json_end + 1]
-        return json_str
+# API key the google.generativeai library is currently configured with
+_configured_key: Optional[str] = None
 
-    def _kid_guidelines(self) -> str:
-        return (
-            "\nYou are a warm, joyful, kid-safe Sinhala-English tutor for children 6–12 years old. "
-            "Always be positive, encouraging, and fun. Use simple A1/A2 English. "
-            "Speak naturally in Sinhala script. Never say 'wrong' or 'incorrect'. "
-            "Use emojis. Keep everything super safe and happy!\n"
-        )
 
-    def _generate(self, prompt: str) -> str:
-        """
-        Generates content using the configured Gemini model.
-        Now simplified to use the single, standardized client method.
-        """
-        try:
-            # Use the safety settings to reduce the chance of blocks for harmless content.
-            safety_settings = [
-                {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-                {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-            ]
-            resp = self.model.generate_content(prompt, safety_settings=safety_settings)
-            # Check if the response has text, otherwise handle potential blocks/empty responses
-            if resp.parts:
-                return resp.text
-            else:
-                # This can happen if the content is blocked despite safety settings.
-                # Log or handle as needed.
-                return "[Gemini Error: No content generated. The prompt might have been blocked.]"
-        except Exception as e:
-            # Log the full error for debugging
-            print(f"An exception occurred in _generate: {e}")
-            return f"[Gemini Error: {e}]"
+def _configure_genai(key: str) -> None:
+    """Configure the google.generativeai library. GEMINI_TRANSPORT ("rest"/"grpc")
+    and GEMINI_API_ENDPOINT allow pointing the client at a local stand-in."""
+    global _configured_key
+    transport = (os.getenv("GEMINI_TRANSPORT") or "").strip() or None
+    endpoint = (os.getenv("GEMINI_API_ENDPOINT") or "").strip()
+    genai.configure(api_key=key, transport=transport, client_options={"api_endpoint": endpoint} if endpoint else None)
+    _configured_key = key
 
-    def translate(self, text_si: str, context: List[Dict[str, str]] | None = None, kid_safe: bool = False) -> str:
-        corpus_block = ""
-        if context:
-            lines = [f"- Sinhala: {c.get('sinhala','')}\n  English: {c.get('english','')}" for c in context[:10]]
-            corpus_block = "\nReference corpus (use exact matches when possible):\n" + "\n".join(lines) + "\n"
-        prompt = f"Translate only to English. Return just the translation.\n{corpus_block}\nSinhala: {text_si}"
-        if kid_safe:
-            prompt = self._kid_guidelines() + prompt
-        return self._generate(prompt).strip()
 
-    def explain_word(self, word: str, context: List[Dict[str, str]], kid_safe: bool = False) -> str:
-        """Generate a detailed, structured explanation for a word."""
-        context_str = "\n".join([f"- {c['sinhala']} ({c['english']})" for c in context])
-        
-        if kid_safe:
-            persona_prompt = self._kid_guidelines() + (
-                f"\n**Task:** Explain the word '{word}' for a 5-8 year old child in a simple, happy, and encouraging way."
-            )
-            output_format = '''
+# Safety settings that reduce the chance of blocks for harmless content.
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+
+def _max_concurrency() -> int:
+    """Upper bound on concurrent upstream LLM calls per event loop (LLM_MAX_CONCURRENCY)."""
+    return max(1, int(float_env("LLM_MAX_CONCURRENCY", 32)))
+
+
+T = TypeVar("T")
+
+# asyncio.Semaphore is bound to the loop it is first used on, so keep one per loop.
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+# Identical in-flight prompts share one upstream call (LLM_COALESCE=0 disables)
+_flight = SingleFlight()
+_async_flights: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncSingleFlight]" = weakref.WeakKeyDictionary()
+
+
+def _coalesce_enabled() -> bool:
+    return bool_env("LLM_COALESCE", True)
+
+
+def _async_flight() -> AsyncSingleFlight:
+    loop = asyncio.get_running_loop()
+    flight = _async_flights.get(loop)
+    if flight is None:
+        flight = _async_flights[loop] = AsyncSingleFlight()
+    return flight
+
+
+def coalesce_stats() -> Dict[str, int]:
+    """Upstream calls made vs. requests that joined an identical in-flight call."""
+    flights = [_flight, *list(_async_flights.values())]
+    return {
+        "upstream_calls": sum(f.executed for f in flights),
+        "coalesced": sum(f.coalesced for f in flights),
+    }
+
+
+# Shared by every client: the breaker tracks the health of the upstream itself
+_breaker = CircuitBreaker.from_env()
+_hedges = {"hedged": 0, "hedge_won": 0}
+# Calls dropped after waiting a whole deadline for a free LLM slot or thread
+_queue_timeouts = {"queue_timeouts": 0}
+
+
+def circuit_open() -> bool:
+    """True while the LLM circuit breaker refuses upstream calls."""
+    return _breaker.is_open()
+
+
+def resilience_stats() -> Dict[str, Any]:
+    """Circuit breaker state and counters, plus hedged-call counters."""
+    return {"circuit": _breaker.stats(), "hedging": {"after_s": hedge_after(), **_hedges}, **_queue_timeouts}
+
+
+def _failed(text: str) -> bool:
+    return text.startswith("[Gemini Error")
+
+
+def _llm_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(_max_concurrency())
+    return sem
+
+
+def _llm_executor() -> ThreadPoolExecutor:
+    """Dedicated threads for blocking LLM calls, so they never occupy the
+    server's own threadpool that serves the local (non-LLM) routes."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_max_concurrency(), thread_name_prefix="llm")
+    return _executor
+
+
+def _release_soon(loop: asyncio.AbstractEventLoop, sem: asyncio.Semaphore) -> None:
+    try:
+        loop.call_soon_threadsafe(sem.release)
+    except RuntimeError:
+        pass  # event loop already closed
+
+
+class _CallClock:
+    """When an upstream call started running: on its LLM thread, or once it
+    holds the LLM semaphore for native async calls. Deadlines and the breaker
+    measure from here, so waiting for a free thread or slot is not counted as
+    upstream latency. With hedging, the first call to start sets it."""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.started: Optional[float] = None
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._loop = loop
+        self.started_future: Optional[asyncio.Future] = loop.create_future() if loop is not None else None
+
+    def start(self) -> None:
+        with self._lock:
+            if self.started is not None:
+                return
+            self.started = time.perf_counter()
+        self._event.set()
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._resolve)
+            except RuntimeError:
+                pass  # event loop already closed
+
+    def _resolve(self) -> None:
+        if not self.started_future.done():
+            self.started_future.set_result(None)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    def remaining(self, deadline: float) -> float:
+        return max(0.0, self.started + deadline - time.perf_counter())
+
+    def elapsed(self, fallback: float) -> float:
+        """Seconds since the call started (since ``fallback`` if it never did)."""
+        return time.perf_counter() - (self.started if self.started is not None else fallback)
+
+
+def _queued_too_long(deadline: float) -> LLMUnavailable:
+    _queue_timeouts["queue_timeouts"] += 1
+    return LLMUnavailable(f"LLM call waited over {deadline:g}s for a free LLM slot")
+
+
+async def _within_deadline(aw: Awaitable[T], clock: _CallClock, deadline: Optional[float]) -> T:
+    """Await ``aw`` with ``deadline`` seconds counted from ``clock``'s start.
+    Raises ``LLMUnavailable`` if it is still queued after one deadline and
+    ``asyncio.TimeoutError`` once it has run past the deadline."""
+    if deadline is None:
+        return await aw
+    task = asyncio.ensure_future(aw)
+    try:
+        await asyncio.wait({task, clock.started_future}, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+        if not task.done() and clock.started is None:
+            raise _queued_too_long(deadline)
+        return await asyncio.wait_for(task, clock.remaining(deadline)) if not task.done() else task.result()
+    finally:
+        if not task.done():
+            task.cancel()
+            # Let it unwind (e.g. a stream step) before the caller moves on
+            await asyncio.wait({task})
+
+
+def _native_async() -> bool:
+    """google.generativeai only ships a grpc_asyncio client; the REST transport
+    falls back to the blocking call on the LLM executor."""
+    return (os.getenv("GEMINI_TRANSPORT") or "").strip().lower() != "rest"
+
+
+def _response_text(resp) -> str:
+    # Check if the response has text, otherwise handle potential blocks/empty responses
+    if resp.parts:
+        return resp.text
+    # This can happen if the content is blocked despite safety settings.
+    raise RuntimeError("No content generated. The prompt might have been blocked.")
+
+
+def _chunk_text(chunk) -> str:
+    # Streamed chunks can carry no parts (e.g. the final safety-ratings chunk)
+    return chunk.text if chunk.parts else ""
+
+
+def batch_size() -> int:
+    """Items per batched prompt (LLM_BATCH_SIZE, default 10)."""
+    return max(1, int(float_env("LLM_BATCH_SIZE", 10)))
+
+
+def _chunks(items: Sequence[T], size: int) -> List[Sequence[T]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _explanation_item(entry: Dict[str, Any]) -> str:
+    text = entry.get("explanation")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("missing explanation")
+    return text.strip()
+
+
+def _moderation_item(entry: Dict[str, Any]) -> Dict[str, Any]:
+    safe = entry.get("safe")
+    if not isinstance(safe, bool):
+        raise ValueError("missing safe flag")
+    reasons = entry.get("reasons", [])
+    return {"safe": safe, "reasons": [str(r) for r in reasons] if isinstance(reasons, list) else [str(reasons)]}
+
+
+def _mcq_item(entry: Dict[str, Any], seeds: Dict[str, Dict[str, Any]], choices: int) -> Optional[Dict[str, Any]]:
+    """A generated MCQ checked against its seed item: the Sinhala word and answer
+    must be the seed's and the options ``choices`` distinct words including
+    the answer. Options are shuffled; None if the entry is invalid."""
+    seed = seeds.get(str(entry.get("sinhala", "")).strip())
+    options = entry.get("options")
+    if seed is None or not isinstance(options, list) or len(options) != choices:
+        return None
+    answer = str(seed["answer"])
+    options = [str(o).strip() for o in options]
+    lowered = [o.lower() for o in options]
+    if not all(options) or len(set(lowered)) != choices or str(entry.get("answer", "")).strip().lower() != answer.lower():
+        return None
+    if answer.lower() not in lowered:
+        return None
+    options[lowered.index(answer.lower())] = answer
+    random.shuffle(options)
+    return {
+        "sinhala": seed["sinhala"],
+        "transliteration": seed.get("transliteration", ""),
+        "pos": seed.get("pos", ""),
+        "options": options,
+        "answer_index": options.index(answer),
+        "answer": answer,
+        "answer_explanation": None,
+    }
+
+
+def _corpus_row(row: Dict[str, str]) -> str:
+    return f"- Sinhala: {row['sinhala']}\n  English: {row['english']}"
+
+
+def _reply_or_raise(parse: Callable[[str], Any]) -> Callable[[str], Any]:
+    """Wrap ``parse`` so error replies raise, for callers that have a local fallback."""
+    def checked(text: str) -> Any:
+        if _failed(text):
+            raise RuntimeError(text)
+        return parse(text)
+    return checked
+
+
+def _identity(text: str) -> str:
+    return text
+
+
+def _strip(text: str) -> str:
+    return text.strip()
+
+
+_EMPTY_SESSION = "You haven't learned any new words in this session yet. Ask for a 'lesson' to get started!"
+
+
+class GeminiProvider(LLMProvider):
+    """The google.generativeai backend."""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str):
+        self.native_async = _native_async()
+        self._api_key = api_key
+        self._http = None  # requests.Session for REST streaming, created on first use
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str, endpoint: str) -> str:
+        return _response_text(self.model.generate_content(prompt, safety_settings=SAFETY_SETTINGS))
+
+    async def generate_async(self, prompt: str, endpoint: str) -> str:
+        return _response_text(await self.model.generate_content_async(prompt, safety_settings=SAFETY_SETTINGS))
+
+    async def stream_async(self, prompt: str, endpoint: str) -> AsyncIterator[str]:
+        resp = await self.model.generate_content_async(prompt, safety_settings=SAFETY_SETTINGS, stream=True)
+        async for chunk in resp:
+            text = _chunk_text(chunk)
+            if text:
+                yield text
+
+    def stream(self, prompt: str, endpoint: str) -> Iterator[str]:
+        """Blocking iterator over the text chunks of ``streamGenerateContent?alt=sse``.
+        google.generativeai's REST transport reads the whole stream before
+        yielding, so the SSE stream is read directly."""
+        import requests
+
+        if self._http is None:
+            self._http = requests.Session()
+        endpoint_url = (os.getenv("GEMINI_API_ENDPOINT") or "").strip() or "generativelanguage.googleapis.com"
+        base = endpoint_url.rstrip("/") if "://" in endpoint_url else f"https://{endpoint_url}"
+        name = self.model_name if self.model_name.startswith(("models/", "tunedModels/")) else f"models/{self.model_name}"
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}], "safetySettings": SAFETY_SETTINGS}
+        with self._http.post(
+            f"{base}/v1beta/{name}:streamGenerateContent",
+            params={"alt": "sse"},
+            headers={"x-goog-api-key": self._api_key},
+            json=body,
+            stream=True,
+            timeout=(10, 120),
+        ) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = json.loads(line[5:])
+                for cand in data.get("candidates", [])[:1]:
+                    text = "".join(p.get("text", "") for p in cand.get("content", {}).get("parts", []))
+                    if text:
+                        yield text
+
+
+PROVIDERS = ("gemini", "stub", "record", "replay")
+
+
+def _provider_name() -> str:
+    name = (os.getenv("LLM_PROVIDER") or "gemini").strip().lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER: {name!r} (expected one of {', '.join(PROVIDERS)})")
+    return name
+
+
+def _needs_api_key(provider: str) -> bool:
+    return provider in {"gemini", "record"}
+
+
+def _stub_from_env() -> StubProvider:
+    responses = None
+    path = (os.getenv("LLM_STUB_RESPONSES") or "").strip()
+    if path:
+        with open(path, encoding="utf-8") as f:
+            responses = json.load(f)
+    return StubProvider(
+        latency_ms=float_env("LLM_STUB_LATENCY_MS", 0.0),
+        distribution=(os.getenv("LLM_STUB_DISTRIBUTION") or "fixed").strip().lower(),
+        spread=float_env("LLM_STUB_SPREAD", 0.5),
+        seed=int(float_env("LLM_STUB_SEED", 0)),
+        responses=responses,
+    )
+
+
+def make_provider(provider: str, api_key: str, model_name: str) -> LLMProvider:
+    """Build the backend named by ``provider`` (see LLM_PROVIDER in the README)."""
+    recording = Path((os.getenv("LLM_RECORDING") or "").strip() or DEFAULT_RECORDING_PATH)
+    if provider == "stub":
+        return _stub_from_env()
+    if provider == "replay":
+        fallback = _stub_from_env() if (os.getenv("LLM_REPLAY_MISS") or "").strip().lower() == "stub" else None
+        timing = bool_env("LLM_REPLAY_TIMING")
+        return ReplayProvider(recording, timing=timing, fallback=fallback)
+    gemini = GeminiProvider(api_key, model_name)
+    return RecordingProvider(gemini, recording) if provider == "record" else gemini
+
+
+_KID_GUIDELINES = (
+    "\nYou are a warm, joyful, kid-safe Sinhala-English tutor for children 6–12 years old. "
+    "Always be positive, encouraging, and fun. Use simple A1/A2 English. "
+    "Speak naturally in Sinhala script. Never say 'wrong' or 'incorrect'. "
+    "Use emojis. Keep everything super safe and happy!\n"
+)
+
+_EXPLAIN_WORD_CONTEXT = (
+    "**Context from Vocabulary:**\n"
+    'Here are some related words from the dictionary. Use them to understand the context, but focus your explanation ONLY on the requested word "{word}".\n'
+    "{context}\n\n"
+)
+
+_EXPLAIN_WORD_KID_FORMAT = '''
             **Output Format:**
             You MUST respond with ONLY a single, valid JSON object. Do not include any other text or markdown formatting like ```json. The JSON object should have the following keys:
 
@@ -110,10 +429,9 @@ class GeminiClient:
               "example": "A very simple example sentence. For example: 'The [word] is big.'",
               "fun_fact": "A short, fun fact about the word or concept. Make it exciting!"
             }}
-            '''.format(word=word)
-        else:
-            persona_prompt = "**Persona:** You are a friendly and knowledgeable language tutor. Your goal is to provide a clear, comprehensive, and encouraging explanation of a Sinhala or English word."
-            output_format = '''
+            '''
+
+_EXPLAIN_WORD_FORMAT = '''
             **Output Format:**
             Provide a detailed explanation in the following structure. Use Markdown for formatting.
             **must start with this: "බලන්න ඔයා මේ වචනෙ දන්නව ද කියල 🙈"**
@@ -144,82 +462,662 @@ class GeminiClient:
             
             **5. Sinhala translation:** : must start with this: "ඔයාට පුළුවන් අපි මේ ඉගෙනගත්ත හැමදේම නැවත සිංහලෙන් කියවලා තහවුරු කරගන්න. 😊 පහතින් ඔයාට සිංහල පරිවර්තනය බලාගන්න පුළුවන් 👩‍🏫🧚‍♀ 🙈👀
             *   Provide the Sinhala translation of the above content we provided about the word.
-            '''.format(word=word)
+            '''
 
-            
+# The explain_word prompts are large and mostly static: parse them once
+_EXPLAIN_WORD_KID = PromptTemplate(
+    _KID_GUIDELINES.replace("{", "{{").replace("}", "}}")
+    + "\n**Task:** Explain the word '{word}' for a 5-8 year old child in a simple, happy, and encouraging way.\n\n"
+    + _EXPLAIN_WORD_CONTEXT
+    + textwrap.dedent(_EXPLAIN_WORD_KID_FORMAT).strip("\n")
+)
+_EXPLAIN_WORD = PromptTemplate(
+    "**Persona:** You are a friendly and knowledgeable language tutor. Your goal is to provide a clear, comprehensive, and encouraging explanation of a Sinhala or English word.\n\n"
+    + _EXPLAIN_WORD_CONTEXT
+    + textwrap.dedent(_EXPLAIN_WORD_FORMAT).strip("\n")
+)
 
-        prompt = f"""
-        {persona_prompt}
 
-        **Context from Vocabulary:**
-        Here are some related words from the dictionary. Use them to understand the context, but focus your explanation ONLY on the requested word "{word}".
-        {context_str}
+class LLMRequest(NamedTuple):
+    """A prompt plus how to label, cache and post-process its reply.
+    Built once and run by either the sync or the async path."""
+    prompt: str
+    endpoint: str
+    kid_safe: bool = False
+    parse: Callable[[str], Any] = _identity
 
-        {output_format}
+
+class GeminiClient:
+    """Client for interacting with the Gemini LLM.
+
+    Prefer ``get_gemini_client()`` in request handlers: it reuses one client
+    (and its underlying transport) per API key and model.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, model_name: str | None = None, *, configure: bool = True,
+                 provider: Optional[LLMProvider] = None):
+        """
+        Initializes the Gemini client, standardizing on the google.generativeai library.
+        ``configure=False`` reuses the library's current configuration.
+        ``provider`` replaces the backend chosen by LLM_PROVIDER; the stub and
+        replay backends need no API key.
         """
-        response_text = self._generate(prompt)
+        # Get model name from environment or use a default
+        self.model_name = _resolve_model_name(model_name)
+
+        if provider is None:
+            kind = _provider_name()
+            key = ""
+            if _needs_api_key(kind):
+                key = _resolve_api_key(api_key)
+                # Configure the library with the API key
+                if configure:
+                    _configure_genai(key)
+            provider = make_provider(kind, key, self.model_name)
+        self.provider = provider
+
+    def _clean_json_response(self, raw_text: str) -> str:
+        """Strips markdown code block fences from a raw string to get to the JSON."""
+        # Find the start of the JSON object
+        json_start = raw_text.find('{')
+        if json_start == -1:
+            return "{}" # Return empty JSON if no '{' found
+        # Find the end of the JSON object
+        json_end = raw_text.rfind('}')
+        if json_end == -1:
+            return "{}" # Return empty JSON if no '}' found
+        # Extract the JSON part
+        json_str = raw_text[json_start : json_end + 1]
+        return json_str
+
+    def _kid_guidelines(self) -> str:
+        return _KID_GUIDELINES
+
+    def _generate(self, prompt: str, *, endpoint: str = "generate", kid_safe: bool = False) -> str:
+        """
+        Generates content, served from the shared response cache when possible.
+        ``endpoint`` labels the caller for hit/miss counters and LLM_CACHE_BYPASS.
+        Error strings are never cached. Concurrent identical prompts share one
+        upstream call.
+        """
+        cache = get_response_cache()
+        if cache is not None and cache_bypassed(endpoint):
+            cache = None
+        key = ResponseCache.make_key(self.model_name, prompt, kid_safe)
+        if cache is not None:
+            cached = cache.get(key, endpoint)
+            if cached is not None:
+                return cached
+
+        if not _breaker.allow():
+            raise LLMUnavailable("LLM circuit open")
+
+        def call() -> str:
+            text = self._upstream(prompt, endpoint)
+            if cache is not None and not _failed(text):
+                cache.set(key, text)
+            return text
+
+        return _flight.do(key, call) if _coalesce_enabled() else call()
+
+    async def _generate_async(self, prompt: str, *, endpoint: str = "generate", kid_safe: bool = False) -> str:
+        """Async counterpart of ``_generate`` with the same caching and coalescing rules."""
+        cache = get_response_cache()
+        if cache is not None and cache_bypassed(endpoint):
+            cache = None
+        key = ResponseCache.make_key(self.model_name, prompt, kid_safe)
+        if cache is not None:
+            cached = await cache.get_async(key, endpoint)
+            if cached is not None:
+                return cached
+
+        if not _breaker.allow():
+            raise LLMUnavailable("LLM circuit open")
+
+        async def call() -> str:
+            text = await self._upstream_async(prompt, endpoint)
+            if cache is not None and not _failed(text):
+                await cache.set_async(key, text)
+            return text
+
+        return await _async_flight().do(key, call) if _coalesce_enabled() else await call()
+
+    def _upstream(self, prompt: str, endpoint: str) -> str:
+        """Upstream call under the endpoint's deadline, reported to the circuit
+        breaker. The deadline runs from when the call starts on its LLM thread.
+        Raises ``LLMUnavailable`` when it passes (the blocking call itself cannot
+        be interrupted and finishes on its thread), or when no thread was free
+        within one deadline; that call is dropped and not reported as a failure."""
+        deadline = endpoint_deadline(endpoint)
+        started = time.perf_counter()
+        clock = _CallClock()
+        try:
+            if deadline is None:
+                text = self._generate_clocked(clock, prompt, endpoint)
+            else:
+                future = _llm_executor().submit(self._generate_clocked, clock, prompt, endpoint)
+                if not clock.wait(deadline):
+                    if future.cancel():
+                        raise _queued_too_long(deadline)
+                    clock.wait()  # it got a thread just now
+                text = future.result(timeout=clock.remaining(deadline))
+        except FuturesTimeout:
+            _breaker.record(False, clock.elapsed(started), timed_out=True)
+            raise LLMUnavailable(f"LLM call exceeded its {deadline:g}s deadline") from None
+        except BaseException:
+            _breaker.abandon()
+            raise
+        _breaker.record(not _failed(text), clock.elapsed(started))
+        return text
+
+    async def _upstream_async(self, prompt: str, endpoint: str) -> str:
+        """Async ``_upstream``; the call is cancelled at the deadline."""
+        deadline = endpoint_deadline(endpoint)
+        started = time.perf_counter()
+        clock = _CallClock(asyncio.get_running_loop())
+        try:
+            text = await _within_deadline(self._hedged_async(prompt, endpoint, clock), clock, deadline)
+        except asyncio.TimeoutError:
+            _breaker.record(False, clock.elapsed(started), timed_out=True)
+            raise LLMUnavailable(f"LLM call exceeded its {deadline:g}s deadline") from None
+        except BaseException:
+            _breaker.abandon()
+            raise
+        _breaker.record(not _failed(text), clock.elapsed(started))
+        return text
+
+    async def _hedged_async(self, prompt: str, endpoint: str, clock: Optional[_CallClock] = None) -> str:
+        """With LLM_HEDGE_AFTER_S set, start a second identical call if the first
+        has not answered by then and return whichever succeeds first."""
+        delay = hedge_after()
+        if delay is None:
+            return await self._generate_uncached_async(prompt, endpoint, clock)
+        first = asyncio.ensure_future(self._generate_uncached_async(prompt, endpoint, clock))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                _hedges["hedged"] += 1
+                tasks.add(asyncio.ensure_future(self._generate_uncached_async(prompt, endpoint, clock)))
+            text = ""
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    text = task.result()
+                    if not _failed(text):
+                        _hedges["hedge_won"] += task is not first
+                        return text
+            return text
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _generate_uncached(self, prompt: str, endpoint: str = "generate") -> str:
+        """
+        Generates content with the configured provider; failures come back
+        as ``[Gemini Error: ...]`` strings.
+        """
+        try:
+            started = time.perf_counter()
+            text = self.provider.generate(prompt, endpoint)
+            telemetry.record_call(endpoint, prompt, time.perf_counter() - started)
+            return text
+        except Exception as e:
+            # Log the full error for debugging
+            print(f"An exception occurred in _generate: {e}")
+            return f"[Gemini Error: {e}]"
+
+    def _generate_clocked(self, clock: Optional[_CallClock], prompt: str, endpoint: str) -> str:
+        if clock is not None:
+            clock.start()
+        return self._generate_uncached(prompt, endpoint)
+
+    async def _generate_uncached_async(self, prompt: str, endpoint: str = "generate",
+                                       clock: Optional[_CallClock] = None) -> str:
+        """Awaitable model call, at most LLM_MAX_CONCURRENCY in flight per event loop.
+        A blocking call keeps its slot until its LLM thread is done, even when
+        the caller stops waiting, so abandoned calls can't exceed the limit."""
+        sem = _llm_semaphore()
+        if not self.provider.native_async:
+            loop = asyncio.get_running_loop()
+            await sem.acquire()
+            try:
+                future = _llm_executor().submit(self._generate_clocked, clock, prompt, endpoint)
+            except BaseException:
+                sem.release()
+                raise
+            future.add_done_callback(lambda _: _release_soon(loop, sem))
+            return await asyncio.wrap_future(future)
+        async with sem:
+            if clock is not None:
+                clock.start()
+            try:
+                started = time.perf_counter()
+                text = await self.provider.generate_async(prompt, endpoint)
+                telemetry.record_call(endpoint, prompt, time.perf_counter() - started)
+                return text
+            except Exception as e:
+                print(f"An exception occurred in _generate_async: {e}")
+                return f"[Gemini Error: {e}]"
+
+    async def _stream_uncached_async(self, prompt: str, endpoint: str = "generate",
+                                     clock: Optional[_CallClock] = None) -> AsyncIterator[str]:
+        """Yield the reply text chunk by chunk as the model produces it.
+        Raises on upstream errors; the caller decides how to surface them."""
+        sem = _llm_semaphore()
+        if self.provider.native_async:
+            async with sem:
+                if clock is not None:
+                    clock.start()
+                started = time.perf_counter()
+                async for text in self.provider.stream_async(prompt, endpoint):
+                    yield text
+                telemetry.record_call(endpoint, prompt, time.perf_counter() - started)
+            return
+        # A blocking stream: pump it from an LLM thread, which keeps the
+        # semaphore slot until it returns (it stops early once we stop reading).
+        await sem.acquire()
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stop = threading.Event()
+
+        def put(item) -> None:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                pass  # event loop already closed
+
+        def pump() -> None:
+            if clock is not None:
+                clock.start()
+            try:
+                for text in self.provider.stream(prompt, endpoint):
+                    if stop.is_set():
+                        return
+                    put(text)
+                put(done)
+            except Exception as e:
+                put(e)
+
+        try:
+            future = _llm_executor().submit(pump)
+        except BaseException:
+            sem.release()
+            raise
+        future.add_done_callback(lambda _: _release_soon(loop, sem))
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    telemetry.record_call(endpoint, prompt, time.perf_counter() - started)
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            future.cancel()
+
+    async def _stream(self, req: LLMRequest) -> AsyncIterator[str]:
+        """Stream a request's reply. A cached reply is yielded as one chunk;
+        a completed stream is cached like ``_generate`` would."""
+        cache = get_response_cache()
+        key = None
+        if cache is not None and not cache_bypassed(req.endpoint):
+            key = cache.make_key(self.model_name, req.prompt, req.kid_safe)
+            cached = await cache.get_async(key, req.endpoint)
+            if cached is not None:
+                yield cached
+                return
+        if not _breaker.allow():
+            raise LLMUnavailable("LLM circuit open")
+        # The deadline applies to the first chunk, counted from when the stream
+        # starts upstream; the breaker sees time to first chunk
+        deadline = endpoint_deadline(req.endpoint)
+        started = time.perf_counter()
+        clock = _CallClock(asyncio.get_running_loop())
+        chunks = self._stream_uncached_async(req.prompt, req.endpoint, clock)
+        parts: List[str] = []
+        try:
+            try:
+                parts.append(await _within_deadline(chunks.__anext__(), clock, deadline))
+            except StopAsyncIteration:
+                pass
+            except asyncio.TimeoutError:
+                _breaker.record(False, clock.elapsed(started), timed_out=True)
+                raise LLMUnavailable(f"LLM stream exceeded its {deadline:g}s deadline") from None
+            except LLMUnavailable:
+                _breaker.abandon()
+                raise
+            except Exception:
+                _breaker.record(False, clock.elapsed(started))
+                raise
+            except BaseException:
+                _breaker.abandon()
+                raise
+            _breaker.record(True, clock.elapsed(started))
+            if parts:
+                yield parts[0]
+                async for text in chunks:
+                    parts.append(text)
+                    yield text
+        finally:
+            await chunks.aclose()
+        if key is not None and parts:
+            await cache.set_async(key, "".join(parts))
+
+    def _run(self, req: LLMRequest) -> Any:
+        return req.parse(self._generate(req.prompt, endpoint=req.endpoint, kid_safe=req.kid_safe))
+
+    async def _run_async(self, req: LLMRequest) -> Any:
+        return req.parse(await self._generate_async(req.prompt, endpoint=req.endpoint, kid_safe=req.kid_safe))
+
+    def _parse_batch(self, raw: str, n: int, item: Callable[[Dict[str, Any]], T]) -> List[Optional[T]]:
+        """Per-item results of a batched reply shaped ``{"items": [{"id": 1, ...}, ...]}``.
+        Ids are 1-based; entries that are missing or rejected by ``item`` come back as None."""
+        results: List[Optional[T]] = [None] * n
+        if raw.startswith("[Gemini Error"):
+            return results
+        try:
+            entries = json.loads(self._clean_json_response(raw)).get("items", [])
+        except (json.JSONDecodeError, AttributeError):
+            return results
+        if not isinstance(entries, list):
+            return results
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                idx = int(entry.get("id")) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= idx < n and results[idx] is None:
+                try:
+                    results[idx] = item(entry)
+                except (TypeError, ValueError, KeyError):
+                    pass
+        return results
+
+    def _run_batched(self, items: Sequence[Any], build: Callable[[Sequence[Any]], LLMRequest],
+                     single: Callable[[Any], T]) -> List[T]:
+        """Run ``items`` as batched prompts of LLM_BATCH_SIZE; items the batch reply
+        dropped or mangled are retried one at a time through ``single``."""
+        if len(items) <= 1:
+            return [single(it) for it in items]
+        results: List[Optional[T]] = []
+        for chunk in _chunks(items, batch_size()):
+            results.extend(self._run(build(chunk)))
+        return [r if r is not None else single(it) for r, it in zip(results, items)]
+
+    async def _run_batched_async(self, items: Sequence[Any], build: Callable[[Sequence[Any]], LLMRequest],
+                                 single: Callable[[Any], Awaitable[T]]) -> List[T]:
+        if len(items) <= 1:
+            return [await single(it) for it in items]
+        batches = await asyncio.gather(*[self._run_async(build(chunk)) for chunk in _chunks(items, batch_size())])
+        results: List[Optional[T]] = [r for batch in batches for r in batch]
+        missing = [i for i, r in enumerate(results) if r is None]
+        for i, r in zip(missing, await asyncio.gather(*[single(items[i]) for i in missing])):
+            results[i] = r
+        return results
+
+    def _translate_request(self, text_si: str, context: List[Dict[str, str]] | None, kid_safe: bool) -> LLMRequest:
+        corpus_block = ""
+        lines = context_lines(context, _corpus_row, "translate", limit=10)
+        if lines:
+            corpus_block = "\nReference corpus (use exact matches when possible):\n" + "\n".join(lines) + "\n"
+        prompt = f"Translate only to English. Return just the translation.\n{corpus_block}\nSinhala: {text_si}"
         if kid_safe:
-            return self._clean_json_response(response_text)
-        return response_text
+            prompt = self._kid_guidelines() + prompt
+        return LLMRequest(prompt, "translate", kid_safe, _strip)
+
+    def translate(self, text_si: str, context: List[Dict[str, str]] | None = None, kid_safe: bool = False) -> str:
+        return self._run(self._translate_request(text_si, context, kid_safe))
+
+    async def translate_async(self, text_si: str, context: List[Dict[str, str]] | None = None, kid_safe: bool = False) -> str:
+        return await self._run_async(self._translate_request(text_si, context, kid_safe))
+
+    def _explain_word_request(self, word: str, context: List[Dict[str, str]], kid_safe: bool) -> LLMRequest:
+        endpoint = "kid_explain" if kid_safe else "explain_word"
+        lines = context_lines(context, lambda c: f"- {c['sinhala']} ({c['english']})", endpoint)
+        template = _EXPLAIN_WORD_KID if kid_safe else _EXPLAIN_WORD
+        prompt = template.render(word=word, context="\n".join(lines))
+        if kid_safe:
+            return LLMRequest(prompt, endpoint, True, _reply_or_raise(self._clean_json_response))
+        return LLMRequest(prompt, endpoint)
+
+    def explain_word(self, word: str, context: List[Dict[str, str]], kid_safe: bool = False) -> str:
+        """Generate a detailed, structured explanation for a word."""
+        return self._run(self._explain_word_request(word, context, kid_safe))
+
+    async def explain_word_async(self, word: str, context: List[Dict[str, str]], kid_safe: bool = False) -> str:
+        return await self._run_async(self._explain_word_request(word, context, kid_safe))
+
+    def explain_word_stream(self, word: str, context: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Markdown explanation of ``word``, streamed as it is generated."""
+        return self._stream(self._explain_word_request(word, context, False))
 
     def kid_explain(self, word: str, context: List[Dict[str, str]]) -> str:
         """Generate a simple, kid-friendly explanation in a structured JSON format."""
         return self.explain_word(word, context, kid_safe=True)
 
-    def generate_quiz(self, items: List[Dict[str, str]], n: int = 5, words_only: bool = True, kid_safe: bool = False) -> List[Dict[str, str]]:
+    async def kid_explain_async(self, word: str, context: List[Dict[str, str]]) -> str:
+        return await self.explain_word_async(word, context, kid_safe=True)
+
+    def _generate_quiz_request(self, items: List[Dict[str, str]], n: int, kid_safe: bool) -> LLMRequest:
         examples = "\n".join([f"- {it['sinhala']} → {it['english']}" for it in items[:12]])
         guidance = "Create a Sinhala→English quiz using only WORD pairs. If any item is a sentence, extract the main word. Return clean JSON list of objects with keys: sinhala, answer"
         prompt = f"{guidance}\n\nExamples:\n{examples}\n\nGenerate {n} questions:"
         if kid_safe:
             prompt = self._kid_guidelines() + prompt
-        text = self._generate(prompt)
-        try:
-            # Adding a fallback to clean the response, in case the LLM wraps it in markdown
-            cleaned_text = self._clean_json_response(text)
-            data = json.loads(cleaned_text)
-            return data if isinstance(data, list) else []
-        except json.JSONDecodeError:
-            # If JSON is still invalid, fallback to the simple list
-            return [{"sinhala": it["sinhala"], "answer": it["english"]} for it in items[:n]]
 
-    def answer_with_context(self, question: str, context: List[Dict[str, str]], style: str = "concise", kid_safe: bool = False) -> str:
-        corpus = "\n".join([f"- Sinhala: {c.get('sinhala','')}\n  English: {c.get('english','')}" for c in context[:10]])
+        def parse(text: str) -> List[Dict[str, str]]:
+            try:
+                # Adding a fallback to clean the response, in case the LLM wraps it in markdown
+                cleaned_text = self._clean_json_response(text)
+                data = json.loads(cleaned_text)
+                return data if isinstance(data, list) else []
+            except json.JSONDecodeError:
+                # If JSON is still invalid, fallback to the simple list
+                return [{"sinhala": it["sinhala"], "answer": it["english"]} for it in items[:n]]
+
+        return LLMRequest(prompt, "generate_quiz", kid_safe, parse)
+
+    def generate_quiz(self, items: List[Dict[str, str]], n: int = 5, words_only: bool = True, kid_safe: bool = False) -> List[Dict[str, str]]:
+        return self._run(self._generate_quiz_request(items, n, kid_safe))
+
+    async def generate_quiz_async(self, items: List[Dict[str, str]], n: int = 5, words_only: bool = True, kid_safe: bool = False) -> List[Dict[str, str]]:
+        return await self._run_async(self._generate_quiz_request(items, n, kid_safe))
+
+    def _answer_with_context_request(self, question: str, context: List[Dict[str, str]], style: str, kid_safe: bool) -> LLMRequest:
+        corpus = "\n".join(context_lines(context, _corpus_row, "answer_with_context", limit=10))
         prompt = (
             f"Answer using ONLY this corpus. If not found, say 'කණගාටුයි මම ඒ ගැන දන්නෙ නැහැ 😓'. Keep answer {style}.\n\n"
             f"Corpus:\n{corpus}\n\nQuestion: {question}"
         )
         if kid_safe:
             prompt = self._kid_guidelines() + prompt
-        return self._generate(prompt)
+        return LLMRequest(prompt, "answer_with_context", kid_safe)
+
+    def answer_with_context(self, question: str, context: List[Dict[str, str]], style: str = "concise", kid_safe: bool = False) -> str:
+        return self._run(self._answer_with_context_request(question, context, style, kid_safe))
+
+    async def answer_with_context_async(self, question: str, context: List[Dict[str, str]], style: str = "concise", kid_safe: bool = False) -> str:
+        return await self._run_async(self._answer_with_context_request(question, context, style, kid_safe))
+
+    def _explain_mcq_answer_request(self, answer: str, context: List[Dict[str, str]], kid_safe: bool) -> LLMRequest:
+        corpus = "\n".join(context_lines(context, lambda c: f"- {c['sinhala']} ({c['english']})", "explain_mcq_answer", limit=5))
+        prompt = (
+            f"Explain in 1-2 short sentences what the English word '{answer}' means, "
+            f"with its Sinhala meaning. Keep it simple for a learner.\n\nRelated corpus entries:\n{corpus}"
+        )
+        if kid_safe:
+            prompt = self._kid_guidelines() + prompt
+        return LLMRequest(prompt, "explain_mcq_answer", kid_safe, _strip)
+
+    def explain_mcq_answer(self, answer: str, context: List[Dict[str, str]], kid_safe: bool = False) -> str:
+        """Short (1-2 sentence) explanation of an MCQ answer, grounded in the corpus."""
+        return self._run(self._explain_mcq_answer_request(answer, context, kid_safe))
+
+    async def explain_mcq_answer_async(self, answer: str, context: List[Dict[str, str]], kid_safe: bool = False) -> str:
+        return await self._run_async(self._explain_mcq_answer_request(answer, context, kid_safe))
+
+    def _explain_mcq_answers_request(self, items: Sequence[Tuple[str, List[Dict[str, str]]]], kid_safe: bool) -> LLMRequest:
+        blocks = []
+        # The context budget is shared by the items of a batch
+        budget = context_budget() // len(items) if context_budget() else 0
+        for i, (answer, context) in enumerate(items, 1):
+            corpus = "\n".join(context_lines(
+                context, lambda c: f"   - {c['sinhala']} ({c['english']})", "explain_mcq_answers", limit=3, budget=budget,
+            ))
+            blocks.append(f"{i}. '{answer}'" + (f"\n{corpus}" if corpus else ""))
+        prompt = (
+            "For each numbered English word below, explain in 1-2 short sentences what it means, "
+            "with its Sinhala meaning. Keep it simple for a learner. Related corpus entries are listed under each word.\n"
+            'Return ONLY JSON: {"items": [{"id": 1, "explanation": "..."}, ...]} with one entry per number.\n\n'
+            + "\n".join(blocks)
+        )
+        if kid_safe:
+            prompt = self._kid_guidelines() + prompt
+        return LLMRequest(prompt, "explain_mcq_answers", kid_safe, lambda raw: self._parse_batch(raw, len(items), _explanation_item))
+
+    def explain_mcq_answers(self, items: Sequence[Tuple[str, List[Dict[str, str]]]], kid_safe: bool = False) -> List[str]:
+        """``explain_mcq_answer`` for several ``(answer, context)`` pairs, one prompt per batch."""
+        return self._run_batched(
+            items,
+            lambda chunk: self._explain_mcq_answers_request(chunk, kid_safe),
+            lambda it: self.explain_mcq_answer(it[0], it[1], kid_safe=kid_safe),
+        )
+
+    async def explain_mcq_answers_async(self, items: Sequence[Tuple[str, List[Dict[str, str]]]], kid_safe: bool = False) -> List[str]:
+        return await self._run_batched_async(
+            items,
+            lambda chunk: self._explain_mcq_answers_request(chunk, kid_safe),
+            lambda it: self.explain_mcq_answer_async(it[0], it[1], kid_safe=kid_safe),
+        )
+
+    def _kid_story_request(self, words: List[str], sentences: int) -> LLMRequest:
+        words_str = ", ".join(w for w in words if isinstance(w, str) and w.strip())
+        prompt = self._kid_guidelines() + (
+            f"Write a happy story of about {max(1, sentences)} short sentences in simple English "
+            f"using these words: {words_str}. Add a one-line Sinhala summary at the end."
+        )
+        return LLMRequest(prompt, "kid_story", True, _reply_or_raise(_strip))
+
+    def kid_story(self, words: List[str], sentences: int = 3) -> str:
+        """A short, cheerful story for children that uses the given words."""
+        return self._run(self._kid_story_request(words, sentences))
+
+    async def kid_story_async(self, words: List[str], sentences: int = 3) -> str:
+        return await self._run_async(self._kid_story_request(words, sentences))
+
+    def kid_story_stream(self, words: List[str], sentences: int = 3) -> AsyncIterator[str]:
+        return self._stream(self._kid_story_request(words, sentences))
+
+    def _kid_feedback_request(self, user_answer: str, correct_answer: str) -> LLMRequest:
+        prompt = self._kid_guidelines() + (
+            f"A child answered '{user_answer}'. The expected answer is '{correct_answer}'. "
+            "Reply with ONE short, encouraging sentence that gently shows the expected answer."
+        )
+        return LLMRequest(prompt, "kid_feedback", True, _strip)
+
+    def kid_feedback(self, user_answer: str, correct_answer: str) -> str:
+        """One encouraging line of feedback on a child's answer."""
+        return self._run(self._kid_feedback_request(user_answer, correct_answer))
+
+    async def kid_feedback_async(self, user_answer: str, correct_answer: str) -> str:
+        return await self._run_async(self._kid_feedback_request(user_answer, correct_answer))
+
+    def _parse_moderation(self, raw: str) -> Optional[Dict[str, Any]]:
+        """The verdict in a moderation reply, or None for an error or unparseable reply."""
+        if _failed(raw):
+            return None
+        try:
+            data = json.loads(self._clean_json_response(raw))
+            reasons = data.get("reasons", [])
+            return {
+                "safe": bool(data.get("safe", True)),
+                "reasons": [str(r) for r in reasons] if isinstance(reasons, list) else [str(reasons)],
+            }
+        except (json.JSONDecodeError, AttributeError):
+            return None
 
-    def generate_mcq_with_llm(self, n: int = 1, choices: int = 4, kid_safe: bool = False) -> List[Dict[str, Any]]:
+    def _moderate_text_request(self, text: str) -> LLMRequest:
+        prompt = (
+            "You are a content moderator for a children's language app. "
+            "Decide if the following text is safe for children aged 6-12 "
+            "(no violence, sexual content, drugs, self-harm, hate or profanity). "
+            'Return ONLY JSON: {"safe": true|false, "reasons": ["short reason", ...]}\n\n'
+            f"Text:\n{text}"
+        )
+        return LLMRequest(prompt, "moderate_text", False, self._parse_moderation)
+
+    def _moderate_texts_request(self, texts: Sequence[str]) -> LLMRequest:
+        blocks = "\n\n".join(f"[{i}]\n{text}" for i, text in enumerate(texts, 1))
+        prompt = (
+            "You are a content moderator for a children's language app. "
+            "Decide for each numbered text below if it is safe for children aged 6-12 "
+            "(no violence, sexual content, drugs, self-harm, hate or profanity). "
+            'Return ONLY JSON: {"items": [{"id": 1, "safe": true|false, "reasons": ["short reason", ...]}, ...]} '
+            "with one entry per number.\n\n"
+            f"Texts:\n{blocks}"
+        )
+        return LLMRequest(prompt, "moderate_texts", False, lambda raw: self._parse_batch(raw, len(texts), _moderation_item))
+
+    def _moderate_llm(self, texts: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+        return self._run_batched(texts, self._moderate_texts_request, lambda t: self._run(self._moderate_text_request(t)))
+
+    async def _moderate_llm_async(self, texts: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+        return await self._run_batched_async(
+            texts, self._moderate_texts_request, lambda t: self._run_async(self._moderate_text_request(t))
+        )
+
+    def moderate_text(self, text: str) -> Dict[str, Any]:
+        """Whether ``text`` is safe for children: ``{"safe": bool, "reasons": [str]}``.
+
+        Goes through the moderation pipeline (verdict cache, local pre-screen),
+        so only ambiguous text reaches the model. Unparseable replies count as safe.
         """
-        Generates a high-quality MCQ question using the LLM.
-        This provides more engaging and contextually relevant questions than the simple random sampler.
+        return get_moderation().moderate_many([text], self.model_name, self._moderate_llm)[0]
+
+    async def moderate_text_async(self, text: str) -> Dict[str, Any]:
+        return (await get_moderation().moderate_many_async([text], self.model_name, self._moderate_llm_async))[0]
+
+    def moderate_texts(self, texts: Sequence[str], allow_none: bool = False) -> List[Optional[Dict[str, Any]]]:
+        """``moderate_text`` for several texts; those left for the model share batched prompts.
+
+        With ``allow_none=True`` a text the model gave no usable verdict for
+        comes back as None instead of safe.
         """
-        # Get a few random words from the simple list to seed the question generation
-        seed_words_df = self.vocab[self.vocab["english"].str.len() <= 8]
-        if seed_words_df.empty:
-            seed_words_df = self.vocab
-        
-        seed_items = seed_words_df.sample(min(5, len(seed_words_df))).to_dict(orient="records")
-        
-        examples_str = "\n".join([f"- {item['sinhala']} -> {item['english']}" for item in seed_items])
+        return get_moderation().moderate_many(texts, self.model_name, self._moderate_llm, allow_none=allow_none)
+
+    async def moderate_texts_async(self, texts: Sequence[str], allow_none: bool = False) -> List[Optional[Dict[str, Any]]]:
+        return await get_moderation().moderate_many_async(
+            texts, self.model_name, self._moderate_llm_async, allow_none=allow_none
+        )
+
+    def _generate_mcq_with_llm_request(self, seeds: Sequence[Dict[str, Any]], n: int, choices: int, kid_safe: bool) -> LLMRequest:
+        # Seed items (sinhala word + its English answer) come from the local
+        # generators, so the questions stay on the vocabulary for this mode
+        examples_str = "\n".join(f"- {item['sinhala']} -> {item['answer']}" for item in seeds)
+        by_sinhala = {str(item["sinhala"]).strip(): item for item in seeds}
 
         persona = self._kid_guidelines() if kid_safe else "You are a helpful language quiz creator."
 
         prompt = f"""
         {persona}
 
-        **Task:** Create {n} multiple-choice question (MCQ) to test a user's Sinhala to English vocabulary.
+        **Task:** Create {n} multiple-choice questions (MCQs) to test a user's Sinhala to English vocabulary.
 
         **Instructions:**
-        1.  Pick one interesting Sinhala word from the examples below.
-        2.  The "question" should be the Sinhala word.
-        3.  The "answer" must be the correct single English translation.
+        1.  Pick {n} different interesting Sinhala words from the examples below, one per question.
+        2.  The "sinhala" field must be the Sinhala word exactly as written in the examples.
+        3.  The "answer" must be its English translation as given in the examples.
         4.  Generate {choices - 1} incorrect but plausible English distractor options. The distractors should be common, single words and ideally related in some way (e.g., similar category, opposite meaning) to make the quiz challenging but fair.
         5.  Do NOT use any of the other English words from the examples as distractors. Be creative.
-        6.  The final output MUST be ONLY a single valid JSON object in a list, like `[ {{ ... }} ]`. Do not add any other text or markdown.
+        6.  The final output MUST be ONLY a valid JSON list of objects, like `[ {{ ... }} ]`. Do not add any other text or markdown.
 
         **Examples to pick from:**
         {examples_str}
@@ -231,52 +1129,37 @@ class GeminiClient:
           "answer": "The correct English translation"
         }}
         """
-        
-        response_text = self._generate(prompt)
-        
-        try:
-            # Clean the response and load the JSON
+
+        def parse(response_text: str) -> List[Dict[str, Any]]:
+            if _failed(response_text):
+                raise RuntimeError(response_text)
             cleaned_json_str = self._clean_json_response(response_text)
             if not cleaned_json_str.strip().startswith('['):
                 cleaned_json_str = f"[{cleaned_json_str}]"
-
             mcq_data = json.loads(cleaned_json_str)
-
-            # Post-process to add answer_index and other fields
-            processed_mcqs = []
-            for item in mcq_data:
-                if "answer" in item and "options" in item:
-                    # Ensure options are shuffled
-                    random.shuffle(item["options"])
-                    try:
-                        item["answer_index"] = item["options"].index(item["answer"])
-                        # Add other fields for compatibility
-                        item["transliteration"] = ""
-                        item["pos"] = ""
-                        item["answer_explanation"] = ""
-                        processed_mcqs.append(item)
-                    except ValueError:
-                        # The correct answer wasn't in the options, skip this item
-                        continue
-            
-            if processed_mcqs:
-                return processed_mcqs
-            else:
-                # Fallback if LLM output was invalid
+            items = [_mcq_item(entry, by_sinhala, choices) for entry in mcq_data if isinstance(entry, dict)]
+            items = [it for it in items if it is not None]
+            if not items:
                 raise ValueError("LLM produced invalid MCQ format.")
+            return items
 
-        except (json.JSONDecodeError, ValueError) as e:
-            print(f"LLM-based MCQ generation failed: {e}. Falling back to simple generator.")
-            # Fallback to the old method if LLM fails
-            from agent.functions import TutorFunctions
-            tf = TutorFunctions(self.vocab)
-            return tf.gen_mcq_simple_words(n=n, choices=choices)
+        return LLMRequest(prompt, "generate_mcq_with_llm", kid_safe, parse)
 
-    def summarize_session(self, words: List[str]) -> str:
-        """Generates a summary of the words learned in the session."""
-        if not words:
-            return "You haven't learned any new words in this session yet. Ask for a 'lesson' to get started!"
+    def generate_mcq_with_llm(self, seeds: Sequence[Dict[str, Any]], n: int = 1, choices: int = 4,
+                              kid_safe: bool = False) -> List[Dict[str, Any]]:
+        """
+        Generates MCQs with LLM-written distractors for words picked from ``seeds``
+        (items from ``TutorFunctions.gen_mcq_*_words``).
+        Questions that don't match a seed, or whose options are malformed, are
+        dropped; raises ValueError if none are left.
+        """
+        return self._run(self._generate_mcq_with_llm_request(seeds, n, choices, kid_safe))
 
+    async def generate_mcq_with_llm_async(self, seeds: Sequence[Dict[str, Any]], n: int = 1, choices: int = 4,
+                                          kid_safe: bool = False) -> List[Dict[str, Any]]:
+        return await self._run_async(self._generate_mcq_with_llm_request(seeds, n, choices, kid_safe))
+
+    def _summarize_session_request(self, words: List[str]) -> LLMRequest:
         words_str = ", ".join(f"'{w}'" for w in words)
         prompt = f"""
         **Persona:** You are a friendly and encouraging language coach.
@@ -294,4 +1177,44 @@ class GeminiClient:
         **Example Output:**
         "Wow, you've had a great session! Look at all the new words you've learned: 'word1', 'word2', 'word3'. That's fantastic progress! Keep up the amazing work, and you'll be an English expert in no time. Keep learning! 🚀"
         """
-        return self._generate(prompt)
\ No newline at end of file
+        return LLMRequest(prompt, "summarize_session")
+
+    def summarize_session(self, words: List[str]) -> str:
+        """Generates a summary of the words learned in the session."""
+        if not words:
+            return _EMPTY_SESSION
+        return self._run(self._summarize_session_request(words))
+
+    async def summarize_session_async(self, words: List[str]) -> str:
+        if not words:
+            return _EMPTY_SESSION
+        return await self._run_async(self._summarize_session_request(words))
+
+
+# Process-wide client registry: {(provider, api_key, model_name): GeminiClient}
+_clients: Dict[Tuple[str, str, str], GeminiClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_gemini_client(api_key: Optional[str] = None, model_name: str | None = None) -> GeminiClient:
+    """Return the shared GeminiClient for this API key and model, creating it on
+    first use. Raises ValueError like ``GeminiClient()`` when the LLM_PROVIDER
+    backend needs a key and none is configured.
+
+    ``genai.configure`` is process-global and resets the library's cached
+    transports, so it only runs when the key differs from the configured one.
+    """
+    kind = _provider_name()
+    key = _resolve_api_key(api_key) if _needs_api_key(kind) else ""
+    name = _resolve_model_name(model_name)
+    client = _clients.get((kind, key, name))
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get((kind, key, name))
+        if client is None:
+            if key and _configured_key != key:
+                _configure_genai(key)
+            client = GeminiClient(model_name=name, provider=make_provider(kind, key, name))
+            _clients[(kind, key, name)] = client
+    return client
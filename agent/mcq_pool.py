@@ -0,0 +1,164 @@
+"""Prefetched LLM-written MCQ items, so ``/quiz/mcq`` doesn't wait on the model.
+
+``McqPool`` keeps a bounded pool per key (quiz mode, choice count, kid-safe
+settings), for at most ``max_keys`` keys; the least recently used idle pool
+makes room for a new key. ``take`` pops items in O(1) each and, when a pool falls below its
+low-water mark, starts a background task that tops it up through the key's
+producer. Items already in the pool or recently served are dropped as
+duplicates. When a pool is empty the caller falls back to the local generators.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from .env import float_env
+
+Item = Dict[str, Any]
+Producer = Callable[[int], Awaitable[List[Item]]]
+
+
+def _item_key(item: Item) -> Tuple[str, str]:
+    return str(item.get("sinhala", "")).strip().lower(), str(item.get("answer", "")).strip().lower()
+
+
+class _Slot:
+    def __init__(self):
+        self.items: Deque[Item] = deque()
+        self.keys: set = set()
+        self.recent: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self.task: Optional[asyncio.Task] = None
+        self.retry_at = 0.0
+        self.counters = {"served": 0, "short": 0, "produced": 0, "duplicates": 0, "failed_calls": 0}
+
+
+class McqPool:
+    """Per-key pools of at most ``size`` items, refilled below ``low`` with
+    ``parallel`` producer calls of ``batch`` items at a time. A refill round
+    that adds nothing (errors or only duplicates) pauses refills for ``retry_s``.
+    Beyond ``max_keys`` keys, least recently used pools without a refill in
+    flight are dropped. ``take`` must be called from the event loop."""
+
+    def __init__(self, size: int = 50, low: Optional[int] = None, batch: int = 5, parallel: int = 2,
+                 recent: int = 500, retry_s: float = 30.0, max_keys: int = 16):
+        self.size = max(0, size)
+        self.low = self.size // 2 if low is None else max(0, min(low, self.size))
+        self.batch = max(1, batch)
+        self.parallel = max(1, parallel)
+        self.recent = max(0, recent)
+        self.retry_s = retry_s
+        self.max_keys = max(1, max_keys)
+        self._slots: "OrderedDict[Hashable, _Slot]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "McqPool":
+        return cls(
+            size=int(float_env("MCQ_POOL_SIZE", 50)),
+            batch=int(float_env("MCQ_POOL_BATCH", 5)),
+            parallel=int(float_env("MCQ_POOL_PARALLEL", 2)),
+            recent=int(float_env("MCQ_POOL_RECENT", 500)),
+            retry_s=float_env("MCQ_POOL_RETRY_S", 30.0),
+            max_keys=int(float_env("MCQ_POOL_KEYS", 16)),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def take(self, key: Hashable, n: int, producer: Producer) -> List[Item]:
+        """Up to ``n`` items from the pool for ``key`` (fewer, possibly none, if
+        it is running low); schedules a top-up through ``producer``."""
+        slot = self._slot(key)
+        out: List[Item] = []
+        while slot.items and len(out) < n:
+            item = slot.items.popleft()
+            k = _item_key(item)
+            slot.keys.discard(k)
+            self._remember(slot, k)
+            out.append(item)
+        slot.counters["served"] += len(out)
+        slot.counters["short"] += len(out) < n
+        self._schedule(slot, producer)
+        return out
+
+    def warm(self, key: Hashable, producer: Producer) -> None:
+        """Start filling the pool for ``key`` before the first request."""
+        self._schedule(self._slot(key), producer)
+
+    def reset(self) -> None:
+        """Drop every pool (e.g. after a vocabulary reload). Refills in flight
+        finish into the dropped pools."""
+        self._slots = OrderedDict()
+
+    def _slot(self, key: Hashable) -> _Slot:
+        slot = self._slots.get(key)
+        if slot is not None:
+            self._slots.move_to_end(key)
+            return slot
+        if len(self._slots) >= self.max_keys:
+            idle = [k for k, s in self._slots.items() if s.task is None or s.task.done()]
+            for k in idle[: len(self._slots) - self.max_keys + 1]:
+                del self._slots[k]
+        slot = self._slots[key] = _Slot()
+        return slot
+
+    def _remember(self, slot: _Slot, key: Tuple[str, str]) -> None:
+        if not self.recent:
+            return
+        slot.recent[key] = None
+        slot.recent.move_to_end(key)
+        if len(slot.recent) > self.recent:
+            slot.recent.popitem(last=False)
+
+    def _schedule(self, slot: _Slot, producer: Producer) -> None:
+        if not self.enabled or len(slot.items) > self.low:
+            return
+        if slot.task is not None and not slot.task.done():
+            return
+        if time.monotonic() < slot.retry_at:
+            return
+        slot.task = asyncio.get_running_loop().create_task(self._fill(slot, producer))
+
+    def _offer(self, slot: _Slot, item: Item) -> bool:
+        k = _item_key(item)
+        if k in slot.keys or k in slot.recent or len(slot.items) >= self.size:
+            slot.counters["duplicates"] += 1
+            return False
+        slot.items.append(item)
+        slot.keys.add(k)
+        slot.counters["produced"] += 1
+        return True
+
+    async def _fill(self, slot: _Slot, producer: Producer) -> None:
+        while len(slot.items) < self.size:
+            calls = min(self.parallel, math.ceil((self.size - len(slot.items)) / self.batch))
+            results = await asyncio.gather(*[producer(self.batch) for _ in range(calls)], return_exceptions=True)
+            added = 0
+            for res in results:
+                if isinstance(res, Exception):
+                    slot.counters["failed_calls"] += 1
+                    print(f"MCQ prefetch failed: {res}")
+                    continue
+                added += sum(self._offer(slot, item) for item in res)
+            if not added:
+                slot.retry_at = time.monotonic() + self.retry_s
+                return
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "size": self.size,
+            "low": self.low,
+            "max_keys": self.max_keys,
+            "pools": [
+                {
+                    "key": list(key) if isinstance(key, tuple) else key,
+                    "items": len(slot.items),
+                    "refilling": slot.task is not None and not slot.task.done(),
+                    **slot.counters,
+                }
+                for key, slot in list(self._slots.items())
+            ],
+        }
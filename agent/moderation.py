@@ -0,0 +1,281 @@
+"""Tiered moderation in front of the LLM moderator.
+
+1. A content-hash verdict cache: the same text (whitespace-normalized) is only
+   moderated once per policy and model.
+2. ``LocalScreen``: one pass of a compiled multi-pattern matcher over English and
+   Sinhala terms, scored by a small logistic model over the weighted matches.
+   Text scoring above MODERATION_UNSAFE_ABOVE is settled as unsafe. Text
+   without any weighted term is settled as safe, or, with
+   MODERATION_SAFE_BELOW set, only text scoring below that threshold.
+3. Only the ambiguous rest goes to the LLM (``GeminiClient.moderate_text(s)``).
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .cache import ResponseCache
+from .env import bool_env, float_env
+from .kidsafe import AhoCorasick, DEFAULT_BANNED, banned_terms_from_env
+
+Verdict = Dict[str, object]
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parents[1] / "data" / ".cache" / "moderation.sqlite3"
+
+STRONG, WEAK, MILD = 8.0, 3.0, 1.5
+# Weights of the features beyond listed terms: per word disguised with digits
+# or symbols (k1ll, f*ck), and for length (full weight at LONG_TEXT_WORDS words)
+OBFUSCATED, LONG_TEXT, LONG_TEXT_WORDS = 2.0, 2.0, 20
+
+# term -> (weight, category). A trailing "*" also matches longer words starting
+# with the term (inflections); other terms match whole words only. Sinhala
+# terms are stems, since Sinhala inflects with suffixes.
+LEXICON: Dict[str, Tuple[float, str]] = {
+    # English
+    "fuck*": (STRONG, "profanity"), "shit*": (STRONG, "profanity"), "bitch*": (STRONG, "profanity"),
+    "porn*": (STRONG, "sexual"), "nude*": (STRONG, "sexual"), "naked": (STRONG, "sexual"), "sex": (STRONG, "sexual"),
+    "sexy": (STRONG, "sexual"), "sexual*": (STRONG, "sexual"), "tits": (STRONG, "sexual"), "rape*": (STRONG, "sexual"),
+    "rapist*": (STRONG, "sexual"), "suicid*": (STRONG, "self-harm"), "cocaine": (STRONG, "drugs"), "heroin": (STRONG, "drugs"),
+    "kill*": (WEAK, "violence"), "murder*": (WEAK, "violence"), "stab*": (WEAK, "violence"), "shoot*": (WEAK, "violence"),
+    "gun*": (WEAK, "violence"), "weapon*": (WEAK, "violence"), "knife": (WEAK, "violence"), "knives": (WEAK, "violence"),
+    "bomb*": (WEAK, "violence"), "terror*": (WEAK, "violence"), "violen*": (WEAK, "violence"), "blood*": (WEAK, "violence"),
+    "die": (WEAK, "violence"), "dies": (WEAK, "violence"), "died": (WEAK, "violence"), "dying": (WEAK, "violence"),
+    "dead": (WEAK, "violence"), "death*": (WEAK, "violence"), "war": (WEAK, "violence"), "wars": (WEAK, "violence"),
+    "fight*": (WEAK, "violence"), "attack*": (WEAK, "violence"), "bully*": (WEAK, "hate"), "hate*": (WEAK, "hate"),
+    "drug*": (WEAK, "drugs"), "drunk*": (WEAK, "drugs"), "alcohol*": (WEAK, "drugs"), "beer*": (WEAK, "drugs"),
+    "wine": (WEAK, "drugs"), "cigarette*": (WEAK, "drugs"), "smok*": (WEAK, "drugs"), "breast*": (WEAK, "sexual"),
+    "stupid": (MILD, "profanity"), "idiot*": (MILD, "profanity"), "dumb": (MILD, "profanity"), "damn*": (MILD, "profanity"),
+    "hell": (MILD, "profanity"), "ugly": (MILD, "hate"), "hurt*": (MILD, "violence"),
+    # Sinhala
+    "ලිංගික*": (STRONG, "sexual"), "කුණුහරප*": (STRONG, "profanity"), "සියදිවි*": (STRONG, "self-harm"),
+    "මරනවා*": (WEAK, "violence"), "මරා*": (WEAK, "violence"), "මිනීමැරු*": (WEAK, "violence"), "තුවක්කු*": (WEAK, "violence"),
+    "බෝම්බ*": (WEAK, "violence"), "ත්‍රස්ත*": (WEAK, "violence"), "මරණ*": (WEAK, "violence"), "වෛර*": (WEAK, "hate"),
+    "මත්ද්‍රව්‍ය*": (WEAK, "drugs"), "ගංජා*": (WEAK, "drugs"), "මත්පැන්*": (WEAK, "drugs"), "අරක්කු*": (WEAK, "drugs"),
+}
+
+_WS_RE = re.compile(r"\s+")
+# A letter next to a digit or symbol inside a word, e.g. k1ll, sh!t, f*ck
+_OBFUSCATED_RE = re.compile(r"(?i)(?:[a-z][0-9@$*!|]+[a-z0-9]|[0-9@$*!|][a-z])")
+
+
+def _word_char(ch: str) -> bool:
+    # Sinhala vowel signs are combining marks and conjuncts use zero-width joiners
+    return ch.isalnum() or ch in "_\u200c\u200d" or unicodedata.category(ch).startswith("M")
+
+
+class LocalScreen:
+    """Lexicon pre-screen with a small logistic model: P(unsafe) = sigmoid(bias
+    + the weights of the distinct terms found + OBFUSCATED per disguised word
+    + LONG_TEXT scaled by length). Text with a term scoring at or above
+    ``unsafe_above`` is settled as unsafe. Without ``safe_below`` any text with
+    no term is settled as safe; with it, only text scoring below it is, so
+    paraphrased or misspelled content still reaches the LLM. Anything else is
+    left to the LLM."""
+
+    def __init__(self, lexicon: Mapping[str, Tuple[float, str]], bias: float = -4.0, unsafe_above: float = 0.95,
+                 safe_below: Optional[float] = None):
+        self.bias = bias
+        self.unsafe_above = unsafe_above
+        self.safe_below = safe_below
+        self._terms: Dict[str, Tuple[float, str, bool]] = {}
+        for term, (weight, category) in lexicon.items():
+            prefix = term.endswith("*")
+            self._terms[term.rstrip("*").lower()] = (weight, category, prefix)
+        self._matcher = AhoCorasick(self._terms)
+        self.version = hashlib.sha256(
+            json.dumps(
+                [sorted(self._terms.items()), bias, unsafe_above, safe_below, OBFUSCATED, LONG_TEXT, LONG_TEXT_WORDS],
+                ensure_ascii=False,
+            ).encode("utf-8")
+        ).hexdigest()[:16]
+
+    def matches(self, text: str) -> Dict[str, Tuple[float, str]]:
+        """Distinct lexicon terms in ``text``, at word boundaries, with weight and category."""
+        lowered = text.lower()
+        found: Dict[str, Tuple[float, str]] = {}
+        for start, term in self._matcher.find_all(lowered):
+            weight, category, prefix = self._terms[term]
+            end = start + len(term)
+            if start > 0 and _word_char(lowered[start - 1]):
+                continue
+            if not prefix and end < len(lowered) and _word_char(lowered[end]):
+                continue
+            found[term] = (weight, category)
+        return found
+
+    def score(self, text: str, found: Optional[Mapping[str, Tuple[float, str]]] = None) -> float:
+        """P(unsafe) for ``text``; ``found`` are its ``matches`` if already known."""
+        if found is None:
+            found = self.matches(text)
+        words = text.split()
+        z = self.bias + sum(w for w, _ in found.values())
+        z += OBFUSCATED * sum(1 for w in words if _OBFUSCATED_RE.search(w))
+        z += LONG_TEXT * min(len(words), LONG_TEXT_WORDS) / LONG_TEXT_WORDS
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def screen(self, text: str) -> Optional[Verdict]:
+        """A verdict when the text is clearly safe or clearly unsafe, else None."""
+        found = self.matches(text)
+        if not found and self.safe_below is None:
+            return {"safe": True, "reasons": []}
+        p = self.score(text, found)
+        if found and p >= self.unsafe_above:
+            return {"safe": False, "reasons": sorted({c for _, c in found.values()})}
+        if self.safe_below is not None and p < self.safe_below:
+            return {"safe": True, "reasons": []}
+        return None
+
+
+def local_screen_from_env() -> LocalScreen:
+    """``LocalScreen`` over ``LEXICON`` plus KID_SAFE_BANNED terms (as strong
+    prefix terms), with MODERATION_UNSAFE_ABOVE as the unsafe threshold and
+    MODERATION_SAFE_BELOW (unset or 0: off) as the safe one."""
+    lexicon = dict(LEXICON)
+    known = {t.rstrip("*").lower() for t in lexicon} | {t.lower() for t in DEFAULT_BANNED}
+    for term in banned_terms_from_env():
+        if term.lower() not in known:
+            lexicon[term.lower() + "*"] = (STRONG, "banned_term")
+    return LocalScreen(
+        lexicon,
+        unsafe_above=float_env("MODERATION_UNSAFE_ABOVE", 0.95),
+        safe_below=float_env("MODERATION_SAFE_BELOW", 0.0) or None,
+    )
+
+
+class ModerationPipeline:
+    """Verdict cache, then ``LocalScreen``, then the LLM for what is left.
+
+    The LLM tier is a callable taking the pending texts and returning one
+    verdict or None (no usable reply) per text. None is never cached and is
+    counted as ``llm_no_verdict`` rather than ``llm``; by default it is served
+    as safe, like an unparseable moderation reply, while ``allow_none=True``
+    returns it as None so the caller can retry or keep the text unmoderated.
+    Exceptions from the LLM tier (e.g. the circuit breaker is open) propagate
+    to the caller.
+    """
+
+    def __init__(self, screen: Optional[LocalScreen], cache: Optional[ResponseCache]):
+        self.screen = screen
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._counters = {"texts": 0, "cache_hits": 0, "local_safe": 0, "local_unsafe": 0, "llm": 0, "llm_no_verdict": 0}
+
+    def _key(self, text: str, model_name: str) -> str:
+        normalized = _WS_RE.sub(" ", text).strip()
+        version = self.screen.version if self.screen is not None else "llm-only"
+        raw = json.dumps([version, model_name, normalized], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _count(self, field: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[field] += n
+
+    def _settle(self, texts: Sequence[str], model_name: str) -> Tuple[List[Optional[Verdict]], List[str], Dict[str, List[int]]]:
+        """Cached and locally settled verdicts, plus the distinct texts left for
+        the LLM with the positions of each."""
+        results: List[Optional[Verdict]] = [None] * len(texts)
+        keys = [self._key(t, model_name) for t in texts]
+        pending: Dict[str, List[int]] = {}
+        self._count("texts", len(texts))
+        for i, (text, key) in enumerate(zip(texts, keys)):
+            if key in pending:
+                pending[key].append(i)
+                continue
+            raw = self.cache.get(key, "moderation") if self.cache is not None else None
+            if raw is not None:
+                results[i] = json.loads(raw)
+                self._count("cache_hits")
+                continue
+            verdict = self.screen.screen(text) if self.screen is not None else None
+            if verdict is not None:
+                results[i] = verdict
+                self._count("local_safe" if verdict["safe"] else "local_unsafe")
+                if self.cache is not None:
+                    self.cache.set(key, json.dumps(verdict, ensure_ascii=False))
+                continue
+            pending[key] = [i]
+        return results, [texts[idx[0]] for idx in pending.values()], pending
+
+    def _finish(self, results: List[Optional[Verdict]], pending: Dict[str, List[int]],
+                verdicts: Sequence[Optional[Verdict]], allow_none: bool) -> List[Optional[Verdict]]:
+        for (key, idx), verdict in zip(pending.items(), verdicts):
+            if verdict is None:
+                self._count("llm_no_verdict")
+                if not allow_none:
+                    verdict = {"safe": True, "reasons": []}
+            else:
+                self._count("llm")
+                if self.cache is not None:
+                    self.cache.set(key, json.dumps(verdict, ensure_ascii=False))
+            for i in idx:
+                results[i] = verdict
+        # Copies, so callers can add reasons without touching shared verdicts
+        return [None if r is None else {"safe": r["safe"], "reasons": list(r["reasons"])} for r in results]
+
+    def moderate_many(self, texts: Sequence[str], model_name: str,
+                      llm: Callable[[List[str]], List[Optional[Verdict]]],
+                      allow_none: bool = False) -> List[Optional[Verdict]]:
+        results, todo, pending = self._settle(texts, model_name)
+        return self._finish(results, pending, llm(todo) if todo else [], allow_none)
+
+    async def moderate_many_async(self, texts: Sequence[str], model_name: str,
+                                  llm: Callable[[List[str]], Awaitable[List[Optional[Verdict]]]],
+                                  allow_none: bool = False) -> List[Optional[Verdict]]:
+        # The cache lookups and writes may touch SQLite; keep them off the event loop
+        results, todo, pending = await asyncio.to_thread(self._settle, texts, model_name)
+        verdicts = await llm(todo) if todo else []
+        return await asyncio.to_thread(self._finish, results, pending, verdicts, allow_none)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counters = dict(self._counters)
+        settled = counters["cache_hits"] + counters["local_safe"] + counters["local_unsafe"]
+        llm_calls = counters["llm"] + counters["llm_no_verdict"]
+        return {
+            "local_screen": self.screen is not None,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            **counters,
+            "llm_share": round(llm_calls / (llm_calls + settled), 3) if llm_calls + settled else None,
+        }
+
+
+_pipeline: Optional[ModerationPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_moderation() -> ModerationPipeline:
+    """Process-wide pipeline configured from env on first use.
+
+    MODERATION_LOCAL=0 sends every uncached text to the LLM. MODERATION_CACHE=0
+    disables the verdict cache; MODERATION_CACHE_PATH (SQLite file, "" for
+    memory only), MODERATION_CACHE_SIZE and MODERATION_CACHE_TTL configure it.
+    """
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                cache = None
+                if bool_env("MODERATION_CACHE", True):
+                    path_env = os.getenv("MODERATION_CACHE_PATH")
+                    path = DEFAULT_CACHE_PATH if path_env is None else (Path(path_env) if path_env.strip() else None)
+                    cache = ResponseCache(
+                        path=path,
+                        max_entries=int(float_env("MODERATION_CACHE_SIZE", 4096)),
+                        ttl_seconds=float_env("MODERATION_CACHE_TTL", 7 * 24 * 3600),
+                    )
+                screen = local_screen_from_env() if bool_env("MODERATION_LOCAL", True) else None
+                _pipeline = ModerationPipeline(screen, cache)
+    return _pipeline
+
+
+def moderation_stats() -> Dict[str, object]:
+    """Pipeline counters, as served by ``GET /moderate/stats``."""
+    return get_moderation().stats()
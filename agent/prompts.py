@@ -0,0 +1,175 @@
+"""Prompt sizing: precompiled templates, a token budget for corpus context, and
+prompt-size telemetry.
+
+Corpus rows are often full sentences, so the context blocks appended to
+prompts dominate input length. ``context_lines`` renders rows best-first and
+stops once LLM_CONTEXT_TOKENS is used, clipping overlong fields to
+LLM_CONTEXT_FIELD_CHARS. ``prompt_stats()`` reports prompt sizes and upstream
+latency per endpoint and per size bucket.
+"""
+from __future__ import annotations
+
+import threading
+from string import Formatter
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .env import float_env
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: about 4 UTF-8 bytes per token. English words are about
+    one token; a Sinhala letter is 3 bytes, matching how poorly Sinhala
+    tokenizes. Only used for budgeting and telemetry, never sent upstream."""
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+class PromptTemplate:
+    """A ``str.format``-style template parsed once; ``render`` only joins the
+    static parts with the field values."""
+
+    def __init__(self, text: str):
+        self._parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _spec, _conv in Formatter().parse(text)
+        ]
+        self.fields = tuple(dict.fromkeys(f for _, f in self._parts if f))
+        self.static_tokens = estimate_tokens("".join(literal for literal, _ in self._parts))
+
+    def render(self, **values: Any) -> str:
+        out: List[str] = []
+        for literal, field in self._parts:
+            out.append(literal)
+            if field is not None:
+                out.append(str(values[field]))
+        return "".join(out)
+
+
+def context_budget() -> int:
+    """Token budget for a prompt's corpus context (LLM_CONTEXT_TOKENS, 0 = unlimited)."""
+    return max(0, int(float_env("LLM_CONTEXT_TOKENS", 400)))
+
+
+def _field_chars() -> int:
+    return max(0, int(float_env("LLM_CONTEXT_FIELD_CHARS", 160)))
+
+
+def clip(text: str, limit: int) -> str:
+    """``text`` cut to at most ``limit`` characters, at a word boundary when possible."""
+    text = " ".join(str(text).split())
+    if not limit or len(text) <= limit:
+        return text
+    cut = text[:limit - 1]
+    if " " in cut[limit // 2:]:
+        cut = cut[:cut.rindex(" ")]
+    return cut + "…"
+
+
+def context_lines(
+    rows: Optional[Sequence[Mapping[str, Any]]],
+    render: Callable[[Dict[str, str]], str],
+    endpoint: str,
+    limit: Optional[int] = None,
+    budget: Optional[int] = None,
+) -> List[str]:
+    """Render up to ``limit`` context rows, in retrieval rank order, until
+    ``budget`` tokens (default: LLM_CONTEXT_TOKENS) are used.
+
+    Rows come best match first, so the lowest-scored rows are dropped.
+    Overlong sinhala/english fields are clipped first, so a long sentence
+    doesn't push better-ranked rows out.
+    """
+    rows = list(rows or [])[:limit]
+    budget = context_budget() if budget is None else budget
+    field_chars = _field_chars()
+    lines: List[str] = []
+    used = clipped = 0
+    for row in rows:
+        fields = {}
+        for key in ("sinhala", "english"):
+            value = str(row.get(key, "") or "")
+            fields[key] = clip(value, field_chars)
+            clipped += fields[key] != " ".join(value.split())
+        line = render(fields)
+        cost = estimate_tokens(line) + 1  # newline
+        if budget and used + cost > budget:
+            break
+        lines.append(line)
+        used += cost
+    telemetry.record_context(endpoint, kept=len(lines), dropped=len(rows) - len(lines), clipped=clipped)
+    return lines
+
+
+# Upper bounds (estimated tokens) of the prompt-size buckets in the telemetry
+_BUCKETS = (250, 500, 1000, 2000, 4000)
+
+
+def _bucket(tokens: int) -> str:
+    for bound in _BUCKETS:
+        if tokens < bound:
+            return f"<{bound}"
+    return f">={_BUCKETS[-1]}"
+
+
+class PromptTelemetry:
+    """Prompt sizes and upstream latency per endpoint label, plus latency by
+    prompt-size bucket to show how much of it comes from input length."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Dict[str, float]] = {}
+        self._buckets: Dict[str, Dict[str, float]] = {}
+
+    def _endpoint(self, endpoint: str) -> Dict[str, float]:
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = {
+                "calls": 0, "prompt_tokens": 0, "max_prompt_tokens": 0, "latency_s": 0.0,
+                "context_rows": 0, "context_rows_dropped": 0, "context_fields_clipped": 0,
+            }
+        return stats
+
+    def record_call(self, endpoint: str, prompt: str, latency_s: float) -> None:
+        """One upstream call (cache hits never reach the model and are not counted)."""
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats["calls"] += 1
+            stats["prompt_tokens"] += tokens
+            stats["max_prompt_tokens"] = max(stats["max_prompt_tokens"], tokens)
+            stats["latency_s"] += latency_s
+            bucket = self._buckets.setdefault(_bucket(tokens), {"calls": 0, "prompt_tokens": 0, "latency_s": 0.0})
+            bucket["calls"] += 1
+            bucket["prompt_tokens"] += tokens
+            bucket["latency_s"] += latency_s
+
+    def record_context(self, endpoint: str, kept: int, dropped: int, clipped: int) -> None:
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats["context_rows"] += kept
+            stats["context_rows_dropped"] += dropped
+            stats["context_fields_clipped"] += clipped
+
+    def stats(self) -> Dict[str, object]:
+        def summary(s: Dict[str, float]) -> Dict[str, object]:
+            calls = s["calls"]
+            out = {k: v for k, v in s.items() if k not in {"prompt_tokens", "latency_s"}}
+            out["avg_prompt_tokens"] = round(s["prompt_tokens"] / calls) if calls else None
+            out["avg_latency_ms"] = round(s["latency_s"] * 1000 / calls, 1) if calls else None
+            return out
+
+        with self._lock:
+            endpoints = {k: summary(v) for k, v in self._endpoints.items()}
+            buckets = {k: summary(v) for k, v in self._buckets.items()}
+        order = [f"<{b}" for b in _BUCKETS] + [f">={_BUCKETS[-1]}"]
+        return {
+            "context_budget_tokens": context_budget(),
+            "endpoints": endpoints,
+            "by_prompt_tokens": {k: buckets[k] for k in order if k in buckets},
+        }
+
+
+telemetry = PromptTelemetry()
+
+
+def prompt_stats() -> Dict[str, object]:
+    """Prompt-size telemetry, as served by ``GET /llm/prompts``."""
+    return telemetry.stats()
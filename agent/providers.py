@@ -0,0 +1,338 @@
+"""LLM backends behind ``GeminiClient``.
+
+A provider turns a prompt into reply text and raises on failure; caching,
+coalescing, concurrency limits and error strings stay in ``GeminiClient``.
+Besides the real Gemini backend (``agent.llm.GeminiProvider``) there are:
+
+- ``StubProvider``: deterministic canned replies per endpoint with a
+  configurable latency distribution, for offline load tests and benchmarks.
+- ``RecordingProvider`` / ``ReplayProvider``: capture another provider's
+  replies to a JSONL file and serve them back without network access.
+
+``LLM_PROVIDER`` (gemini, stub, record, replay) selects the backend; see
+``agent.llm.make_provider``.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+DEFAULT_RECORDING_PATH = Path(__file__).resolve().parents[1] / "data" / "llm_recording.jsonl"
+
+
+class LLMProvider:
+    """Backend interface. ``native_async`` providers are awaited directly;
+    the others run ``generate``/``stream`` on the LLM thread pool."""
+
+    name = "llm"
+    native_async = False
+
+    def generate(self, prompt: str, endpoint: str) -> str:
+        raise NotImplementedError
+
+    async def generate_async(self, prompt: str, endpoint: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, endpoint: str) -> Iterator[str]:
+        """Reply text chunk by chunk; by default the whole reply as one chunk."""
+        yield self.generate(prompt, endpoint)
+
+    async def stream_async(self, prompt: str, endpoint: str) -> AsyncIterator[str]:
+        yield await self.generate_async(prompt, endpoint)
+
+
+def prompt_digest(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _split_words(text: str, per_chunk: int = 4) -> List[str]:
+    # Keep the separators so the chunks join back to the exact reply
+    words = re.findall(r"\S+\s*|\s+", text)
+    return ["".join(words[i:i + per_chunk]) for i in range(0, len(words), per_chunk)] or [text]
+
+
+# How the numbered items of each batched prompt are written (see GeminiClient/DictionaryEnricher)
+_BATCH_ITEM_PATTERNS = {
+    "explain_mcq_answers": re.compile(r"^(\d+)\. '", re.M),
+    "moderate_texts": re.compile(r"^\[(\d+)\]$", re.M),
+    "dictionary_enrich_batch": re.compile(r"^Item (\d+)\.", re.M),
+}
+
+# Seed words of an MCQ generation prompt ("- <sinhala> -> <english>") and its distractor count
+_MCQ_EXAMPLE = re.compile(r"^\s*- (.+?) -> (.+?)\s*$", re.M)
+_MCQ_DISTRACTORS = re.compile(r"Generate (\d+) incorrect")
+_STUB_DISTRACTORS = ["apple", "river", "chair", "green", "happy", "window", "seven", "bird"]
+
+# Headword, Sinhala, transliteration and POS are left to the input fields
+_ENTRY = {
+    "definition_en": "A single unit of language that has meaning.",
+    "examples_en": ["This is a word.", "Say the word again."],
+    "explanation_si": "භාෂාවේ අර්ථයක් ඇති ඒකකයක්.",
+    "examples_si": ["මේ වචනයක්.", "ඒ වචනය නැවත කියන්න."],
+    "synonyms_en": ["term"],
+    "notes_si": "",
+}
+
+_CANNED: Dict[str, str] = {
+    "translate": "Hello",
+    "explain_word": (
+        "බලන්න ඔයා මේ වචනෙ දන්නව ද කියල 🙈\n\n### 📖 Word: word\n\n"
+        "**1. Definition:** A single unit of language that has meaning.\n\n"
+        "**2. Example Sentences:**\n*   **Simple:** This is a word.\n*   **Complex:** Choose each word with care.\n\n"
+        "**3. Synonyms & Antonyms:**\n*   **Synonyms:** term\n*   **Antonyms:** -\n\n"
+        "**4. Fun Fact / Etymology:** Word comes from Old English.\n\n"
+        "**5. Sinhala translation:** වචනය"
+    ),
+    "kid_explain": json.dumps({
+        "word": "word",
+        "explanation": "A word is a sound or a group of letters that means something.",
+        "example": "The word is big.",
+        "fun_fact": "English has more than a million words! 🎉",
+    }, ensure_ascii=False),
+    "generate_quiz": json.dumps([{"sinhala": "ගුරු", "answer": "teacher"}], ensure_ascii=False),
+    "answer_with_context": "Here is a short answer based on the vocabulary.",
+    "explain_mcq_answer": "This word names a common thing. In Sinhala it is වචනය.",
+    "kid_story": "Once upon a time a happy cat found a red ball. 🐱 They played all day! සතුටු පූසා බෝලයක් සොයා ගත්තා.",
+    "kid_feedback": "Great try! 🌟 The answer is the word we practised.",
+    "moderate_text": json.dumps({"safe": True, "reasons": []}),
+    "generate_mcq_with_llm": json.dumps(
+        [{"sinhala": "ගුරු", "options": ["teacher", "doctor", "farmer", "driver"], "answer": "teacher"}],
+        ensure_ascii=False,
+    ),
+    "summarize_session": "Wow, you've had a great session! Keep learning! 🚀",
+    "dictionary_enrich": json.dumps(_ENTRY, ensure_ascii=False),
+}
+
+_CANNED_ITEMS: Dict[str, Dict[str, object]] = {
+    "explain_mcq_answers": {"explanation": "This word names a common thing. In Sinhala it is වචනය."},
+    "moderate_texts": {"safe": True, "reasons": []},
+    "dictionary_enrich_batch": _ENTRY,
+}
+
+
+class StubProvider(LLMProvider):
+    """Deterministic local stand-in: the reply depends only on the endpoint
+    (and, for batched prompts, on the number of items; for MCQ generation, on
+    the seed words), so parsers and fallbacks behave as with a well-formed
+    model reply.
+
+    Latency is drawn per call around ``latency_ms``:
+    "fixed"; "uniform" within ±``spread`` of it (a fraction); or "lognormal"
+    with median ``latency_ms`` and shape ``spread``. ``seed`` makes the latency
+    sequence reproducible. ``responses`` overrides replies per endpoint.
+    """
+
+    name = "stub"
+    native_async = True
+
+    DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+    def __init__(self, latency_ms: float = 0.0, distribution: str = "fixed", spread: float = 0.5,
+                 seed: Optional[int] = 0, responses: Optional[Dict[str, str]] = None):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution!r}")
+        self.latency_ms = max(0.0, float(latency_ms))
+        self.distribution = distribution
+        self.spread = max(0.0, float(spread))
+        self.responses = dict(responses or {})
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Seconds the next call takes."""
+        with self._lock:
+            self.calls += 1
+            if self.latency_ms <= 0 or self.distribution == "fixed":
+                ms = self.latency_ms
+            elif self.distribution == "uniform":
+                ms = self.latency_ms * (1 + self._rng.uniform(-self.spread, self.spread))
+            else:
+                ms = self.latency_ms * math.exp(self._rng.gauss(0.0, self.spread))
+        return max(0.0, ms) / 1000.0
+
+    def reply(self, prompt: str, endpoint: str) -> str:
+        if endpoint in self.responses:
+            return self.responses[endpoint]
+        if endpoint == "generate_mcq_with_llm" and _MCQ_EXAMPLE.search(prompt):
+            return self._mcq_reply(prompt)
+        pattern = _BATCH_ITEM_PATTERNS.get(endpoint)
+        if pattern is not None:
+            ids = sorted({int(i) for i in pattern.findall(prompt)})
+            return json.dumps({"items": [{"id": i, **_CANNED_ITEMS[endpoint]} for i in ids]}, ensure_ascii=False)
+        return _CANNED.get(endpoint, "OK")
+
+    @staticmethod
+    def _mcq_reply(prompt: str) -> str:
+        """One question per seed word in the prompt, with fixed distractors."""
+        m = _MCQ_DISTRACTORS.search(prompt)
+        k = int(m.group(1)) if m else 3
+        questions = []
+        for sinhala, english in _MCQ_EXAMPLE.findall(prompt):
+            distractors = [w for w in _STUB_DISTRACTORS if w != english.lower()][:k]
+            questions.append({"sinhala": sinhala, "options": [english] + distractors, "answer": english})
+        return json.dumps(questions, ensure_ascii=False)
+
+    def generate(self, prompt: str, endpoint: str) -> str:
+        time.sleep(self.delay())
+        return self.reply(prompt, endpoint)
+
+    async def generate_async(self, prompt: str, endpoint: str) -> str:
+        await asyncio.sleep(self.delay())
+        return self.reply(prompt, endpoint)
+
+    def stream(self, prompt: str, endpoint: str) -> Iterator[str]:
+        chunks = _split_words(self.reply(prompt, endpoint))
+        step = self.delay() / len(chunks)
+        for chunk in chunks:
+            time.sleep(step)
+            yield chunk
+
+    async def stream_async(self, prompt: str, endpoint: str) -> AsyncIterator[str]:
+        chunks = _split_words(self.reply(prompt, endpoint))
+        step = self.delay() / len(chunks)
+        for chunk in chunks:
+            await asyncio.sleep(step)
+            yield chunk
+
+
+class RecordingProvider(LLMProvider):
+    """Pass calls through to ``inner`` and append each successful reply to a
+    JSONL file: ``{"prompt_sha256", "endpoint", "text", "chunks", "latency_ms"}``."""
+
+    name = "record"
+
+    def __init__(self, inner: LLMProvider, path: Path = DEFAULT_RECORDING_PATH):
+        self.inner = inner
+        self.native_async = inner.native_async
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _record(self, prompt: str, endpoint: str, chunks: List[str], started: float) -> None:
+        text = "".join(chunks)
+        if text.startswith("[Gemini Error"):
+            return
+        line = json.dumps({
+            "prompt_sha256": prompt_digest(prompt),
+            "endpoint": endpoint,
+            "text": text,
+            "chunks": chunks if len(chunks) > 1 else None,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        }, ensure_ascii=False)
+        with self._lock, self.path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def generate(self, prompt: str, endpoint: str) -> str:
+        started = time.perf_counter()
+        text = self.inner.generate(prompt, endpoint)
+        self._record(prompt, endpoint, [text], started)
+        return text
+
+    async def generate_async(self, prompt: str, endpoint: str) -> str:
+        started = time.perf_counter()
+        text = await self.inner.generate_async(prompt, endpoint)
+        self._record(prompt, endpoint, [text], started)
+        return text
+
+    def stream(self, prompt: str, endpoint: str) -> Iterator[str]:
+        started = time.perf_counter()
+        chunks: List[str] = []
+        for chunk in self.inner.stream(prompt, endpoint):
+            chunks.append(chunk)
+            yield chunk
+        self._record(prompt, endpoint, chunks, started)
+
+    async def stream_async(self, prompt: str, endpoint: str) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        chunks: List[str] = []
+        async for chunk in self.inner.stream_async(prompt, endpoint):
+            chunks.append(chunk)
+            yield chunk
+        self._record(prompt, endpoint, chunks, started)
+
+
+class ReplayProvider(LLMProvider):
+    """Serve replies captured by ``RecordingProvider``, matched by prompt hash.
+
+    Prompts that were not recorded raise ``LookupError`` (so handlers take
+    their usual fallbacks) or go to ``fallback`` when one is given. With
+    ``timing`` the recorded latency is replayed too.
+    """
+
+    name = "replay"
+    native_async = True
+
+    def __init__(self, path: Path = DEFAULT_RECORDING_PATH, timing: bool = False,
+                 fallback: Optional[LLMProvider] = None):
+        self.path = Path(path)
+        self.timing = timing
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+        self._records: Dict[str, Dict[str, object]] = {}
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by an interrupted recording
+                    self._records[rec["prompt_sha256"]] = rec  # the latest recording wins
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _lookup(self, prompt: str) -> Optional[Dict[str, object]]:
+        rec = self._records.get(prompt_digest(prompt))
+        if rec is None:
+            self.misses += 1
+            if self.fallback is None:
+                raise LookupError("no recorded reply for this prompt")
+        else:
+            self.hits += 1
+        return rec
+
+    def _delay(self, rec: Dict[str, object]) -> float:
+        return float(rec.get("latency_ms") or 0.0) / 1000.0 if self.timing else 0.0
+
+    def generate(self, prompt: str, endpoint: str) -> str:
+        rec = self._lookup(prompt)
+        if rec is None:
+            return self.fallback.generate(prompt, endpoint)
+        time.sleep(self._delay(rec))
+        return str(rec["text"])
+
+    async def _fallback_async(self, prompt: str, endpoint: str) -> str:
+        if self.fallback.native_async:
+            return await self.fallback.generate_async(prompt, endpoint)
+        return await asyncio.to_thread(self.fallback.generate, prompt, endpoint)
+
+    async def generate_async(self, prompt: str, endpoint: str) -> str:
+        rec = self._lookup(prompt)
+        if rec is None:
+            return await self._fallback_async(prompt, endpoint)
+        await asyncio.sleep(self._delay(rec))
+        return str(rec["text"])
+
+    async def stream_async(self, prompt: str, endpoint: str) -> AsyncIterator[str]:
+        rec = self._lookup(prompt)
+        if rec is None:
+            yield await self._fallback_async(prompt, endpoint)
+            return
+        chunks = rec.get("chunks") or [rec["text"]]
+        step = self._delay(rec) / len(chunks)
+        for chunk in chunks:
+            await asyncio.sleep(step)
+            yield str(chunk)
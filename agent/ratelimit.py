@@ -0,0 +1,150 @@
+"""Rate limiting and admission control: token buckets (global and per client)
+and bounded admission queues for the API's local and LLM-bound routes."""
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, holding at most ``burst``."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take ``tokens`` if available right now."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until ``tokens`` are available, then take them."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class KeyedBuckets:
+    """One ``TokenBucket`` per key (client IP), keeping at most the ``max_keys``
+    most recently seen keys. A bucket idle for long enough to refill is no
+    different from a new one, so it is dropped."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.idle_s = max(1.0, burst) / rate
+        self._buckets: "OrderedDict[str, Tuple[TokenBucket, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            # Least recently seen first, so stop at the first bucket still in use
+            while self._buckets:
+                oldest, (_, seen) = next(iter(self._buckets.items()))
+                if now - seen < self.idle_s:
+                    break
+                del self._buckets[oldest]
+            entry = self._buckets.pop(key, None)
+            bucket = entry[0] if entry is not None else TokenBucket(self.rate, self.burst)
+            self._buckets[key] = (bucket, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return bucket.try_acquire()
+
+    def retry_after(self) -> int:
+        """Whole seconds until an empty bucket holds a token again."""
+        return max(1, math.ceil(1.0 / self.rate))
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class AdmissionQueue:
+    """Bounded admission for one class of requests: at most ``max_active`` run
+    at once and at most ``max_queue`` wait, each for up to ``max_wait_s``.
+    ``enter`` returns False when the request should be shed instead.
+    Used from one event loop (the server's)."""
+
+    def __init__(self, name: str, max_active: int, max_queue: int, max_wait_s: Optional[float] = None):
+        self.name = name
+        self.max_active = max(1, max_active)
+        self.max_queue = max(0, max_queue)
+        self.max_wait_s = max_wait_s
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.counters = {"admitted": 0, "shed": 0, "degraded": 0, "rate_limited": 0}
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def enter(self) -> bool:
+        if self.active < self.max_active and not self._waiters:
+            self.active += 1
+            self.counters["admitted"] += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.counters["shed"] += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # ``leave`` hands its slot straight to the waiter (``active`` unchanged)
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait_s)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                self._waiters.remove(waiter)
+                self.counters["shed"] += 1
+                return False
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.leave()  # the slot was handed over as we were cancelled
+            else:
+                self._waiters.remove(waiter)
+            raise
+        self.counters["admitted"] += 1
+        return True
+
+    def leave(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+            "max_wait_s": self.max_wait_s,
+            **self.counters,
+        }
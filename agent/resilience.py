@@ -0,0 +1,164 @@
+"""Upstream protection for LLM calls: a circuit breaker, per-endpoint deadlines
+and the hedging delay.
+
+When Gemini is failing or slow, the breaker opens after enough recent calls
+have failed (errors, deadline timeouts, or calls slower than LLM_BREAKER_SLOW_S).
+While it is open, ``GeminiClient`` raises ``LLMUnavailable`` right away instead
+of calling upstream, so handlers go straight to their local fallbacks. After
+LLM_BREAKER_COOLDOWN_S one probe call is let through (half-open); it closes the
+circuit on success and re-opens it on failure.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from .env import bool_env, float_env
+
+
+class LLMUnavailable(RuntimeError):
+    """The upstream LLM was not called (circuit open) or missed its deadline."""
+
+
+# Seconds an upstream call may take before the caller falls back. Interactive
+# kid endpoints and moderation get tighter limits than long-form generation.
+DEFAULT_DEADLINES: Dict[str, float] = {
+    "kid_explain": 8.0,
+    "kid_story": 10.0,
+    "kid_feedback": 6.0,
+    "moderate_text": 6.0,
+    "moderate_texts": 8.0,
+    "explain_mcq_answer": 6.0,
+    "explain_mcq_answers": 8.0,
+    "dictionary_enrich": 12.0,
+}
+
+
+def endpoint_deadline(endpoint: str) -> Optional[float]:
+    """Deadline in seconds for ``endpoint``: LLM_DEADLINES entries
+    ("kid_story=8,translate=5") override the defaults above, everything else
+    gets LLM_DEADLINE_S (default 20). 0 means no deadline."""
+    deadlines = dict(DEFAULT_DEADLINES)
+    for part in (os.getenv("LLM_DEADLINES") or "").split(","):
+        name, _, value = part.partition("=")
+        try:
+            deadlines[name.strip()] = float(value)
+        except ValueError:
+            continue
+    seconds = deadlines.get(endpoint, float_env("LLM_DEADLINE_S", 20.0))
+    return seconds if seconds > 0 else None
+
+
+def hedge_after() -> Optional[float]:
+    """Seconds after which a second, identical upstream call is raced against
+    the first (LLM_HEDGE_AFTER_S; unset or 0 disables hedging)."""
+    seconds = float_env("LLM_HEDGE_AFTER_S", 0.0)
+    return seconds if seconds > 0 else None
+
+
+class CircuitBreaker:
+    """Failure-rate breaker over the last ``window`` upstream calls."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, window: int = 20, min_calls: int = 5, failure_rate: float = 0.5,
+                 slow_call_s: Optional[float] = 10.0, cooldown_s: float = 30.0, enabled: bool = True):
+        self.window = max(1, window)
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.slow_call_s = slow_call_s
+        self.cooldown_s = cooldown_s
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._outcomes: Deque[bool] = deque(maxlen=self.window)  # True = failure
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._counters = {"opened": 0, "short_circuited": 0, "failures": 0, "slow_calls": 0, "deadline_exceeded": 0}
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker":
+        return cls(
+            window=int(float_env("LLM_BREAKER_WINDOW", 20)),
+            min_calls=int(float_env("LLM_BREAKER_MIN_CALLS", 5)),
+            failure_rate=float_env("LLM_BREAKER_FAILURE_RATE", 0.5),
+            slow_call_s=float_env("LLM_BREAKER_SLOW_S", 10.0) or None,
+            cooldown_s=float_env("LLM_BREAKER_COOLDOWN_S", 30.0),
+            enabled=bool_env("LLM_BREAKER", True),
+        )
+
+    def is_open(self) -> bool:
+        """True while calls would be refused; does not claim the half-open probe."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            return self._state == self.OPEN and time.monotonic() - self._opened_at < self.cooldown_s
+
+    def allow(self) -> bool:
+        """Whether an upstream call may be made now. In half-open state only one
+        probe is admitted until its outcome is recorded."""
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown_s:
+                    self._counters["short_circuited"] += 1
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._state == self.HALF_OPEN:
+                if self._probing:
+                    self._counters["short_circuited"] += 1
+                    return False
+                self._probing = True
+            return True
+
+    def record(self, ok: bool, latency_s: float, timed_out: bool = False) -> None:
+        """Outcome of one upstream call admitted by ``allow``."""
+        if not self.enabled:
+            return
+        slow = self.slow_call_s is not None and latency_s > self.slow_call_s
+        failed = not ok or slow
+        with self._lock:
+            self._counters["failures"] += not ok
+            self._counters["slow_calls"] += ok and slow
+            self._counters["deadline_exceeded"] += timed_out
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._trip()
+                else:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(failed)
+            if (self._state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate):
+                self._trip()
+
+    def abandon(self) -> None:
+        """A call admitted by ``allow`` ended without an outcome (cancelled)."""
+        with self._lock:
+            self._probing = False
+
+    def _trip(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._counters["opened"] += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            state = self._state
+            if state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_s:
+                state = self.HALF_OPEN
+            return {
+                "enabled": self.enabled,
+                "state": state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": sum(self._outcomes),
+                **self._counters,
+            }
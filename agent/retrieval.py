@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Unicode word characters; this includes Sinhala letters
+_TOKEN_RE = re.compile(r"\w+", flags=re.UNICODE)
+
+
+def all_tokens(text: str) -> List[str]:
+    """Lowercased word tokens of ``text`` with repeats (term frequencies matter)."""
+    if not isinstance(text, str):
+        return []
+    return [t.lower() for t in _TOKEN_RE.findall(text) if t.strip()]
+
+
+def tokenize(text: str) -> List[str]:
+    """Return the distinct lowercased word tokens of ``text`` (first-seen order)."""
+    if not isinstance(text, str):
+        return []
+    return list(dict.fromkeys(t.lower() for t in _TOKEN_RE.findall(text) if t.strip()))
+
+
+class TokenIndex:
+    """Inverted index (token -> row positions) over the given vocabulary columns.
+
+    Built once per vocabulary so retrieval cost depends on the query length and
+    the posting sizes, not on the number of rows.
+    """
+
+    def __init__(self, df: pd.DataFrame, columns: Sequence[str] = ("sinhala", "english")):
+        self.n_rows = len(df)
+        cols = [df[c].tolist() for c in columns if c in df.columns]
+        postings: Dict[str, List[int]] = {}
+        for pos, values in enumerate(zip(*cols)):
+            seen = set()
+            for value in values:
+                seen.update(tokenize(value))
+            for tok in seen:
+                postings.setdefault(tok, []).append(pos)
+        self.postings: Dict[str, np.ndarray] = {
+            tok: np.asarray(rows, dtype=np.int32) for tok, rows in postings.items()
+        }
+
+    def overlap_scores(self, tokens: Iterable[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Return ``(rows, counts)``: every row sharing a token with the query and
+        how many distinct query tokens it contains."""
+        hits = [self.postings[t] for t in set(tokens) if t in self.postings]
+        if not hits:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(hits), return_counts=True)
+
+    def top_overlap(self, tokens: Iterable[str], k: int) -> np.ndarray:
+        """Row positions of the ``k`` best token-overlap matches, best first.
+        Ties keep vocabulary order."""
+        rows, counts = self.overlap_scores(tokens)
+        if k <= 0 or rows.size == 0:
+            return np.empty(0, dtype=np.int32)
+        if rows.size > k:
+            # Highest counts first; rows are already sorted, so lexsort keeps ties stable
+            keep = np.argpartition(-counts, k - 1)[:k]
+            threshold = counts[keep].min()
+            cand = np.flatnonzero(counts >= threshold)
+            rows, counts = rows[cand], counts[cand]
+        order = np.lexsort((rows, -counts))[:k]
+        return rows[order]
+
+
+class BM25Index:
+    """Okapi BM25 weights stored as a term-major sparse document-term matrix.
+
+    ``indptr``/``rows``/``weights`` hold one column per term (CSC layout) with
+    the full per-document BM25 weight precomputed, so a query scores as a single
+    sparse mat-vec over the query's columns followed by an ``argpartition`` top-k.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        columns: Sequence[str] = ("sinhala", "english"),
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.n_rows = len(df)
+        cols = [df[c].tolist() for c in columns if c in df.columns]
+        term_ids: Dict[str, int] = {}
+        doc_rows: List[int] = []
+        doc_terms: List[int] = []
+        doc_tf: List[int] = []
+        doc_len = np.zeros(self.n_rows, dtype=np.float32)
+        for pos, values in enumerate(zip(*cols)):
+            counts: Dict[int, int] = {}
+            for value in values:
+                for tok in all_tokens(value):
+                    tid = term_ids.setdefault(tok, len(term_ids))
+                    counts[tid] = counts.get(tid, 0) + 1
+            doc_len[pos] = sum(counts.values())
+            for tid, tf in counts.items():
+                doc_rows.append(pos)
+                doc_terms.append(tid)
+                doc_tf.append(tf)
+
+        self.term_ids = term_ids
+        rows = np.asarray(doc_rows, dtype=np.int32)
+        terms = np.asarray(doc_terms, dtype=np.int32)
+        tf = np.asarray(doc_tf, dtype=np.float32)
+
+        # Sort entries by term to get the CSC layout
+        order = np.argsort(terms, kind="stable")
+        rows, terms, tf = rows[order], terms[order], tf[order]
+        df_counts = np.bincount(terms, minlength=len(term_ids))
+        self.indptr = np.zeros(len(term_ids) + 1, dtype=np.int64)
+        np.cumsum(df_counts, out=self.indptr[1:])
+
+        avgdl = float(doc_len.mean()) if self.n_rows and doc_len.mean() > 0 else 1.0
+        idf = np.log1p((self.n_rows - df_counts + 0.5) / (df_counts + 0.5)).astype(np.float32)
+        norm = k1 * (1.0 - b + b * doc_len[rows] / avgdl)
+        self.rows = rows
+        self.weights = (idf[terms] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+    def scores(self, tokens: Iterable[str]) -> np.ndarray:
+        """Dense BM25 score vector over all rows for the query tokens."""
+        counts: Dict[int, int] = {}
+        for tok in tokens:
+            tid = self.term_ids.get(tok)
+            if tid is not None:
+                counts[tid] = counts.get(tid, 0) + 1
+        if not counts:
+            return np.zeros(self.n_rows, dtype=np.float32)
+        sl = [slice(self.indptr[t], self.indptr[t + 1]) for t in counts]
+        rows = np.concatenate([self.rows[s] for s in sl])
+        weights = np.concatenate([self.weights[s] * q for s, q in zip(sl, counts.values())])
+        return np.bincount(rows, weights=weights, minlength=self.n_rows)
+
+    def top_k(self, tokens: Iterable[str], k: int) -> np.ndarray:
+        """Row positions of the ``k`` highest-scoring rows with a positive score, best first."""
+        if k <= 0 or self.n_rows == 0:
+            return np.empty(0, dtype=np.int64)
+        scores = self.scores(tokens)
+        if k < self.n_rows:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(self.n_rows)
+        top = top[scores[top] > 0]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+
+class NgramIndex:
+    """Character trigram index for case-insensitive substring search.
+
+    Each row's lowercased column values are concatenated (each followed by two
+    NUL pads) and every trigram starting at a real character is packed into one
+    int64 key (21 bits per code point). Keys are sorted once, so a query's
+    candidate rows come from ``searchsorted`` lookups: an intersection of the
+    query's trigram postings for queries of 3+ characters, or a key-prefix range
+    for 1-2 character queries. Candidates are then checked with an exact
+    substring test.
+    """
+
+    _SHIFT = 21
+
+    def __init__(self, df: pd.DataFrame, columns: Sequence[str] = ("sinhala", "english", "transliteration")):
+        self.n_rows = len(df)
+        self.columns = [c for c in columns if c in df.columns]
+        cols = [df[c].tolist() for c in self.columns]
+        pieces = [
+            "".join((v.lower() if isinstance(v, str) else "") + "\0\0" for v in values)
+            for values in zip(*cols)
+        ]
+        if not pieces:
+            self.keys = np.empty(0, dtype=np.int64)
+            self.indptr = np.zeros(1, dtype=np.int64)
+            self.rows = np.empty(0, dtype=np.int32)
+            return
+        lengths = np.fromiter((len(p) for p in pieces), dtype=np.int64, count=len(pieces))
+        codes = np.frombuffer("".join(pieces).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+        row_of = np.repeat(np.arange(len(pieces), dtype=np.int32), lengths)
+
+        # Every row piece ends with NUL pads, so grams starting on a real char stay inside the row
+        starts = np.flatnonzero(codes[:-2] != 0)
+        keys = self._pack(codes[starts], codes[starts + 1], codes[starts + 2])
+        rows = row_of[starts]
+
+        order = np.lexsort((rows, keys))
+        keys, rows = keys[order], rows[order]
+        keep = np.ones(keys.size, dtype=bool)
+        keep[1:] = (keys[1:] != keys[:-1]) | (rows[1:] != rows[:-1])
+        keys, rows = keys[keep], rows[keep]
+
+        self.keys, first = np.unique(keys, return_index=True)
+        self.indptr = np.append(first, keys.size).astype(np.int64)
+        self.rows = rows
+
+    @classmethod
+    def _pack(cls, a, b, c):
+        return (a << (2 * cls._SHIFT)) | (b << cls._SHIFT) | c
+
+    def _posting(self, key: int) -> np.ndarray:
+        i = int(np.searchsorted(self.keys, key))
+        if i >= self.keys.size or self.keys[i] != key:
+            return np.empty(0, dtype=np.int32)
+        return self.rows[self.indptr[i]:self.indptr[i + 1]]
+
+    def candidates(self, q: str) -> np.ndarray:
+        """Sorted row positions that may contain the lowercased query ``q``.
+        Exact for queries shorter than three characters."""
+        cp = [ord(ch) for ch in q]
+        if len(cp) < 3:
+            # All trigrams starting with the query form one contiguous key range
+            lo = self._pack(cp[0], cp[1] if len(cp) > 1 else 0, 0)
+            hi = self._pack(cp[0] + 1, 0, 0) if len(cp) == 1 else self._pack(cp[0], cp[1] + 1, 0)
+            i, j = np.searchsorted(self.keys, [lo, hi])
+            return np.unique(self.rows[self.indptr[i]:self.indptr[j]])
+        grams = {self._pack(cp[i], cp[i + 1], cp[i + 2]) for i in range(len(cp) - 2)}
+        postings = sorted((self._posting(g) for g in grams), key=len)
+        out = postings[0]
+        for p in postings[1:]:
+            if out.size == 0:
+                break
+            out = np.intersect1d(out, p, assume_unique=True)
+        return out
+
+    def search(self, df: pd.DataFrame, query: str) -> np.ndarray:
+        """Sorted row positions of ``df`` (the indexed frame) whose indexed columns
+        contain ``query`` as a case-insensitive substring."""
+        q = query.strip().lower()
+        if not q:
+            return np.arange(self.n_rows)
+        if "\0" in q:
+            return np.empty(0, dtype=np.int64)
+        cand = self.candidates(q)
+        if len(q) < 3 or cand.size == 0:
+            return cand
+        sub = df.iloc[cand]
+        cols = [sub[c].tolist() for c in self.columns]
+        hit = [
+            any(isinstance(v, str) and q in v.lower() for v in values)
+            for values in zip(*cols)
+        ]
+        return cand[np.asarray(hit, dtype=bool)]
+
+
+_ASPIRATE_RE = re.compile(r"([bcdgkpt])h")
+_REPEAT_RE = re.compile(r"(.)\1+")
+
+
+def singlish_key(word: str) -> str:
+    """Loose phonetic key for romanized Sinhala: drops aspiration ("dh" -> "d")
+    and collapses doubled letters ("aa" -> "a"), so common spelling variants
+    of the same word share a key before edit distance is applied."""
+    w = word.lower()
+    w = _ASPIRATE_RE.sub(r"\1", w)
+    return _REPEAT_RE.sub(r"\1", w)
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal-string-alignment distance between ``a`` and ``b``; returns
+    ``max_distance + 1`` as soon as the distance is known to exceed it."""
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = 0 if ca == cb else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class FuzzyIndex:
+    """SymSpell-style deletion dictionary over the words of one column.
+
+    Every distinct word (after ``singlish_key``) is stored together with all
+    variants obtained by deleting up to ``max_distance`` characters from its
+    first ``prefix_length`` characters. A lookup generates the same deletes for
+    the query word, so candidate words come from dictionary hits instead of a
+    scan, and only those few candidates get a real edit-distance check.
+    """
+
+    def __init__(self, df: pd.DataFrame, column: str = "transliteration", max_distance: int = 2, prefix_length: int = 7):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        values = df[column].tolist() if column in df.columns else []
+        word_ids: Dict[str, int] = {}
+        word_rows: List[List[int]] = []
+        for pos, value in enumerate(values):
+            for tok in tokenize(value):
+                key = singlish_key(tok)
+                wid = word_ids.get(key)
+                if wid is None:
+                    wid = word_ids[key] = len(word_rows)
+                    word_rows.append([])
+                rows = word_rows[wid]
+                if not rows or rows[-1] != pos:
+                    rows.append(pos)
+        self.words = list(word_ids)
+        self.word_rows = [np.asarray(r, dtype=np.int32) for r in word_rows]
+        self.deletes: Dict[str, List[int]] = {}
+        for word, wid in word_ids.items():
+            for variant in self._deletes(word[:prefix_length], max_distance):
+                self.deletes.setdefault(variant, []).append(wid)
+
+    @staticmethod
+    def _deletes(word: str, depth: int) -> set:
+        out = {word}
+        frontier = {word}
+        for _ in range(depth):
+            nxt = set()
+            for w in frontier:
+                if len(w) <= 1:
+                    continue
+                nxt.update(w[:i] + w[i + 1:] for i in range(len(w)))
+            out |= nxt
+            frontier = nxt
+        return out
+
+    def lookup(self, word: str, max_distance: int | None = None) -> Dict[int, int]:
+        """Map word id -> edit distance for indexed words within ``max_distance``."""
+        d = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        key = singlish_key(word)
+        if len(key) <= 5:
+            # Short words: two edits would match almost anything
+            d = min(d, 1)
+        cand: set = set()
+        for variant in self._deletes(key[:self.prefix_length], d):
+            cand.update(self.deletes.get(variant, ()))
+        out: Dict[int, int] = {}
+        for wid in cand:
+            dist = edit_distance(key, self.words[wid], d)
+            if dist <= d:
+                out[wid] = dist
+        return out
+
+    def search(self, query: str, max_distance: int | None = None) -> np.ndarray:
+        """Row positions where every query word has a fuzzy match, ordered by
+        total edit distance and then vocabulary order."""
+        q_tokens = tokenize(query)
+        if not q_tokens:
+            return np.empty(0, dtype=np.int64)
+        rows = None
+        dist = None
+        for tok in q_tokens:
+            matches = self.lookup(tok, max_distance)
+            if not matches:
+                return np.empty(0, dtype=np.int64)
+            # Best distance per row for this query word
+            tok_rows = np.concatenate([self.word_rows[w] for w in matches])
+            tok_dist = np.concatenate([np.full(self.word_rows[w].size, d) for w, d in matches.items()])
+            order = np.lexsort((tok_dist, tok_rows))
+            tok_rows, tok_dist = tok_rows[order], tok_dist[order]
+            first = np.ones(tok_rows.size, dtype=bool)
+            first[1:] = tok_rows[1:] != tok_rows[:-1]
+            tok_rows, tok_dist = tok_rows[first], tok_dist[first]
+            if rows is None:
+                rows, dist = tok_rows, tok_dist
+            else:
+                rows, ia, ib = np.intersect1d(rows, tok_rows, assume_unique=True, return_indices=True)
+                dist = dist[ia] + tok_dist[ib]
+            if rows.size == 0:
+                break
+        order = np.lexsort((rows, dist))
+        return rows[order]
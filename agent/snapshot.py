@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+# Bump when the pickled index layout changes so stale snapshots are rebuilt
+SNAPSHOT_VERSION = 2
+
+_PREFIX = "vocab-"
+_SUFFIX = ".snapshot"
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def vocab_params(compact: bool, kid_filter_terms: Optional[tuple] = None) -> Dict[str, object]:
+    """Load options that change the snapshot contents (shared by the API and the CLI)."""
+    return {"compact": bool(compact), "kid_filter": list(kid_filter_terms) if kid_filter_terms is not None else None}
+
+
+def snapshot_key(source: Path, params: Dict[str, object]) -> str:
+    """Content hash of the source CSV combined with everything that shapes the
+    loaded vocabulary (normalization version, filters, store layout)."""
+    from agent.functions import TutorFunctions
+
+    payload = {
+        "source_sha256": file_digest(source),
+        "normalize_version": TutorFunctions.NORMALIZE_VERSION,
+        "snapshot_version": SNAPSHOT_VERSION,
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def load_or_build(source: Path, params: Dict[str, object], build: Callable[[], object], cache_dir: Path) -> object:
+    """Return the object saved for (``source``, ``params``) in ``cache_dir``, or
+    call ``build()``, save its result and return it.
+
+    Snapshots are pickles written by this process family into a local cache
+    directory; only point ``cache_dir`` at a location you trust.
+    """
+    key = snapshot_key(source, params)
+    path = cache_dir / f"{_PREFIX}{key[:24]}{_SUFFIX}"
+    start = time.perf_counter()
+    if path.exists():
+        try:
+            with open(path, "rb") as f:
+                obj = pickle.load(f)
+            print(f"Vocabulary loaded from snapshot {path.name} in {(time.perf_counter() - start) * 1000:.0f} ms")
+            return obj
+        except Exception as e:
+            print(f"Ignoring unreadable snapshot {path.name}: {e}")
+
+    obj = build()
+    print(f"Vocabulary built from {source.name} in {(time.perf_counter() - start) * 1000:.0f} ms")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".tmp{os.getpid()}")
+        with open(tmp, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        # Older snapshots are superseded by this one
+        for old in cache_dir.glob(f"{_PREFIX}*{_SUFFIX}"):
+            if old != path:
+                old.unlink(missing_ok=True)
+    except OSError as e:
+        print(f"Could not write vocabulary snapshot: {e}")
+    return obj
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the API vocabulary snapshot and compare cold vs warm start.")
+    parser.add_argument("--input", default=os.path.join("data", "vocab_clean.csv"), help="Vocabulary CSV path")
+    parser.add_argument("--cache-dir", default=os.path.join("data", ".cache"), help="Snapshot directory")
+    parser.add_argument("--compact", action="store_true", help="Snapshot the compact columnar store (VOCAB_COMPACT=1)")
+    parser.add_argument("--kid-filter", action="store_true", help="Apply the kid-safe row filter (KID_SAFE_FILTER=1)")
+    args = parser.parse_args()
+
+    import pandas as pd
+    from agent.functions import TutorFunctions
+    from agent.kidsafe import banned_terms_from_env, normalize_terms
+
+    source = Path(args.input)
+    terms = normalize_terms(banned_terms_from_env()) if args.kid_filter else None
+    params = vocab_params(args.compact, terms)
+
+    def build():
+        df = TutorFunctions.normalize(pd.read_csv(source))
+        if terms is not None:
+            df = TutorFunctions.filter_offensive(df, list(terms))
+        return TutorFunctions(df, compact=args.compact)
+
+    cache_dir = Path(args.cache_dir)
+    t0 = time.perf_counter()
+    build()
+    cold = time.perf_counter() - t0
+    load_or_build(source, params, build, cache_dir)  # make sure the snapshot exists
+    t0 = time.perf_counter()
+    load_or_build(source, params, build, cache_dir)
+    warm = time.perf_counter() - t0
+    print(f"Cold start (CSV + normalize + indexes): {cold * 1000:.0f} ms")
+    print(f"Warm start (snapshot): {warm * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import argparse
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+VOCAB_COLUMNS = ["sinhala", "english", "transliteration", "pos", "example_si", "example_en"]
+
+
+class StringColumn:
+    """Immutable string column stored as one UTF-8 ``bytes`` buffer plus an
+    offsets array, instead of one Python ``str`` object per row."""
+
+    def __init__(self, buffer: bytes, offsets: np.ndarray):
+        self._buf = buffer
+        self._offsets = offsets
+
+    @classmethod
+    def from_values(cls, values: Iterable[object]) -> "StringColumn":
+        encoded = [v.encode("utf-8") if isinstance(v, str) else b"" for v in values]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        total = int(lengths.sum())
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int32 if total < 2**31 else np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        o = self._offsets
+        return self._buf[o[i]:o[i + 1]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.tolist())
+
+    def take(self, rows: Iterable[int]) -> List[str]:
+        buf, o = self._buf, self._offsets
+        return [buf[o[i]:o[i + 1]].decode("utf-8") for i in rows]
+
+    def tolist(self) -> List[str]:
+        return self.take(range(len(self)))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buf) + self._offsets.nbytes
+
+
+class _ILocIndexer:
+    def __init__(self, store: "VocabStore"):
+        self._store = store
+
+    def __getitem__(self, key):
+        n = len(self._store)
+        if isinstance(key, (int, np.integer)):
+            return self._store.take([int(key) % n if key < 0 else int(key)]).iloc[0]
+        if isinstance(key, slice):
+            return self._store.take(range(*key.indices(n)))
+        return self._store.take(np.asarray(key, dtype=np.int64))
+
+
+class VocabStore:
+    """Compact columnar copy of a normalized vocabulary frame.
+
+    Text columns are ``StringColumn`` buffers and ``pos`` is a categorical code
+    array. The read API TutorFunctions and the API handlers rely on (``len``,
+    ``columns``, ``[col]``, ``iloc[...]``, ``head``) returns ordinary pandas
+    objects built only for the requested rows.
+    """
+
+    def __init__(self, columns: Dict[str, StringColumn], pos_codes: np.ndarray, pos_categories: List[str]):
+        self._cols = columns
+        self._pos_codes = pos_codes
+        self._pos_categories = np.asarray(pos_categories, dtype=object)
+        self._n = len(pos_codes)
+        self.columns = pd.Index([c for c in VOCAB_COLUMNS])
+        self.iloc = _ILocIndexer(self)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "VocabStore":
+        """Build from a frame with the normalized vocabulary columns (missing
+        columns and non-string cells become empty strings)."""
+        cols = {
+            c: StringColumn.from_values(df[c].tolist() if c in df.columns else [""] * len(df))
+            for c in VOCAB_COLUMNS
+            if c != "pos"
+        }
+        pos = df["pos"] if "pos" in df.columns else pd.Series([""] * len(df))
+        codes, categories = pd.factorize(pos.where(pos.map(lambda v: isinstance(v, str)), ""), sort=False)
+        dtype = np.int8 if len(categories) < 2**7 else np.int16 if len(categories) < 2**15 else np.int32
+        return cls(cols, codes.astype(dtype), list(categories))
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def empty(self) -> bool:
+        return self._n == 0
+
+    def _column_values(self, name: str, rows: Sequence[int]) -> List[str] | np.ndarray:
+        if name == "pos":
+            return self._pos_categories[self._pos_codes[np.asarray(rows, dtype=np.int64)]]
+        if name not in self._cols:
+            raise KeyError(name)
+        return self._cols[name].take(rows)
+
+    def __getitem__(self, key):
+        rows = range(self._n)
+        if isinstance(key, str):
+            return pd.Series(self._column_values(key, rows), name=key, dtype=object)
+        return pd.DataFrame({c: self._column_values(c, rows) for c in key})
+
+    def take(self, rows: Sequence[int]) -> pd.DataFrame:
+        """Materialize the given row positions as a DataFrame indexed by position."""
+        rows = list(rows) if not isinstance(rows, np.ndarray) else rows.tolist()
+        return pd.DataFrame(
+            {c: self._column_values(c, rows) for c in VOCAB_COLUMNS},
+            index=pd.Index(rows, dtype=np.int64),
+            columns=VOCAB_COLUMNS,
+        )
+
+    def sample(self, n: int = 1) -> pd.DataFrame:
+        """``n`` distinct random rows (numpy global RNG, like ``DataFrame.sample``)."""
+        return self.take(np.random.choice(self._n, size=min(n, self._n), replace=False))
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        return self.take(range(max(0, min(n, self._n))))
+
+    def to_frame(self) -> pd.DataFrame:
+        return self.take(range(self._n))
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            sum(col.nbytes for col in self._cols.values())
+            + self._pos_codes.nbytes
+            + sum(len(c.encode("utf-8")) for c in self._pos_categories)
+        )
+
+
+def memory_report(df: pd.DataFrame, store: VocabStore | None = None) -> Dict[str, object]:
+    """Compare the deep memory usage of ``df`` with its ``VocabStore`` layout."""
+    store = store or VocabStore.from_frame(df)
+    frame_bytes = int(df.memory_usage(deep=True).sum())
+    store_bytes = int(store.nbytes)
+    return {
+        "rows": len(df),
+        "dataframe_bytes": frame_bytes,
+        "store_bytes": store_bytes,
+        "ratio": round(frame_bytes / store_bytes, 2) if store_bytes else None,
+        "per_column": {
+            c: {
+                "dataframe_bytes": int(df[c].memory_usage(deep=True, index=False)),
+                "store_bytes": int(store._pos_codes.nbytes if c == "pos" else store._cols[c].nbytes),
+            }
+            for c in VOCAB_COLUMNS
+            if c in df.columns
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report vocabulary memory: pandas DataFrame vs compact store.")
+    parser.add_argument("--input", default="data/vocab_clean.csv", help="Vocabulary CSV path")
+    args = parser.parse_args()
+
+    from agent.functions import TutorFunctions
+
+    df = TutorFunctions.normalize(pd.read_csv(args.input))
+    report = memory_report(df)
+    print(f"Rows: {report['rows']}")
+    print(f"DataFrame: {report['dataframe_bytes'] / 1e6:.2f} MB")
+    print(f"Compact store: {report['store_bytes'] / 1e6:.2f} MB ({report['ratio']}x smaller)")
+    for col, sizes in report["per_column"].items():
+        print(f"- {col}: {sizes['dataframe_bytes'] / 1e6:.2f} MB -> {sizes['store_bytes'] / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,38 @@
 from __future__ import annotations
 
+import asyncio
+import hmac
+import json
+import math
 import os
+import re
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import AsyncIterator, Callable, List, Optional, Dict
 
 import pandas as pd
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 from agent.functions import TutorFunctions
-from agent.llm import GeminiClient
-from agent.dictionary import DictionaryEnricher
+from agent.llm import batch_size, circuit_open, coalesce_stats, get_gemini_client, resilience_stats
+from agent.cache import get_response_cache
+from agent.env import bool_env, float_env
+from agent.moderation import moderation_stats
+from agent.prompts import prompt_stats
+from agent.ratelimit import AdmissionQueue, KeyedBuckets
+from agent.dictionary import DictionaryEnricher, entry_base, headword_key, moderation_text
+from agent.dictionary_store import get_dictionary_store
+from agent.mcq_pool import McqPool
+from agent.kidsafe import AhoCorasick, KidSafeView, banned_terms_from_env, normalize_terms
+from agent.snapshot import file_digest, load_or_build, vocab_params
 
 
 # Load env from project root .env if present (non-fatal if missing)
@@ -23,14 +43,20 @@ try:
 except Exception:
     pass
 
-app = FastAPI(title="Sinhala-English Tutor API")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    if bool_env("VOCAB_WATCH", False):
+        interval = float_env("VOCAB_WATCH_INTERVAL", 5.0)
+        threading.Thread(target=_watch_vocab_file, args=(interval,), name="vocab-watch", daemon=True).start()
+    if _mcq_pool.enabled and bool_env("LLM_MCQ_GENERATION", True) and bool_env("MCQ_POOL_WARM", True):
+        # Prefetch the default quiz (4 choices) in both modes before the first request
+        for simple in (False, True):
+            _mcq_pool.warm(_mcq_pool_key(4, simple), _mcq_producer(4, simple))
+    yield
+
+
+app = FastAPI(title="Sinhala-English Tutor API", lifespan=lifespan)
 
 
 DATA_DIR = Path(__file__).resolve().parents[1] / "data"
@@ -38,11 +64,119 @@ DATA_PATH = DATA_DIR / "vocab.csv"
 DATA_CLEAN_PATH = DATA_DIR / "vocab_clean.csv"
 
 
-def _bool_env(name: str, default: bool = False) -> bool:
-    val = os.getenv(name)
-    if val is None:
-        return default
-    return str(val).strip().lower() in {"1", "true", "yes", "on"}
+# --- Admission control ---
+# LLM-bound and local routes get separate bounded queues so a burst of LLM
+# traffic cannot take every worker thread and quota slot from /search and the
+# other local routes. Each client (X-Session-Id header, else IP) also has a
+# token bucket per class.
+_LLM_ROUTES = {
+    "/translate", "/explain", "/explain/stream", "/quiz", "/quiz/mcq", "/quiz/mcq/",
+    "/llm/answer", "/llm/ping", "/agent/invoke", "/agent/invoke/stream",
+    "/kid/explain", "/kid/feedback", "/kid/story", "/kid/story/stream",
+    "/moderate/check", "/dictionary/enrich", "/dictionary/enrich/batch",
+}
+# LLM routes with a local fallback: when their queue is full they are served
+# the fallback (through the local queue) instead of a 429
+_FALLBACK_ROUTES = {
+    "/kid/explain", "/kid/story", "/kid/story/stream", "/quiz/mcq", "/quiz/mcq/",
+    "/dictionary/enrich", "/dictionary/enrich/batch",
+}
+# Health checks, admin and metrics are never queued or limited
+_EXEMPT_ROUTES = {"/health", "/admission", "/llm/cache", "/llm/circuit", "/llm/prompts", "/moderate/stats", "/quiz/mcq/pool", "/debug/env"}
+
+_ADMISSION = bool_env("ADMISSION", True)
+_admission_queues = {
+    "llm": AdmissionQueue(
+        "llm",
+        max_active=int(float_env("ADMISSION_LLM_ACTIVE", 64)),
+        max_queue=int(float_env("ADMISSION_LLM_QUEUE", 64)),
+        max_wait_s=float_env("ADMISSION_LLM_WAIT_S", 5.0) or None,
+    ),
+    "local": AdmissionQueue(
+        "local",
+        max_active=int(float_env("ADMISSION_LOCAL_ACTIVE", 32)),
+        max_queue=int(float_env("ADMISSION_LOCAL_QUEUE", 256)),
+        max_wait_s=float_env("ADMISSION_LOCAL_WAIT_S", 2.0) or None,
+    ),
+}
+_client_buckets: Dict[str, Optional[KeyedBuckets]] = {}
+for _kind, _rate, _burst in (("llm", 5.0, 20.0), ("local", 50.0, 100.0)):
+    _r = float_env(f"ADMISSION_{_kind.upper()}_RATE", _rate)
+    _client_buckets[_kind] = KeyedBuckets(_r, max(1.0, float_env(f"ADMISSION_{_kind.upper()}_BURST", _burst))) if _r > 0 else None
+
+# Set for a request admitted to its fallback because the LLM queue was full
+_admission_shed: ContextVar[bool] = ContextVar("admission_shed", default=False)
+
+
+def _llm_unavailable() -> bool:
+    """True when handlers should serve their local fallback without calling the
+    LLM: the circuit breaker is open, or admission control shed the request."""
+    return _admission_shed.get() or circuit_open()
+
+
+def _client_key(scope) -> str:
+    # The peer IP, not a client-chosen header such as X-Session-Id: a fresh
+    # header per request would otherwise get a fresh bucket every time
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+def _too_many(message: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": message},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware (not BaseHTTPMiddleware), so a streaming response
+    keeps its queue slot until the last chunk is sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (scope["type"] != "http" or not _ADMISSION or scope["method"] == "OPTIONS"
+                or path in _EXEMPT_ROUTES or path.startswith("/admin/")):
+            await self.app(scope, receive, send)
+            return
+        kind = "llm" if path in _LLM_ROUTES else "local"
+        queue = _admission_queues[kind]
+        buckets = _client_buckets[kind]
+        if buckets is not None and not buckets.try_acquire(_client_key(scope)):
+            queue.counters["rate_limited"] += 1
+            await _too_many("Rate limit exceeded; slow down", buckets.retry_after())(scope, receive, send)
+            return
+        token = None
+        if not await queue.enter():
+            if path not in _FALLBACK_ROUTES:
+                await _too_many("Server busy; retry shortly", queue.max_wait_s or 1)(scope, receive, send)
+                return
+            queue = _admission_queues["local"]
+            if not await queue.enter():
+                await _too_many("Server busy; retry shortly", queue.max_wait_s or 1)(scope, receive, send)
+                return
+            _admission_queues[kind].counters["degraded"] += 1
+            token = _admission_shed.set(True)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            queue.leave()
+            if token is not None:
+                _admission_shed.reset(token)
+
+
+# Added before CORS so that CORS (the outer middleware) also covers 429 replies
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 
 def load_vocab_df() -> pd.DataFrame:
@@ -63,20 +197,137 @@ def load_vocab_df() -> pd.DataFrame:
         df = pd.DataFrame(demo)
     df = TutorFunctions.normalize(df)
     # Optional kid-safe filtering: remove rows containing banned terms in Sinhala or English
-    if _bool_env("KID_SAFE_FILTER", False):
+    if bool_env("KID_SAFE_FILTER", False):
         # Allow override via env KID_SAFE_BANNED (comma-separated)
-        default_banned = [
-            "sex", "sexual", "fuck", "fucking", "tits", "breast", "kill", "die", "suicide", "weapon", "gun", "drugs", "drug",
-        ]
-        extra = os.getenv("KID_SAFE_BANNED", "")
-        if extra.strip():
-            default_banned.extend([x.strip() for x in extra.split(",") if x.strip()])
-        df = TutorFunctions.filter_offensive(df, default_banned)
+        df = TutorFunctions.filter_offensive(df, banned_terms_from_env())
     return df
 
 
-vocab_df = load_vocab_df()
-functions = TutorFunctions(vocab_df)
+SNAPSHOT_DIR = DATA_DIR / ".cache"
+
+
+def load_functions() -> TutorFunctions:
+    """Build TutorFunctions (vocabulary + indexes), reusing a binary snapshot
+    keyed by the CSV content hash and load options when VOCAB_SNAPSHOT is on."""
+    # RETRIEVAL_MODE selects the retrieve_context scorer: "overlap" (default) or "bm25".
+    # VOCAB_COMPACT=1 keeps the rows in a compact columnar store instead of a DataFrame
+    # (lower per-worker memory); vocab_df then refers to that store.
+    retrieval_mode = (os.getenv("RETRIEVAL_MODE") or "overlap").strip().lower()
+    compact = bool_env("VOCAB_COMPACT", False)
+
+    def build() -> TutorFunctions:
+        return TutorFunctions(load_vocab_df(), retrieval_mode=retrieval_mode, compact=compact)
+
+    source = _vocab_source()
+    if source is None or not bool_env("VOCAB_SNAPSHOT", True):
+        return build()
+    kid_terms = normalize_terms(banned_terms_from_env()) if bool_env("KID_SAFE_FILTER", False) else None
+    tf = load_or_build(source, vocab_params(compact, kid_terms), build, SNAPSHOT_DIR)
+    if retrieval_mode not in TutorFunctions.RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {retrieval_mode!r}")
+    tf.retrieval_mode = retrieval_mode
+    return tf
+
+
+def _kid_view(tf: TutorFunctions) -> Optional[KidSafeView]:
+    """Cached kid-safe view when KID_SAFE_FILTER is on. The view is rebuilt only
+    when the banned-term configuration (KID_SAFE_BANNED) changes."""
+    if not bool_env("KID_SAFE_FILTER", False):
+        return None
+    return tf.kid_safe_view(banned_terms_from_env())
+
+
+class VocabVersion:
+    """One immutable vocabulary build plus the metadata used to confirm rollouts."""
+
+    def __init__(self, functions: TutorFunctions, version: str, source: Optional[Path], build_ms: float):
+        self.functions = functions
+        self.version = version
+        self.source = source
+        self.source_mtime = source.stat().st_mtime if source is not None and source.exists() else None
+        self.built_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.build_ms = build_ms
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "rows": len(self.functions.vocab),
+            "source": self.source.name if self.source is not None else None,
+            "built_at": self.built_at,
+            "build_ms": round(self.build_ms, 1),
+        }
+
+
+def _vocab_source() -> Optional[Path]:
+    return DATA_CLEAN_PATH if DATA_CLEAN_PATH.exists() else DATA_PATH if DATA_PATH.exists() else None
+
+
+def _build_vocab_version() -> VocabVersion:
+    start = time.perf_counter()
+    source = _vocab_source()
+    tf = load_functions()
+    # Build the kid-safe view up front so the first kid-mode request pays nothing
+    view = _kid_view(tf)
+    version = file_digest(source)[:12] if source is not None else "demo"
+    # Precompute the word-of-the-day calendar for the coming year
+    tf.get_word_of_the_day(version=version, view=view)
+    return VocabVersion(tf, version, source, (time.perf_counter() - start) * 1000.0)
+
+
+# Handlers read the current build once per request (see _current_vocab); a reload
+# swaps this single reference, so in-flight requests keep the build they started with.
+_vocab_current = _build_vocab_version()
+functions = _vocab_current.functions
+vocab_df = functions.vocab
+_reload_lock = threading.Lock()
+_reload_status: Dict[str, object] = {"running": False, "last_error": None, "last_finished_at": None}
+
+
+def _current_vocab() -> VocabVersion:
+    return _vocab_current
+
+
+def _reload_vocab() -> None:
+    global _vocab_current, functions, vocab_df
+    try:
+        new = _build_vocab_version()
+        _vocab_current = new
+        functions, vocab_df = new.functions, new.functions.vocab
+        _mcq_pool.reset()
+        _reload_status["last_error"] = None
+        print(f"Vocabulary reloaded: version {new.version}, {len(new.functions.vocab)} rows in {new.build_ms:.0f} ms")
+    except Exception as e:
+        # Keep serving the previous build
+        _reload_status["last_error"] = str(e)
+        print(f"Vocabulary reload failed: {e}")
+    finally:
+        _reload_status["last_finished_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        _reload_status["running"] = False
+        _reload_lock.release()
+
+
+def start_vocab_reload() -> bool:
+    """Rebuild the vocabulary and its indexes in a background thread, then swap
+    it in. Returns False if a reload is already running."""
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    _reload_status["running"] = True
+    threading.Thread(target=_reload_vocab, name="vocab-reload", daemon=True).start()
+    return True
+
+
+def _watch_vocab_file(interval: float) -> None:
+    """Poll the vocabulary CSV and reload when its mtime changes (VOCAB_WATCH=1)."""
+    while True:
+        time.sleep(interval)
+        source = _vocab_source()
+        try:
+            mtime = source.stat().st_mtime if source is not None else None
+        except OSError:
+            continue
+        current = _vocab_current
+        if mtime is not None and (current.source != source or mtime != current.source_mtime):
+            start_vocab_reload()
 
 
 # --- Fallback helpers for kid endpoints when LLM is unavailable ---
@@ -136,10 +387,10 @@ class TranslateRequest(BaseModel):
 class QuizRequest(BaseModel):
     n: int = 5
     mode: str = "words"  # "words" or "sentences"
-    max_words: int = 2
+    max_words: int = Field(2, ge=1, le=10)
 class McqRequest(BaseModel):
-    n: int = 5
-    choices: int = 4
+    n: int = Field(5, ge=1, le=20)
+    choices: int = Field(4, ge=2, le=6)
     explain: bool = False
     simple: bool = False  # if true, prefer simpler kid-friendly words
 
@@ -182,6 +433,10 @@ class DictEnrichRequest(BaseModel):
     example_en: Optional[str] = None
     level: str = "A1/A2"
 
+class DictEnrichBatchRequest(BaseModel):
+    items: List[DictEnrichRequest]
+    level: str = "A1/A2"
+
 class AgentInvokeRequest(BaseModel):
     input: str
     sessionId: Optional[str] = None
@@ -207,6 +462,29 @@ def health():
     return {"status": "ok"}
 
 
+def _check_admin(token: Optional[str]) -> None:
+    """Admin routes are closed unless ADMIN_TOKEN is set and sent as X-Admin-Token."""
+    expected = (os.getenv("ADMIN_TOKEN") or "").strip()
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not hmac.compare_digest((token or "").encode("utf-8"), expected.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/admin/vocab")
+def admin_vocab():
+    """Current vocabulary version and build time, plus the reload status."""
+    return {**_current_vocab().info(), "reload": dict(_reload_status)}
+
+
+@app.post("/admin/vocab/reload", status_code=202)
+def admin_vocab_reload(x_admin_token: Optional[str] = Header(default=None)):
+    """Rebuild the vocabulary in the background and swap it in when ready."""
+    _check_admin(x_admin_token)
+    started = start_vocab_reload()
+    return {"started": started, "current": _current_vocab().info(), "reload": dict(_reload_status)}
+
+
 @app.get("/debug/env")
 def debug_env():
     import os as _os
@@ -224,43 +502,82 @@ def debug_env():
     }
 
 
+@app.get("/retrieve")
+def retrieve(q: str, k: int = 5, mode: Optional[str] = None):
+    """Debug view of the grounding context, to compare retrieval modes on the same query."""
+    tf = _current_vocab().functions
+    start = time.perf_counter()
+    try:
+        rows = tf.retrieve_context(q, k=max(1, min(k, 50)), mode=(mode or "").strip().lower() or None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    return {"mode": mode or tf.retrieval_mode, "elapsed_ms": round(elapsed_ms, 3), "rows": rows}
+
+
 @app.get("/vocab", response_model=List[SearchResponseItem])
 def vocab(limit: int = 100):
-    df = vocab_df
-    if _bool_env("KID_SAFE_FILTER", False):
-        # Re-apply in case env changed after load (cheap call)
-        banned = ["sex", "sexual", "fuck", "fucking", "tits", "breast", "kill", "die", "suicide", "weapon", "gun", "drugs", "drug"]
-        extra = os.getenv("KID_SAFE_BANNED", "")
-        if extra.strip():
-            banned.extend([x.strip() for x in extra.split(",") if x.strip()])
-        df = TutorFunctions.filter_offensive(df, banned)
+    tf = _current_vocab().functions
+    df = tf.vocab
+    view = _kid_view(tf)
+    if view is not None:
+        # Cached view; reflects KID_SAFE_BANNED changes made after load
+        df = df.iloc[view.rows[:max(limit, 0)]]
     rows = df.head(limit).to_dict(orient="records")
     return rows
 
 
 @app.get("/search", response_model=List[SearchResponseItem])
-def search(q: Optional[str] = None, pos: Optional[str] = None, limit: int = 100):
-    df = functions.search(q)
-    if pos:
-        df = df[df["pos"].str.lower() == pos.lower()]
-    if _bool_env("KID_SAFE_FILTER", False):
-        banned = ["sex", "sexual", "fuck", "fucking", "tits", "breast", "kill", "die", "suicide", "weapon", "gun", "drugs", "drug"]
-        extra = os.getenv("KID_SAFE_BANNED", "")
-        if extra.strip():
-            banned.extend([x.strip() for x in extra.split(",") if x.strip()])
-        df = TutorFunctions.filter_offensive(df, banned)
+def search(q: Optional[str] = None, pos: Optional[str] = None, limit: int = 100, fuzzy: bool = False, max_distance: int = 2):
+    tf = _current_vocab().functions
+    # fuzzy=true matches romanized Sinhala within a small edit distance ("kohomda" -> "kohomada")
+    df = tf.search(q, fuzzy=fuzzy, max_distance=max(0, min(max_distance, 2)), pos=pos, view=_kid_view(tf))
     return df.head(limit).to_dict(orient="records")
 
 
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_response(chunks: AsyncIterator[str], on_error: Optional[Callable[[Exception], str]] = None) -> StreamingResponse:
+    """Server-sent events: ``data: {"text": ...}`` per chunk, then ``event: done``.
+
+    If the stream fails before any text was sent and ``on_error`` is given, its
+    text is sent instead (like the non-streaming fallbacks); otherwise an
+    ``event: error`` with ``{"message": ...}`` ends the stream.
+    """
+    async def events():
+        sent = False
+        try:
+            async for text in chunks:
+                sent = True
+                yield _sse({"text": text})
+        except Exception as e:
+            if on_error is None or sent:
+                yield _sse({"message": f"LLM error: {e}"}, event="error")
+                return
+            yield _sse({"text": on_error(e)})
+        yield _sse({}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Disable proxy buffering so chunks reach the browser as they are sent
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/translate")
-def translate(req: TranslateRequest):
+async def translate(req: TranslateRequest):
+    tf = _current_vocab().functions
     try:
-        gem = GeminiClient()
+        gem = get_gemini_client()
         # Provide light grounding from dataset for better consistency
-        ctx = functions.retrieve_context(req.text_si, k=5)
-        out = gem.translate(req.text_si, context=ctx, kid_safe=_bool_env("KID_SAFE_MODE", False))
-        if _bool_env("KID_SAFE_STRICT", False):
-            mod = gem.moderate_text(out)
+        ctx = tf.retrieve_context(req.text_si, k=5)
+        out = await gem.translate_async(req.text_si, context=ctx, kid_safe=bool_env("KID_SAFE_MODE", False))
+        if bool_env("KID_SAFE_STRICT", False):
+            mod = await gem.moderate_text_async(out)
             if not mod.get("safe", True):
                 raise HTTPException(status_code=406, detail={"message": "Response blocked by kid-safety policy", "reasons": mod.get("reasons", [])})
         return {"translation": out}
@@ -269,12 +586,13 @@ def translate(req: TranslateRequest):
 
 
 @app.post("/explain")
-def explain(req: ExplainRequest):
+async def explain(req: ExplainRequest):
+    tf = _current_vocab().functions
     try:
-        gem = GeminiClient()
+        gem = get_gemini_client()
         word_to_explain = req.english or req.sinhala
-        ctx = functions.retrieve_context(word_to_explain, k=5)
-        res = gem.explain_word(word_to_explain, context=ctx)
+        ctx = tf.retrieve_context(word_to_explain, k=5)
+        res = await gem.explain_word_async(word_to_explain, context=ctx)
         # Since the new prompt returns a markdown string, we don't need moderation checks here
         # as it's not returning structured data that could be misinterpreted.
         return {"explanation": res}
@@ -282,17 +600,31 @@ def explain(req: ExplainRequest):
         raise HTTPException(status_code=502, detail=f"LLM error: {e}")
 
 
+@app.post("/explain/stream")
+async def explain_stream(req: ExplainRequest):
+    """Streaming variant of /explain (server-sent events)."""
+    tf = _current_vocab().functions
+    try:
+        gem = get_gemini_client()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"LLM error: {e}")
+    word_to_explain = req.english or req.sinhala
+    ctx = tf.retrieve_context(word_to_explain, k=5)
+    return _sse_response(gem.explain_word_stream(word_to_explain, context=ctx))
+
+
 @app.post("/quiz")
-def quiz(req: QuizRequest):
+async def quiz(req: QuizRequest):
+    tf = _current_vocab().functions
     try:
         words_only = (req.mode.lower() == "words")
-        items = functions.sample_items(max(req.n, 1), words_only=words_only, max_words_si=req.max_words, max_words_en=req.max_words)
-        gem = GeminiClient()
-        qs = gem.generate_quiz(items, n=req.n, words_only=words_only, kid_safe=_bool_env("KID_SAFE_MODE", False))
-        if _bool_env("KID_SAFE_STRICT", False):
+        items = tf.sample_items(max(req.n, 1), words_only=words_only, max_words_si=req.max_words, max_words_en=req.max_words)
+        gem = get_gemini_client()
+        qs = await gem.generate_quiz_async(items, n=req.n, words_only=words_only, kid_safe=bool_env("KID_SAFE_MODE", False))
+        if bool_env("KID_SAFE_STRICT", False):
             # Join questions text and run a quick moderation; if unsafe, block
             joined = "\n".join([str(q) for q in qs])
-            mod = gem.moderate_text(joined)
+            mod = await gem.moderate_text_async(joined)
             if not mod.get("safe", True):
                 raise HTTPException(status_code=406, detail={"message": "Quiz blocked by kid-safety policy", "reasons": mod.get("reasons", [])})
         return {"questions": qs}
@@ -300,117 +632,240 @@ def quiz(req: QuizRequest):
         raise HTTPException(status_code=502, detail=f"LLM error: {e}")
 
 
-@app.post("/quiz/mcq", response_model=list[McqItem])
-@app.post("/quiz/mcq/", response_model=list[McqItem])
-def quiz_mcq(req: McqRequest):
-    # Determine if we should use the LLM for generation
-    use_llm_mcq = _bool_env("LLM_MCQ_GENERATION", True) # Default to True
+def _mcq_explain_deadline() -> float:
+    """Seconds /quiz/mcq waits for answer explanations (MCQ_EXPLAIN_DEADLINE, default 8)."""
+    return max(0.0, float_env("MCQ_EXPLAIN_DEADLINE", 8.0))
 
-    if use_llm_mcq:
-        try:
-            gem = GeminiClient(model_name="gemini-1.5-flash") # Use a fast model for this
-            items = gem.generate_mcq_with_llm(
-                n=req.n,
-                choices=req.choices,
-                kid_safe=_bool_env("KID_SAFE_MODE", False)
-            )
-            # If explanations requested, generate concise explanations
-            if req.explain:
-                try:
-                    for it in items:
-                        ans = it.get("answer")
-                        ctx = functions.retrieve_context(ans, k=5)
-                        expl = gem.explain_mcq_answer(ans, context=ctx, kid_safe=_bool_env("KID_SAFE_MODE", False))
-                        if _bool_env("KID_SAFE_STRICT", False):
-                            mod = gem.moderate_text(expl)
-                            if not mod.get("safe", True):
-                                expl = "(blocked by safety policy)"
-                        it["answer_explanation"] = expl
-                except Exception:
-                    pass
-            return items
-        except Exception as e:
-            print(f"LLM MCQ generation failed, falling back to local method. Error: {e}")
-            # Fallback to local generation if LLM fails
-            pass
 
-    # --- Local Fallback Generation ---
-    # Prepare filtered dataset if needed
-    df = vocab_df
-    if _bool_env("KID_SAFE_FILTER", False):
-        banned = ["sex", "sexual", "fuck", "fucking", "tits", "breast", "kill", "die", "suicide", "weapon", "gun", "drugs", "drug"]
-        extra = os.getenv("KID_SAFE_BANNED", "")
-        if extra.strip():
-            banned.extend([x.strip() for x in extra.split(",") if x.strip()])
-        df = TutorFunctions.filter_offensive(df, banned)
-    # Enforce strict single-word constraint (<=1 word each side) for MCQ clarity
-    import re as _re
-    def wc(s: str) -> int:
-        return len(_re.findall(r"\b\w+\b", s or "", flags=_re.UNICODE))
-    df_words = df[(df["sinhala"].apply(wc) <= 1) & (df["english"].apply(wc) <= 1)]
-    # If too few strictly single-word rows, fallback to original dataset but we'll truncate later
-    if df_words.shape[0] < max(3, req.n):
-        df_words = df
-    temp_funcs = TutorFunctions(df_words)
-    
-    # Choose generator based on 'simple' flag
-    if req.simple:
-        items = temp_funcs.gen_mcq_simple_words(n=req.n, choices=req.choices)
+async def _explain_mcq_items(tf: TutorFunctions, gem, items: list[dict]) -> None:
+    """Explain every MCQ answer, in place, within one per-request deadline.
+
+    Each batch of LLM_BATCH_SIZE answers is explained with one batched prompt
+    (and, under KID_SAFE_STRICT, moderated the same way) as its own task;
+    answers a batch reply mangles are retried one by one. Batches that finish
+    before the deadline keep their explanations; answers of late or failed
+    batches, and answers that still fail, get ``answer_explanation=None``.
+    """
+    kid_safe = bool_env("KID_SAFE_MODE", False)
+    strict = bool_env("KID_SAFE_STRICT", False)
+
+    async def explain_batch(batch: list[dict]) -> list[Optional[str]]:
+        pairs = [(it.get("answer"), tf.retrieve_context(it.get("answer"), k=5)) for it in batch]
+        expls: list[Optional[str]] = [
+            None if e.startswith("[Gemini Error") else e
+            for e in await gem.explain_mcq_answers_async(pairs, kid_safe=kid_safe)
+        ]
+        if strict:
+            idx = [i for i, e in enumerate(expls) if e]
+            mods = await gem.moderate_texts_async([expls[i] for i in idx])
+            for i, mod in zip(idx, mods):
+                if not mod.get("safe", True):
+                    expls[i] = "(blocked by safety policy)"
+        return expls
+
+    for it in items:
+        it["answer_explanation"] = None
+    if not items or _llm_unavailable():
+        return
+    size = batch_size()
+    tasks = {asyncio.create_task(explain_batch(items[i:i + size])): items[i:i + size] for i in range(0, len(items), size)}
+    done, pending = await asyncio.wait(tasks, timeout=_mcq_explain_deadline())
+    for task in pending:
+        task.cancel()
+    for task in done:
+        if task.exception() is not None:
+            print(f"MCQ explanations failed: {task.exception()!r}")
+            continue
+        for it, expl in zip(tasks[task], task.result()):
+            it["answer_explanation"] = expl
+
+
+def _mcq_first_word(text: str) -> str:
+    """First word of a Sinhala prompt, so the UI shows a word-only question."""
+    if not isinstance(text, str):
+        return ""
+    m = re.search(r"\b\w+\b", text)
+    return m.group(0) if m else text.strip()
+
+
+def _mcq_local(tf: TutorFunctions, n: int, choices: int, simple: bool) -> list[dict]:
+    """MCQs from the local generators (kid-safe view applied when configured)."""
+    view = _kid_view(tf)
+    # Enforce strict single-word constraint (<=1 word each side) for MCQ clarity;
+    # the generators fall back to the full dataset if too few single-word pairs exist
+    if simple:
+        items = tf.gen_mcq_simple_words(n=n, choices=choices, pairs_only=True, view=view)
     else:
-        items = temp_funcs.gen_mcq_strict_words(n=req.n, choices=req.choices)
-    # Post-process Sinhala to single word (first token) to ensure UI shows word-only prompt
-    def first_word(text: str) -> str:
-        if not isinstance(text, str):
-            return ""
-        m = _re.search(r"\b\w+\b", text)
-        return m.group(0) if m else text.strip()
+        items = tf.gen_mcq_strict_words(n=n, choices=choices, pairs_only=True, view=view)
     for it in items:
-        it["sinhala"] = first_word(it.get("sinhala", ""))
+        it["sinhala"] = _mcq_first_word(it.get("sinhala", ""))
+    return items
+
+
+_mcq_pool = McqPool.from_env()
+
+
+def _mcq_pool_key(choices: int, simple: bool) -> tuple:
+    return ("simple" if simple else "strict", choices, bool_env("KID_SAFE_MODE", False),
+            bool_env("KID_SAFE_STRICT", False), bool_env("KID_SAFE_FILTER", False))
+
+
+def _mcq_producer(choices: int, simple: bool):
+    """Producer for the MCQ pool: seed words from the local generator for this
+    mode, distractors from the LLM, moderated under KID_SAFE_STRICT."""
+    async def produce(n: int) -> list[dict]:
+        tf = _current_vocab().functions
+        seeds = _mcq_local(tf, 2 * n, choices, simple)
+        gem = get_gemini_client(model_name="gemini-1.5-flash") # Use a fast model for this
+        items = await gem.generate_mcq_with_llm_async(seeds, n=n, choices=choices, kid_safe=bool_env("KID_SAFE_MODE", False))
+        if bool_env("KID_SAFE_STRICT", False):
+            mods = await gem.moderate_texts_async([f"{it['sinhala']}: {', '.join(it['options'])}" for it in items])
+            items = [it for it, mod in zip(items, mods) if mod.get("safe", True)]
+        return items
+
+    return produce
+
+
+async def _mcq_items(tf: TutorFunctions, n: int, choices: int, simple: bool) -> list[dict]:
+    """MCQs with LLM-written distractors from the prefetch pool, topped up from
+    the local generators when the pool runs short."""
+    items: list[dict] = []
+    # Determine if we should use the LLM for generation
+    if bool_env("LLM_MCQ_GENERATION", True) and not _llm_unavailable(): # Default to True
+        produce = _mcq_producer(choices, simple)
+        if _mcq_pool.enabled:
+            items = _mcq_pool.take(_mcq_pool_key(choices, simple), n, produce)
+        else:
+            try:
+                items = (await produce(n))[:n]
+            except Exception as e:
+                print(f"LLM MCQ generation failed, falling back to local method. Error: {e}")
+
+    # --- Local Fallback Generation ---
+    if len(items) < n:
+        items += _mcq_local(tf, n - len(items), choices, simple)
+    return items
+
+
+@app.post("/quiz/mcq", response_model=list[McqItem])
+@app.post("/quiz/mcq/", response_model=list[McqItem])
+async def quiz_mcq(req: McqRequest):
+    tf = _current_vocab().functions
+    items = await _mcq_items(tf, req.n, req.choices, req.simple)
     if req.explain:
         try:
-            gem = GeminiClient()
-            # Explain each answer briefly (kid-safe style optionally) using concise helper
-            for it in items:
-                ans = it.get("answer")
-                ctx = functions.retrieve_context(ans, k=5)
-                expl = gem.explain_mcq_answer(ans, context=ctx, kid_safe=_bool_env("KID_SAFE_MODE", False))
-                if _bool_env("KID_SAFE_STRICT", False):
-                    mod = gem.moderate_text(expl)
-                    if not mod.get("safe", True):
-                        expl = "(blocked by safety policy)"
-                it["answer_explanation"] = expl
+            gem = get_gemini_client()
         except Exception:
             # Non-fatal: leave explanations None
-            pass
+            return items
+        await _explain_mcq_items(tf, gem, items)
     return items
 
 
+@app.get("/quiz/mcq/pool")
+def quiz_mcq_pool():
+    """MCQ prefetch pools: items ready per mode, and counters of served items,
+    requests the pool could not fully serve, produced items, duplicates and
+    failed LLM calls."""
+    return _mcq_pool.stats()
+
+
 @app.get("/lessons", response_model=List[SearchResponseItem])
 def lessons(pos: str | None = None, limit: int = 50):
-    df = vocab_df
+    tf = _current_vocab().functions
+    df = tf.vocab
     if pos:
-        df = df[df["pos"].str.lower() == pos.lower()]
+        df = df.iloc[tf.rows_for_pos(pos)[:max(limit, 0)]]
     return df.head(limit).to_dict(orient="records")
 
 
+def _parse_day(value: Optional[str]):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date() if value else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+
+
+@app.get("/word-of-the-day")
+def word_of_the_day(date: Optional[str] = None):
+    """Word of the day for ``date`` (YYYY-MM-DD, default today) from the
+    precomputed calendar. The pick depends only on the date and the vocabulary
+    version, so every worker serves the same word."""
+    current = _current_vocab()
+    tf = current.functions
+    return {**tf.get_word_of_the_day(_parse_day(date), current.version, _kid_view(tf)), "version": current.version}
+
+
+@app.get("/word-of-the-day/calendar")
+def word_of_the_day_calendar(start: Optional[str] = None, days: int = 7):
+    """Words of the day for ``days`` dates (1-366) from ``start`` (default today)."""
+    current = _current_vocab()
+    tf = current.functions
+    view = _kid_view(tf)
+    first = _parse_day(start) or datetime.now().date()
+    days = max(1, min(days, tf.WORD_OF_THE_DAY_DAYS))
+    return {
+        "version": current.version,
+        "days": [tf.get_word_of_the_day(first + timedelta(days=i), current.version, view) for i in range(days)],
+    }
+
+
 @app.get("/llm/ping")
-def llm_ping():
+async def llm_ping():
+    tf = _current_vocab().functions
     try:
-        gem = GeminiClient()
-        txt = gem.translate("හෙලෝ", context=functions.retrieve_context("හෙලෝ", k=3), kid_safe=_bool_env("KID_SAFE_MODE", False))
+        gem = get_gemini_client()
+        txt = await gem.translate_async("හෙලෝ", context=tf.retrieve_context("හෙලෝ", k=3), kid_safe=bool_env("KID_SAFE_MODE", False))
         return {"ok": True, "sample": txt[:40]}
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"LLM error: {e}")
 
 
+@app.get("/llm/cache")
+def llm_cache_stats():
+    """Hit/miss counters of the LLM response cache, overall and per endpoint,
+    plus how many requests joined an identical in-flight LLM call."""
+    cache = get_response_cache()
+    if cache is None:
+        return {"enabled": False, "coalescing": coalesce_stats()}
+    return {"enabled": True, **cache.stats(), "coalescing": coalesce_stats()}
+
+
+@app.get("/llm/circuit")
+def llm_circuit_stats():
+    """LLM circuit breaker state and counters (short-circuited calls, deadline
+    timeouts, slow calls) and hedged-call counters."""
+    return resilience_stats()
+
+
+@app.get("/admission")
+def admission_stats():
+    """Admission control: per-queue active and waiting requests (queue depth),
+    limits, and counters of admitted, shed, degraded (shed to a local fallback)
+    and rate-limited requests."""
+    return {
+        "enabled": _ADMISSION,
+        "queues": {name: q.stats() for name, q in _admission_queues.items()},
+        "clients": {name: len(b) if b is not None else None for name, b in _client_buckets.items()},
+    }
+
+
+@app.get("/llm/prompts")
+def llm_prompt_stats():
+    """Estimated prompt sizes and upstream latency per endpoint and per prompt-size
+    bucket, plus how many context rows the token budget kept, dropped or clipped."""
+    return prompt_stats()
+
+
 @app.post("/llm/answer")
-def llm_answer(req: AnswerRequest):
+async def llm_answer(req: AnswerRequest):
+    tf = _current_vocab().functions
     try:
-        ctx = functions.retrieve_context(req.question, k=max(1, min(req.k, 10)))
-        gem = GeminiClient()
-        ans = gem.answer_with_context(req.question, context=ctx, style="concise", kid_safe=_bool_env("KID_SAFE_MODE", False))
-        if _bool_env("KID_SAFE_STRICT", False):
-            mod = gem.moderate_text(ans)
+        ctx = tf.retrieve_context(req.question, k=max(1, min(req.k, 10)))
+        gem = get_gemini_client()
+        ans = await gem.answer_with_context_async(req.question, context=ctx, style="concise", kid_safe=bool_env("KID_SAFE_MODE", False))
+        if bool_env("KID_SAFE_STRICT", False):
+            mod = await gem.moderate_text_async(ans)
             if not mod.get("safe", True):
                 raise HTTPException(status_code=406, detail={"message": "Response blocked by kid-safety policy", "reasons": mod.get("reasons", [])})
         return {"answer": ans, "used": ctx}
@@ -422,97 +877,140 @@ class AgentInvokeRequest(BaseModel):
     input: str
     sessionId: Optional[str] = None
 
+def _agent_route(tf: TutorFunctions, req: AgentInvokeRequest) -> tuple[str, object]:
+    """Pick the agent for this input and prepare its arguments (local work only)."""
+    user_input = req.input.lower()
+    session_id = req.sessionId
+
+    # 1. Routing Logic
+    if "story" in user_input:
+        # Extract potential words for the story from the input
+        words_for_story = [w for w in user_input.replace("story", "").split() if w]
+        if not words_for_story:
+            # If no specific words, get some random ones from the vocab
+            words_for_story = [r['english'] for r in tf.sample_items(n=3, words_only=True)]
+        return "story", words_for_story
+
+    if "quiz" in user_input or "mcq" in user_input:
+        return "quiz", None
+
+    if "progress" in user_input or "score" in user_input or "level" in user_input or "summary" in user_input:
+        # Get the history for the current session
+        history = session_word_history.get(session_id, set())
+        return "summary", list(history)
+
+    # Default to the main "tutor" role: explaining the word/phrase
+
+    # Get the history for the current session
+    history = session_word_history.get(session_id, set())
+
+    # Find a new word that hasn't been used in this session
+    new_word_to_explain = req.input
+    if new_word_to_explain in history:
+        # The requested word has been used, find a new one
+        sampled_items = tf.sample_items(n=10, words_only=True)
+        for item in sampled_items:
+            if item['english'] not in history:
+                new_word_to_explain = item['english']
+                break
+        else:
+            # If all samples are in history, just pick one (edge case)
+            new_word_to_explain = sampled_items[0]['english'] if sampled_items else "learn"
+
+    # Update the session history
+    history.add(new_word_to_explain)
+    if session_id:
+        session_word_history[session_id] = history
+
+    ctx = tf.retrieve_context(new_word_to_explain, k=5)
+    return "explain", (new_word_to_explain, ctx)
+
+
+async def _agent_output(gem, route: str, arg) -> str:
+    if route == "story":
+        return await gem.kid_story_async(arg)
+
+    if route == "quiz":
+        # A prefetched LLM-written question when one is ready, else a local one
+        mcq_items = await _mcq_items(_current_vocab().functions, 1, 4, False)
+
+        if not mcq_items:
+            return "I couldn't think of a good quiz question right now. Please try again!"
+
+        item = mcq_items[0]
+
+        # Format it as a text-based quiz question
+        options_str = "\n".join([f"{i+1}. {opt}" for i, opt in enumerate(item['options'])])
+        return (
+            f"Here's a fun quiz question for you! 🧠\n\n"
+            f"What is the English word for **{item['sinhala']}**?\n\n"
+            f"{options_str}\n\n"
+            f"Think carefully! The correct answer is revealed below.\n\n"
+            f"**Answer:** ||{item['answer']}||" # Using spoiler tags for the answer
+        )
+
+    if route == "summary":
+        return await gem.summarize_session_async(arg)
+
+    word, ctx = arg
+    return await gem.explain_word_async(word, context=ctx)
+
+
+def _agent_error(e: Exception) -> str:
+    return f"Oh no! Something went wrong on my end. Please try asking in a different way. (Error: {e})"
+
+
 @app.post("/agent/invoke")
-def agent_invoke(req: AgentInvokeRequest):
+async def agent_invoke(req: AgentInvokeRequest):
     """
     This single endpoint mimics the behavior of the multi-agent graph from the Colab notebook.
     It uses keyword matching on the user's input to route to the appropriate LLM function.
     """
-    user_input = req.input.lower()
-    session_id = req.sessionId
-
+    tf = _current_vocab().functions
     try:
-        gem = GeminiClient()
-        
-        # 1. Routing Logic
-        if "story" in user_input:
-            # Extract potential words for the story from the input
-            words_for_story = [w for w in user_input.replace("story", "").split() if w]
-            if not words_for_story:
-                # If no specific words, get some random ones from the vocab
-                words_for_story = [r['english'] for r in functions.sample_items(n=3, words_only=True)]
-            
-            output = gem.kid_story(words_for_story)
-
-        elif "quiz" in user_input or "mcq" in user_input:
-            # Use the new LLM-based MCQ generation for a high-quality question
-            mcq_items = gem.generate_mcq_with_llm(n=1, choices=4, kid_safe=_bool_env("KID_SAFE_MODE", False))
-            
-            if not mcq_items:
-                 return {"output": "I couldn't think of a good quiz question right now. Please try again!"}
-
-            item = mcq_items[0]
-            
-            # Format it as a text-based quiz question
-            options_str = "\n".join([f"{i+1}. {opt}" for i, opt in enumerate(item['options'])])
-            output = (
-                f"Here's a fun quiz question for you! 🧠\n\n"
-                f"What is the English word for **{item['sinhala']}**?\n\n"
-                f"{options_str}\n\n"
-                f"Think carefully! The correct answer is revealed below.\n\n"
-                f"**Answer:** ||{item['answer']}||" # Using spoiler tags for the answer
-            )
-
-        elif "progress" in user_input or "score" in user_input or "level" in user_input or "summary" in user_input:
-            # Get the history for the current session
-            history = session_word_history.get(session_id, set())
-            output = gem.summarize_session(list(history))
-        
-        else:
-            # Default to the main "tutor" role: explaining the word/phrase
-            
-            # Get the history for the current session
-            history = session_word_history.get(session_id, set())
-            
-            # Find a new word that hasn't been used in this session
-            new_word_to_explain = req.input
-            if new_word_to_explain in history:
-                # The requested word has been used, find a new one
-                sampled_items = functions.sample_items(n=10, words_only=True)
-                for item in sampled_items:
-                    if item['english'] not in history:
-                        new_word_to_explain = item['english']
-                        break
-                else:
-                    # If all samples are in history, just pick one (edge case)
-                    new_word_to_explain = sampled_items[0]['english'] if sampled_items else "learn"
-
-            # Update the session history
-            history.add(new_word_to_explain)
-            if session_id:
-                session_word_history[session_id] = history
-
-            ctx = functions.retrieve_context(new_word_to_explain, k=5)
-            output = gem.explain_word(new_word_to_explain, context=ctx)
-
-        return {"output": output}
+        gem = get_gemini_client()
+        route, arg = _agent_route(tf, req)
+        return {"output": await _agent_output(gem, route, arg)}
 
     except Exception as e:
         # A single, robust fallback for any error
-        return {"output": f"Oh no! Something went wrong on my end. Please try asking in a different way. (Error: {e})"}
+        return {"output": _agent_error(e)}
+
+
+@app.post("/agent/invoke/stream")
+async def agent_invoke_stream(req: AgentInvokeRequest):
+    """Streaming variant of /agent/invoke: stories and explanations arrive as
+    they are generated; quiz and progress replies come as one chunk."""
+    tf = _current_vocab().functions
+
+    async def chunks() -> AsyncIterator[str]:
+        gem = get_gemini_client()
+        route, arg = _agent_route(tf, req)
+        if route == "story":
+            stream = gem.kid_story_stream(arg)
+        elif route == "explain":
+            stream = gem.explain_word_stream(arg[0], context=arg[1])
+        else:
+            yield await _agent_output(gem, route, arg)
+            return
+        async for text in stream:
+            yield text
+
+    return _sse_response(chunks(), on_error=_agent_error)
 
 
 @app.post("/kid/explain")
-def kid_explain(req: KidExplainRequest):
+async def kid_explain(req: KidExplainRequest):
+    tf = _current_vocab().functions
     try:
         # Check if we can initialize GeminiClient
         try:
-            gem = GeminiClient()
+            gem = get_gemini_client()
             word_to_explain = req.english or req.sinhala
-            if not word_to_explain:
-                 return _kid_explain_fallback("a word")
-            ctx = functions.retrieve_context(word_to_explain, k=5)
-            return gem.kid_explain(word=word_to_explain, context=ctx)
+            if not word_to_explain or _llm_unavailable():
+                 return _kid_explain_fallback(word_to_explain or "a word")
+            ctx = tf.retrieve_context(word_to_explain, k=5)
+            return await gem.kid_explain_async(word=word_to_explain, context=ctx)
         except Exception:
             # If GeminiClient fails to initialize, use fallback immediately
             return _kid_explain_fallback(req.english or req.sinhala or "a word")
@@ -523,7 +1021,8 @@ def kid_explain(req: KidExplainRequest):
 
 
 @app.get("/kid/explain")
-def kid_explain_get(english: Optional[str] = None, sinhala: Optional[str] = None):
+async def kid_explain_get(english: Optional[str] = None, sinhala: Optional[str] = None):
+    tf = _current_vocab().functions
     try:
         word_to_explain = english or sinhala
         if not word_to_explain:
@@ -531,9 +1030,11 @@ def kid_explain_get(english: Optional[str] = None, sinhala: Optional[str] = None
         
         # Check if we can initialize GeminiClient
         try:
-            gem = GeminiClient()
-            ctx = functions.retrieve_context(word_to_explain, k=5)
-            return gem.kid_explain(word=word_to_explain, context=ctx)
+            gem = get_gemini_client()
+            if _llm_unavailable():
+                return _kid_explain_fallback(word_to_explain)
+            ctx = tf.retrieve_context(word_to_explain, k=5)
+            return await gem.kid_explain_async(word=word_to_explain, context=ctx)
         except Exception:
             # If GeminiClient fails to initialize, use fallback immediately
             return _kid_explain_fallback(word_to_explain)
@@ -545,93 +1046,134 @@ def kid_explain_get(english: Optional[str] = None, sinhala: Optional[str] = None
 
 
 @app.post("/kid/feedback")
-def kid_feedback(req: KidFeedbackRequest):
+async def kid_feedback(req: KidFeedbackRequest):
     try:
-        gem = GeminiClient()
-        out = gem.kid_feedback(req.user_answer, req.correct_answer)
+        gem = get_gemini_client()
+        out = await gem.kid_feedback_async(req.user_answer, req.correct_answer)
         return {"feedback": out}
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"LLM error: {e}")
 
 
 @app.post("/kid/story")
-def kid_story(req: KidStoryRequest):
+async def kid_story(req: KidStoryRequest):
     try:
         # Check if we can initialize GeminiClient
         try:
-            gem = GeminiClient()
+            gem = get_gemini_client()
         except Exception:
             # If GeminiClient fails to initialize, use fallback immediately
             return {"story": _kid_story_fallback(req.words)}
+        if _llm_unavailable():
+            return {"story": _kid_story_fallback(req.words)}
         
-        out = gem.kid_story(req.words)
+        out = await gem.kid_story_async(req.words, sentences=req.sentences)
         return {"story": out}
     except Exception as e:
         # Fallback story so UI remains functional
         return {"story": _kid_story_fallback(req.words)}
 
 
+@app.post("/kid/story/stream")
+async def kid_story_stream(req: KidStoryRequest):
+    """Streaming variant of /kid/story (server-sent events); falls back to the
+    template story when the LLM is unavailable."""
+    def fallback(_e: Exception) -> str:
+        return _kid_story_fallback(req.words)
+
+    shed = _admission_shed.get()
+
+    async def chunks() -> AsyncIterator[str]:
+        if shed:
+            yield fallback(None)
+            return
+        gem = get_gemini_client()
+        async for text in gem.kid_story_stream(req.words, sentences=req.sentences):
+            yield text
+
+    return _sse_response(chunks(), on_error=fallback)
+
+
+# Terms /moderate/check always flags, anywhere in the text, without asking the model
+_CHECK_KEYWORDS = AhoCorasick(["kill", "sex", "drug", "suicide", "hate", "terror", "weapon"])
+
+
 @app.post("/moderate/check")
-def moderate_check(req: ModerateRequest):
+async def moderate_check(req: ModerateRequest):
+    if _CHECK_KEYWORDS.contains(req.text or ""):
+        return {"safe": False, "reasons": ["keyword_match"]}
     try:
-        gem = GeminiClient()
-        result = gem.moderate_text(req.text)
-        # Basic keyword scan as a second safety net
-        banned = ["kill", "sex", "drug", "suicide", "hate", "terror", "weapon"]
-        lowered = (req.text or "").lower()
-        if any(b in lowered for b in banned):
-            result["safe"] = False
-            reasons = set(result.get("reasons", []))
-            reasons.add("keyword_match")
-            result["reasons"] = list(reasons)
-        return result
+        gem = get_gemini_client()
+        return await gem.moderate_text_async(req.text)
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"LLM error: {e}")
 
 
+@app.get("/moderate/stats")
+def moderate_stats():
+    """Moderation pipeline counters: texts settled by the verdict cache or the
+    local pre-screen, and how many went to the LLM."""
+    return moderation_stats()
+
+
+def _dict_enrich_base(tf: TutorFunctions, req: DictEnrichRequest) -> tuple[dict, list]:
+    """Assemble the entry base from request or dataset."""
+    return entry_base(tf, {
+        "english": req.english or "",
+        "sinhala": req.sinhala or "",
+        "transliteration": req.transliteration or "",
+        "pos": req.pos or "",
+        "example_si": req.example_si or "",
+        "example_en": req.example_en or "",
+    })
+
+
+async def _stored_dict_entry(headword: str, level: str) -> Optional[dict]:
+    """Precomputed entry from the dictionary store, or None on a miss. Entries
+    stored without moderation are checked here under KID_SAFE_STRICT."""
+    store = get_dictionary_store()
+    if store is None or not headword_key(headword):
+        return None
+    hit = store.get(headword, level, bool_env("KID_SAFE_MODE", False))
+    if hit is None:
+        return None
+    entry, moderated = hit
+    if bool_env("KID_SAFE_STRICT", False) and not moderated and not _admission_shed.get():
+        try:
+            mod = await get_gemini_client().moderate_text_async(moderation_text(entry))
+        except Exception:
+            return entry  # Skip moderation if GeminiClient fails, as for live entries
+        if not mod.get("safe", True):
+            raise HTTPException(status_code=406, detail={"message": "Dictionary entry blocked by kid-safety policy", "reasons": mod.get("reasons", [])})
+    return entry
+
+
 @app.post("/dictionary/enrich")
-def dictionary_enrich(req: DictEnrichRequest):
+async def dictionary_enrich(req: DictEnrichRequest):
+    tf = _current_vocab().functions
+    base = {"english": (req.english or "").strip()}
     try:
-        # Assemble base from request or dataset
-        base = {
-            "english": (req.english or "").strip(),
-            "sinhala": (req.sinhala or "").strip(),
-            "transliteration": (req.transliteration or "").strip(),
-            "pos": (req.pos or "").strip(),
-            "example_si": (req.example_si or "").strip(),
-            "example_en": (req.example_en or "").strip(),
-        }
-        # If no direct fields given, try to find row from dataset by query
-        query = base["english"] or base["sinhala"]
-        ctx = []
-        if query:
-            ctx = functions.retrieve_context(query, k=8)
-            # Use the top context row to prefill any missing fields
-            if ctx:
-                top = ctx[0]
-                for k in ["english", "sinhala", "transliteration", "pos", "example_si", "example_en"]:
-                    if not base.get(k):
-                        base[k] = str(top.get(k, "") or "")
+        stored = await _stored_dict_entry(base["english"], req.level)
+        if stored is not None:
+            return stored
+        base, ctx = _dict_enrich_base(tf, req)
+        if _llm_unavailable():
+            return _dict_enrich_fallback(base, req.level)
         
         # Try to use LLM enricher, fallback if it fails
         try:
-            enricher = DictionaryEnricher(kid_safe=_bool_env("KID_SAFE_MODE", False))
-            out = enricher.enrich(base, context_rows=ctx, level=req.level)
+            enricher = DictionaryEnricher(kid_safe=bool_env("KID_SAFE_MODE", False))
+            out = await enricher.enrich_async(base, context_rows=ctx, level=req.level)
         except Exception:
             # If enricher fails, use simple fallback
             return _dict_enrich_fallback(base, req.level)
         
-        if _bool_env("KID_SAFE_STRICT", False):
+        if bool_env("KID_SAFE_STRICT", False):
             try:
-                gem = GeminiClient()
-                joined = "\n".join([
-                    out.get("definition_en", ""),
-                    " ".join(out.get("examples_en", [])),
-                    out.get("explanation_si", ""),
-                    " ".join(out.get("examples_si", [])),
-                ]).strip()
+                gem = get_gemini_client()
+                joined = moderation_text(out)
                 if joined:
-                    mod = gem.moderate_text(joined)
+                    mod = await gem.moderate_text_async(joined)
                     if not mod.get("safe", True):
                         raise HTTPException(status_code=406, detail={"message": "Dictionary entry blocked by kid-safety policy", "reasons": mod.get("reasons", [])})
             except Exception:
@@ -644,22 +1186,63 @@ def dictionary_enrich(req: DictEnrichRequest):
         return _dict_enrich_fallback(base, req.level)
 
 
+@app.post("/dictionary/enrich/batch")
+async def dictionary_enrich_batch(req: DictEnrichBatchRequest):
+    """Enrich a list of entries with batched prompts; entries the LLM cannot
+    produce (or that moderation blocks under KID_SAFE_STRICT) get the simple fallback."""
+    tf = _current_vocab().functions
+    kid_safe = bool_env("KID_SAFE_MODE", False)
+    store = get_dictionary_store()
+    hits = [store.get(it.english or "", req.level, kid_safe) if store and headword_key(it.english or "") else None for it in req.items]
+    entries: List[Optional[dict]] = [hit[0] if hit else None for hit in hits]
+    # Stored entries that were moderated offline skip moderation here
+    checked = {i for i, hit in enumerate(hits) if hit and hit[1]}
+    missing = [i for i, e in enumerate(entries) if e is None]
+    pairs = [_dict_enrich_base(tf, it) if i in missing else None for i, it in enumerate(req.items)]
+    if missing and not _llm_unavailable():
+        try:
+            enricher = DictionaryEnricher(kid_safe=kid_safe)
+            live = await enricher.enrich_many_async([pairs[i] for i in missing], level=req.level)
+        except Exception:
+            live = [None] * len(missing)
+        for i, e in zip(missing, live):
+            entries[i] = e
+    if bool_env("KID_SAFE_STRICT", False) and not _admission_shed.get():
+        try:
+            gem = get_gemini_client()
+            idx = [i for i, e in enumerate(entries) if e and i not in checked and moderation_text(e)]
+            mods = await gem.moderate_texts_async([moderation_text(entries[i]) for i in idx])
+            for i, mod in zip(idx, mods):
+                if not mod.get("safe", True):
+                    entries[i] = None
+        except Exception:
+            pass  # Skip moderation if GeminiClient fails
+    out = []
+    for i, e in enumerate(entries):
+        if e is None:
+            base = pairs[i][0] if pairs[i] else _dict_enrich_base(tf, req.items[i])[0]
+            e = _dict_enrich_fallback(base, req.level)
+        out.append(e)
+    return out
+
+
 @app.get("/dictionary/enrich")
-def dictionary_enrich_get(q: Optional[str] = None, level: str = "A1/A2"):
+async def dictionary_enrich_get(q: Optional[str] = None, level: str = "A1/A2"):
+    tf = _current_vocab().functions
     try:
         if not q:
             raise HTTPException(status_code=400, detail="Provide ?q=<word> to enrich")
-        ctx = functions.retrieve_context(q, k=8)
-        base = {"english": q}
-        if ctx:
-            top = ctx[0]
-            for k in ["english", "sinhala", "transliteration", "pos", "example_si", "example_en"]:
-                base.setdefault(k, str(top.get(k, "") or ""))
+        stored = await _stored_dict_entry(q, level)
+        if stored is not None:
+            return stored
+        base, ctx = entry_base(tf, {"english": q})
+        if _llm_unavailable():
+            return _dict_enrich_fallback(base, level)
         
         # Try to use LLM enricher, fallback if it fails
         try:
-            enricher = DictionaryEnricher(kid_safe=_bool_env("KID_SAFE_MODE", False))
-            out = enricher.enrich(base, context_rows=ctx, level=level)
+            enricher = DictionaryEnricher(kid_safe=bool_env("KID_SAFE_MODE", False))
+            out = await enricher.enrich_async(base, context_rows=ctx, level=level)
             return out
         except Exception:
             # If enricher fails, use simple fallback
@@ -672,5 +1255,5 @@ def dictionary_enrich_get(q: Optional[str] = None, level: str = "A1/A2"):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", 8000)))
+    uvicorn.run(app, host="0.0.0.0", port=int(float_env("PORT", 8000)))
 
@@ -2,7 +2,7 @@ import streamlit as st
 import pandas as pd
 from pathlib import Path
 from dotenv import load_dotenv
-from agent.llm import GeminiClient
+from agent.llm import get_gemini_client
 from agent.functions import TutorFunctions
 
 load_dotenv(override=True)  # prefer .env value in dev
@@ -30,7 +30,12 @@ if not DATA_PATH.exists():
 else:
     vocab = load_vocab(DATA_PATH)
 
-functions = TutorFunctions(vocab)
+@st.cache_resource
+def build_functions(df: pd.DataFrame) -> TutorFunctions:
+    # Indexes are built once per vocabulary, not on every Streamlit rerun
+    return TutorFunctions(df)
+
+functions = build_functions(vocab)
 st.title("Sinhala-English Tutor Agent")
 st.caption("Learn English with Sinhala support: words, examples, and practice.")
 
@@ -44,13 +49,6 @@ query = st.sidebar.text_input("Search (Sinhala/English/Transliteration)")
 filtered = functions.search(query)
 if filter_pos:
     filtered = filtered[filtered["pos"].isin(filter_pos)]
-if query:
-    q = query.strip().lower()
-    filtered = filtered[
-        filtered["sinhala"].str.contains(q, case=False, na=False) |
-        filtered["english"].str.contains(q, case=False, na=False) |
-        filtered["transliteration"].str.contains(q, case=False, na=False)
-    ]
 
 if mode == "Dictionary":
     st.subheader("Dictionary")
@@ -86,7 +84,7 @@ elif mode == "Flashcards":
             st.write("Example (EN):", row["example_en"]) 
         # Gemini explanation
         try:
-            gem = GeminiClient()
+            gem = get_gemini_client()
             exp = gem.explain_word(row["sinhala"], row["english"]).get("explanation", "")
             st.info(exp)
         except Exception as e:
@@ -126,7 +124,7 @@ elif mode == "Quiz":
         st.divider()
         # Generate extra quiz via Gemini
         try:
-            gem = GeminiClient()
+            gem = get_gemini_client()
             items = functions.sample_items(8)
             quiz = gem.generate_quiz(items, n=5)
             st.json(quiz)
@@ -0,0 +1,92 @@
+"""Throughput and latency of api/main.py routes, offline, with the stub LLM provider
+(or a recording via --provider replay).
+
+    python -m bench.api_load --scenario mcq-explain --requests 200 --concurrency 20 --latency-ms 300
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# (method, path, JSON body or query params) per scenario
+SCENARIOS = {
+    "health": ("GET", "/health", None),
+    "search": ("GET", "/search", {"q": "water"}),
+    "translate": ("POST", "/translate", {"text_si": "ගුරු"}),
+    "explain": ("POST", "/explain", {"sinhala": "ගුරු", "english": "teacher"}),
+    "mcq-explain": ("POST", "/quiz/mcq", {"n": 5, "explain": True}),
+    "kid-story": ("POST", "/kid/story", {"words": ["cat", "ball"]}),
+    "dictionary": ("GET", "/dictionary/enrich", {"q": "teacher"}),
+}
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(scenario: str, requests: int, concurrency: int) -> None:
+    import httpx
+    from api.main import app
+
+    method, path, payload = SCENARIOS[scenario]
+    kwargs = {"params": payload} if method == "GET" else {"json": payload}
+    latencies = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        async def one() -> None:
+            nonlocal errors
+            async with sem:
+                t = time.perf_counter()
+                resp = await client.request(method, path, **kwargs)
+                latencies.append(time.perf_counter() - t)
+                errors += resp.status_code >= 400
+
+        await one()  # warm up (vocabulary load, client creation)
+        latencies.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(requests)])
+        elapsed = time.perf_counter() - start
+
+    ms = [x * 1000 for x in latencies]
+    print(
+        f"{scenario}: {requests / elapsed:.1f} req/s  p50={statistics.median(ms):.1f} ms  "
+        f"p95={percentile(ms, 0.95):.1f} ms  p99={percentile(ms, 0.99):.1f} ms  errors={errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="translate")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--provider", choices=["stub", "replay"], default="stub")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Stub median latency")
+    parser.add_argument("--distribution", default="lognormal", help="Stub latency distribution")
+    parser.add_argument("--spread", type=float, default=0.5, help="Stub latency spread")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "LLM_PROVIDER": args.provider,
+        "LLM_STUB_LATENCY_MS": str(args.latency_ms),
+        "LLM_STUB_DISTRIBUTION": args.distribution,
+        "LLM_STUB_SPREAD": str(args.spread),
+    })
+    # Measure the upstream path rather than cache hits
+    os.environ.setdefault("LLM_CACHE", "0")
+    os.environ.setdefault("LLM_COALESCE", "0")
+    # All bench requests come from one client; don't rate-limit them
+    os.environ.setdefault("ADMISSION_LLM_RATE", "0")
+    os.environ.setdefault("ADMISSION_LOCAL_RATE", "0")
+    asyncio.run(run(args.scenario, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Requests/second of per-request GeminiClient construction vs the shared client registry,
+measured against a local stand-in for the Gemini REST endpoint.
+
+    python -m bench.llm_client_pool --requests 400 --threads 8
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench.standin import start_standin  # noqa: E402
+
+
+def run(label: str, make_client, requests: int, threads: int) -> float:
+    def one(i: int) -> str:
+        return make_client().translate(f"word {i}")
+
+    one(0)  # warm up
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for r in results if r.startswith("[Gemini Error"))
+    rps = requests / elapsed
+    print(f"{label:>10}: {rps:8.1f} req/s  ({elapsed * 1000 / requests:.2f} ms/req, errors={errors})")
+    return rps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Stand-in response delay")
+    args = parser.parse_args()
+
+    server, url = start_standin(latency_ms=args.latency_ms)
+    os.environ.update({"GEMINI_API_KEY": "standin-key", "GEMINI_TRANSPORT": "rest", "GEMINI_API_ENDPOINT": url})
+
+    from agent.llm import GeminiClient, get_gemini_client
+
+    unpooled = run("unpooled", GeminiClient, args.requests, args.threads)
+    pooled = run("pooled", get_gemini_client, args.requests, args.threads)
+    print(f"speedup: {pooled / unpooled:.2f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Local stand-in for the Gemini REST ``generateContent`` endpoint, for offline benchmarks."""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Tuple
+
+
+def start_standin(latency_ms: float = 0.0, jitter_ms: float = 0.0, text: str = "hello",
+                  reply: Optional[Callable[[str], str]] = None, chunk_ms: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stand-in on a free port; returns the server and its base URL.
+    ``reply`` maps the prompt to the reply text (default: always ``text``);
+    ``server.calls`` counts the requests served. ``streamGenerateContent``
+    sends the reply a few words at a time, ``chunk_ms`` apart."""
+
+    def candidate(out: str) -> dict:
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": out}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }]
+        }
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Keep-alive connections otherwise hit Nagle + delayed-ACK stalls (~40 ms)
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            payload = self.rfile.read(int(self.headers.get("content-length", 0) or 0))
+            with lock:
+                server.calls += 1
+            out = text
+            if reply is not None:
+                contents = json.loads(payload or b"{}").get("contents") or [{}]
+                out = reply("".join(p.get("text", "") for p in contents[-1].get("parts", [])))
+            delay = latency_ms + random.uniform(0, jitter_ms)
+            if delay > 0:
+                time.sleep(delay / 1000.0)
+            if "streamGenerateContent" in self.path:
+                self._stream(out)
+                return
+            body = json.dumps(candidate(out)).encode("utf-8")
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream(self, out: str) -> None:
+            # alt=sse sends server-sent events; otherwise a chunked JSON array
+            sse = "alt=sse" in self.path
+            words = out.split(" ")
+            pieces = [" ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "") for i in range(0, len(words), 4)]
+            self.send_response(200)
+            self.send_header("content-type", "text/event-stream" if sse else "application/json")
+            self.send_header("transfer-encoding", "chunked")
+            self.end_headers()
+            for i, piece in enumerate(pieces):
+                if i and chunk_ms > 0:
+                    time.sleep(chunk_ms / 1000.0)
+                if sse:
+                    self._chunk(f"data: {json.dumps(candidate(piece))}\r\n\r\n")
+                else:
+                    self._chunk(("[" if i == 0 else ",") + json.dumps(candidate(piece)))
+            if not sse:
+                self._chunk("]")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _chunk(self, data: str) -> None:
+            raw = data.encode("utf-8")
+            self.wfile.write(f"{len(raw):x}\r\n".encode("ascii") + raw + b"\r\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    lock = threading.Lock()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.calls = 0
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="gemini-standin", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
@@ -0,0 +1,42 @@
+"""Shared setup: the stub LLM provider and no on-disk caches, so the suite runs
+offline and leaves nothing behind in data/.cache."""
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+os.environ.update({
+    "LLM_PROVIDER": "stub",
+    "LLM_CACHE": "0",
+    "MODERATION_CACHE": "0",
+    "VOCAB_SNAPSHOT": "0",
+    "DICTIONARY_STORE": "0",
+    "MCQ_POOL_WARM": "0",
+})
+
+
+@pytest.fixture
+def vocab_df() -> pd.DataFrame:
+    """A small normalized vocabulary with single-word pairs and sentences."""
+    from agent.functions import TutorFunctions
+
+    rows = [
+        ("බල්ලා", "dog", "balla", "noun"),
+        ("පූසා", "cat", "pusa", "noun"),
+        ("ගස", "tree", "gasa", "noun"),
+        ("වතුර", "water", "wathura", "noun"),
+        ("පොත", "book", "potha", "noun"),
+        ("දුවනවා", "run", "duwanawa", "verb"),
+        ("කනවා", "eat", "kanawa", "verb"),
+        ("බොනවා", "drink", "bonawa", "verb"),
+        ("ලස්සන", "pretty", "lassana", "adj"),
+        ("මම ගෙදර යනවා", "i am going home", "mama gedara yanawa", ""),
+        ("ඔයාට කොහොමද", "how are you", "oyata kohomada", ""),
+    ]
+    df = pd.DataFrame(rows, columns=["sinhala", "english", "transliteration", "pos"])
+    return TutorFunctions.normalize(df)
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+from agent.cache import ResponseCache
+
+
+def test_async_tier_round_trips_through_sqlite(tmp_path):
+    path = tmp_path / "llm.sqlite3"
+
+    async def scenario():
+        cache = ResponseCache(path=path)
+        assert await cache.get_async("k", "translate") is None
+        await cache.set_async("k", "value")
+        assert await cache.get_async("k", "translate") == "value"
+        # A fresh instance (another worker) only has the disk tier
+        return await ResponseCache(path=path).get_async("k", "translate"), cache.stats()
+
+    value, stats = asyncio.run(scenario())
+    assert value == "value"
+    assert stats["endpoints"]["translate"] == {"hits": 1, "misses": 1}
+
+
+def test_async_disk_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    cache = ResponseCache(path=tmp_path / "llm.sqlite3")
+    threads = []
+    for name in ("_disk_get", "_disk_set"):
+        original = getattr(cache, name)
+
+        def spy(*args, _original=original):
+            threads.append(threading.current_thread())
+            return _original(*args)
+
+        monkeypatch.setattr(cache, name, spy)
+
+    async def scenario():
+        await cache.get_async("k")
+        await cache.set_async("k", "v")
+
+    asyncio.run(scenario())
+    assert len(threads) == 2
+    assert all(t is not threading.main_thread() for t in threads)
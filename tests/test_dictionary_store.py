@@ -0,0 +1,68 @@
+import pytest
+
+from agent import dictionary_store
+from agent.dictionary_store import DictionaryStore, run_enrichment
+from agent.functions import TutorFunctions
+
+
+class _FakeEnricher:
+    """Entries for every headword; a batch containing "boom" raises and
+    "fail" gets no entry."""
+
+    calls = []
+
+    def __init__(self, kid_safe=False):
+        pass
+
+    def enrich_many(self, items, level="A1/A2"):
+        words = [base["english"] for base, _ in items]
+        self.calls.append(words)
+        if "boom" in words:
+            raise RuntimeError("upstream exploded")
+        return [None if w == "fail" else {"english": w, "definition_en": f"a {w}"} for w in words]
+
+
+class _FakeModerator:
+    def moderate_texts(self, texts, allow_none=False):
+        assert allow_none
+        return [None if "unsure" in t else {"safe": "bad" not in t, "reasons": []} for t in texts]
+
+
+@pytest.fixture
+def tf(vocab_df):
+    return TutorFunctions(vocab_df)
+
+
+@pytest.fixture(autouse=True)
+def fake_llm(monkeypatch):
+    _FakeEnricher.calls = []
+    monkeypatch.setattr(dictionary_store, "DictionaryEnricher", _FakeEnricher)
+    monkeypatch.setattr("agent.llm.get_gemini_client", lambda: _FakeModerator())
+
+
+def _run(tf, store, headwords, **kw):
+    return run_enrichment(tf, store, headwords, workers=2, rate=1000.0, batch_size=2, **kw)
+
+
+def test_failed_batch_counts_its_own_size_and_is_retried(tf, tmp_path):
+    store = DictionaryStore(tmp_path / "dict.sqlite3")
+    # Batches: [dog, cat], [tree, fail], [boom] (the short last batch raises)
+    counts = _run(tf, store, ["dog", "cat", "tree", "fail", "boom"])
+    assert counts == {"total": 5, "skipped": 0, "stored": 3, "blocked": 0, "failed": 2, "no_verdict": 0}
+    assert store.get("dog", "A1/A2", False)[0]["definition_en"] == "a dog"
+
+    _FakeEnricher.calls = []
+    counts = _run(tf, store, ["dog", "cat", "tree", "fail", "boom"])
+    # Resume: only the headwords that were not stored are attempted again
+    assert counts["skipped"] == 3
+    assert sorted(w for batch in _FakeEnricher.calls for w in batch) == ["boom", "fail"]
+    assert counts["failed"] == 2
+
+
+def test_moderation_blocks_and_leaves_unsettled_entries_for_the_next_run(tf, tmp_path):
+    store = DictionaryStore(tmp_path / "dict.sqlite3")
+    counts = _run(tf, store, ["dog", "bad", "unsure"], moderate=True)
+    assert (counts["stored"], counts["blocked"], counts["no_verdict"]) == (1, 1, 1)
+    assert store.get("dog", "A1/A2", False) == ({"english": "dog", "definition_en": "a dog"}, True)
+    assert store.get("bad", "A1/A2", False) is None
+    assert store.done("A1/A2", False) == {"dog", "bad"}
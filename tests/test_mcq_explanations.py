@@ -0,0 +1,42 @@
+import asyncio
+
+from agent.functions import TutorFunctions
+
+
+class _FakeClient:
+    """Explains each answer as "about <answer>"; batches containing "slow" hang."""
+
+    def __init__(self):
+        self.moderated = []
+
+    async def explain_mcq_answers_async(self, pairs, kid_safe=False):
+        if any(answer == "slow" for answer, _ in pairs):
+            await asyncio.sleep(30)
+        return [f"about {answer}" for answer, _ in pairs]
+
+    async def moderate_texts_async(self, texts):
+        self.moderated.extend(texts)
+        return [{"safe": "bad" not in t, "reasons": []} for t in texts]
+
+
+def _explain(vocab_df, answers, monkeypatch, strict=False):
+    from api import main
+
+    monkeypatch.setenv("LLM_BATCH_SIZE", "2")
+    monkeypatch.setenv("MCQ_EXPLAIN_DEADLINE", "0.2")
+    monkeypatch.setenv("KID_SAFE_STRICT", "1" if strict else "0")
+    monkeypatch.setattr(main, "_llm_unavailable", lambda: False)
+    items = [{"answer": a} for a in answers]
+    asyncio.run(main._explain_mcq_items(TutorFunctions(vocab_df), _FakeClient(), items))
+    return [it["answer_explanation"] for it in items]
+
+
+def test_finished_batches_keep_explanations_after_deadline(vocab_df, monkeypatch):
+    # Batches of two: [dog, cat] and [tree, book] finish, [slow, eat] misses the deadline
+    expls = _explain(vocab_df, ["dog", "cat", "slow", "eat", "tree", "book"], monkeypatch)
+    assert expls == ["about dog", "about cat", None, None, "about tree", "about book"]
+
+
+def test_strict_mode_moderates_each_batch(vocab_df, monkeypatch):
+    expls = _explain(vocab_df, ["dog", "bad", "cat"], monkeypatch, strict=True)
+    assert expls == ["about dog", "(blocked by safety policy)", "about cat"]
@@ -0,0 +1,55 @@
+import asyncio
+
+import httpx
+
+from agent.mcq_pool import McqPool
+
+
+def test_least_recently_used_idle_pools_are_dropped():
+    async def produce(n):
+        return []
+
+    async def run():
+        pool = McqPool(size=4, max_keys=2, retry_s=0.0)
+        pool.take("a", 1, produce)
+        pool.take("b", 1, produce)
+        await asyncio.sleep(0.05)
+        pool.take("a", 1, produce)
+        pool.take("c", 1, produce)
+        return [p["key"] for p in pool.stats()["pools"]]
+
+    assert asyncio.run(run()) == ["a", "c"]
+
+
+def test_pools_refilling_are_kept_past_max_keys():
+    async def produce(n):
+        await asyncio.sleep(30)
+        return []
+
+    async def run():
+        pool = McqPool(size=4, max_keys=1)
+        pool.take("a", 1, produce)
+        pool.take("b", 1, produce)
+        keys = [p["key"] for p in pool.stats()["pools"]]
+        for slot in list(pool._slots.values()):
+            slot.task.cancel()
+        return keys
+
+    assert asyncio.run(run()) == ["a", "b"]
+
+
+def test_mcq_request_bounds(monkeypatch):
+    from api import main
+
+    monkeypatch.setenv("LLM_MCQ_GENERATION", "0")
+
+    async def post(body):
+        transport = httpx.ASGITransport(app=main.app, client=("10.0.1.1", 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/quiz/mcq", json=body)
+
+    for body in ({"choices": 1}, {"choices": 50}, {"n": 0}, {"n": 1000}):
+        assert asyncio.run(post(body)).status_code == 422, body
+    res = asyncio.run(post({"n": 3, "choices": 6}))
+    assert res.status_code == 200
+    assert all(len(it["options"]) <= 6 for it in res.json())
@@ -0,0 +1,35 @@
+from agent.moderation import LEXICON, LocalScreen, local_screen_from_env
+
+
+def test_default_settles_text_without_terms_as_safe():
+    screen = LocalScreen(LEXICON)
+    long_text = " ".join(["word"] * 30)
+    assert screen.screen(long_text) == {"safe": True, "reasons": []}
+    assert screen.screen("you should k1ll yourself") == {"safe": True, "reasons": []}
+
+
+def test_strong_terms_are_unsafe_and_mild_ones_deferred():
+    screen = LocalScreen(LEXICON, safe_below=0.05)
+    verdict = screen.screen("fuck you")
+    assert verdict is not None and verdict["safe"] is False and verdict["reasons"]
+    assert screen.screen("Plants die without water") is None
+
+
+def test_safe_below_defers_the_low_confidence_band_to_the_llm():
+    screen = LocalScreen(LEXICON, safe_below=0.05)
+    assert screen.screen("the cat sat on the mat") == {"safe": True, "reasons": []}
+    # No listed term, but disguised words or long free text score above safe_below
+    assert screen.matches("you should k1ll yourself") == {}
+    assert screen.screen("you should k1ll yourself") is None
+    assert screen.screen(" ".join(["word"] * 30)) is None
+    assert screen.score(" ".join(["word"] * 30)) > screen.score("the cat sat on the mat")
+
+
+def test_safe_below_comes_from_the_env_and_changes_the_version(monkeypatch):
+    monkeypatch.delenv("MODERATION_SAFE_BELOW", raising=False)
+    off = local_screen_from_env()
+    assert off.safe_below is None
+    monkeypatch.setenv("MODERATION_SAFE_BELOW", "0.05")
+    on = local_screen_from_env()
+    assert on.safe_below == 0.05
+    assert on.version != off.version
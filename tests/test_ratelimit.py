@@ -0,0 +1,39 @@
+import asyncio
+
+import httpx
+
+from agent import ratelimit
+from agent.ratelimit import KeyedBuckets
+
+
+def test_idle_buckets_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    buckets = KeyedBuckets(rate=1.0, burst=2.0)
+    assert buckets.try_acquire("ip:a") and buckets.try_acquire("ip:a")
+    assert not buckets.try_acquire("ip:a")
+    buckets.try_acquire("ip:b")
+    assert len(buckets) == 2
+    # Both buckets have been idle for a full refill (burst / rate seconds)
+    now[0] += 2.0
+    buckets.try_acquire("ip:c")
+    assert len(buckets) == 1
+    assert buckets.try_acquire("ip:a")
+
+
+def test_buckets_are_keyed_on_the_peer_ip_not_the_session_header(monkeypatch):
+    from api import main
+
+    monkeypatch.setitem(main._client_buckets, "local", KeyedBuckets(rate=0.001, burst=2.0))
+
+    async def statuses(ip, sessions):
+        transport = httpx.ASGITransport(app=main.app, client=(ip, 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [
+                (await client.get("/search", params={"q": "dog"}, headers={"X-Session-Id": s})).status_code
+                for s in sessions
+            ]
+
+    # A fresh session id per request does not buy a fresh budget
+    assert asyncio.run(statuses("10.0.0.1", ["s1", "s2", "s3"])) == [200, 200, 429]
+    assert asyncio.run(statuses("10.0.0.2", ["s1"])) == [200]
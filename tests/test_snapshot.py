@@ -0,0 +1,42 @@
+import pickle
+
+from agent import snapshot
+from agent.functions import TutorFunctions
+from agent.store import StringColumn
+
+
+def _write_csv(df, tmp_path):
+    path = tmp_path / "vocab.csv"
+    df.to_csv(path, index=False)
+    return path
+
+
+def test_snapshot_reused_until_version_changes(vocab_df, tmp_path, monkeypatch):
+    source = _write_csv(vocab_df, tmp_path)
+    cache_dir = tmp_path / "cache"
+    params = snapshot.vocab_params(compact=True)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return TutorFunctions(vocab_df.copy(), compact=True)
+
+    snapshot.load_or_build(source, params, build, cache_dir)
+    snapshot.load_or_build(source, params, build, cache_dir)
+    assert len(builds) == 1
+
+    monkeypatch.setattr(snapshot, "SNAPSHOT_VERSION", snapshot.SNAPSHOT_VERSION + 1)
+    snapshot.load_or_build(source, params, build, cache_dir)
+    assert len(builds) == 2
+    # The superseded snapshot is removed
+    assert len(list(cache_dir.glob("vocab-*.snapshot"))) == 1
+
+
+def test_compact_layout_survives_pickling(vocab_df):
+    tf = pickle.loads(pickle.dumps(TutorFunctions(vocab_df, compact=True)))
+    assert isinstance(tf._all_options, StringColumn)
+    assert all(isinstance(opts, StringColumn) for opts in tf._pos_options.values())
+    assert isinstance(tf.en_first_word, StringColumn)
+    item = tf.gen_mcq(n=1, choices=4)[0]
+    assert len(item["options"]) == 4
+    assert item["options"][item["answer_index"]] == item["answer"]
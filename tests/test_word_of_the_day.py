@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_SCRIPT = """
+import datetime, json, random, sys
+import numpy as np
+import pandas as pd
+sys.path.insert(0, sys.argv[1])
+from agent.functions import TutorFunctions
+
+# Different global RNG state in every process must not change the picks
+random.seed(int(sys.argv[3]))
+np.random.seed(int(sys.argv[3]))
+tf = TutorFunctions(pd.read_csv(sys.argv[2], keep_default_na=False))
+start = datetime.date(2026, 1, 1)
+calendar = tf.word_of_the_day_calendar(start, 30, version="v1")
+print(json.dumps({
+    "calendar": {d.isoformat(): r for d, r in calendar.items()},
+    "outside": tf.get_word_of_the_day(datetime.date(2031, 6, 1), version="v1")["english"],
+    "other_version": [r for r in tf.word_of_the_day_calendar(start, 30, version="v2").values()],
+}))
+"""
+
+
+def test_word_of_the_day_is_the_same_in_every_process(vocab_df, tmp_path):
+    csv = tmp_path / "vocab.csv"
+    vocab_df.to_csv(csv, index=False)
+    runs = []
+    for seed in ("1", "2", "3"):
+        env = {**os.environ, "PYTHONHASHSEED": seed}
+        out = subprocess.run(
+            [sys.executable, "-c", _SCRIPT, str(ROOT), str(csv), seed],
+            env=env, capture_output=True, text=True, check=True, timeout=120,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    assert runs[0] == runs[1] == runs[2]
+    assert len(runs[0]["calendar"]) == 30
+    # A new vocabulary version gives a new calendar
+    assert list(runs[0]["calendar"].values()) != runs[0]["other_version"]
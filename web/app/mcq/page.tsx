@@ -1,6 +1,7 @@
 "use client";
 import { useEffect, useState } from "react";
 import axios from "axios";
+import { streamText } from "../sse";
 import { useRouter, useSearchParams } from "next/navigation";
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
@@ -95,8 +96,9 @@ export default function MCQPage() {
     setExplainLoading(true);
     try {
       const { sinhala, answer } = mcq[i];
-      const { data } = await axios.post(`${API_URL}/explain`, { sinhala, english: answer });
-      setExplainCache(prev => ({ ...prev, [i]: data.explanation || "" }));
+      // Render the explanation as it streams in
+      await streamText(`${API_URL}/explain/stream`, { sinhala, english: answer },
+        text => setExplainCache(prev => ({ ...prev, [i]: text })));
     } catch (e: any) {
       setExplainCache(prev => ({ ...prev, [i]: `Error: ${e?.message || 'explain failed'}` }));
     } finally {
@@ -140,8 +142,9 @@ export default function MCQPage() {
     setStoryLoading(true);
     setStoryError("");
     try {
-      const { data } = await axios.post(`${API_URL}/kid/story`, { words, sentences: 3 });
-      setStory((data?.story || "").trim());
+      setStory("");
+      const full = await streamText(`${API_URL}/kid/story/stream`, { words, sentences: 3 }, text => setStory(text));
+      setStory(full.trim());
     } catch (e: any) {
       setStoryError(e?.message || "Story failed");
     } finally {
@@ -199,7 +202,7 @@ export default function MCQPage() {
                 <span style={{ color: '#999' }}>Kid explanation loading…</span>
               )
             ) : (
-              current.answer_explanation ? current.answer_explanation : (explainLoading ? '⏳ Loading…' : (explainCache[idx] || 'Explanation pending…'))
+              current.answer_explanation ? current.answer_explanation : (explainCache[idx] || (explainLoading ? '⏳ Loading…' : 'Explanation pending…'))
             )}
           </div>
           <div style={{ display: 'flex', gap: 8, marginTop: 14, flexWrap: 'wrap' }}>
@@ -214,7 +217,7 @@ export default function MCQPage() {
       {kidMode && (
         <div style={{ ...styles.card, background: '#fffaf3' }}>
           <div style={{ fontWeight: 700, marginBottom: 8 }}>📖 කුඩා කථාව</div>
-          {storyLoading ? (
+          {storyLoading && !story ? (
             <div>⏳ කථාව බනිනවා…</div>
           ) : story ? (
             <div style={{ whiteSpace: 'pre-wrap', fontSize: 16, lineHeight: 1.5 }}>{story}</div>
@@ -1,7 +1,7 @@
 "use client";
 import { useState } from "react";
 import { useRouter } from "next/navigation";
-import axios from "axios";
+import { streamText } from "./sse";
 import ReactMarkdown from 'react-markdown';
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
@@ -114,19 +114,19 @@ export default function HomePage() {
     setLoading(true);
 
     try {
-      // Unified endpoint that routes to the correct agent on the backend
-      const { data } = await axios.post(`${API_URL}/agent/invoke`, {
+      // Unified endpoint that routes to the correct agent on the backend;
+      // the streaming variant lets the reply render as it is generated
+      const output = await streamText(`${API_URL}/agent/invoke/stream`, {
         input: query,
         // We can pass memory/state if we build that feature in the future
-      });
-      
-      // The new endpoint returns a single 'output' field with the agent's response
-      const agentResponse = data.output || "Sorry, I didn't understand that. Can you try asking in a different way?";
+      }, text => setMessages([...newMessages, { sender: "agent", text }]));
+
+      const agentResponse = output || "Sorry, I didn't understand that. Can you try asking in a different way?";
       
       setMessages([...newMessages, { sender: "agent", text: agentResponse }]);
 
     } catch (e: any) {
-      const errorMsg = e?.response?.data?.detail || "An error occurred with the agent.";
+      const errorMsg = e?.message || "An error occurred with the agent.";
       setMessages([...newMessages, { sender: "agent", text: `Error: ${errorMsg}` }]);
     } finally {
       setLoading(false);
@@ -0,0 +1,41 @@
+// Reads the backend's server-sent-event streams (POST /explain/stream, /kid/story/stream,
+// /agent/invoke/stream). Each `data: {"text": ...}` event is passed to onText as it arrives;
+// resolves with the full text once `event: done` is received.
+export async function streamText(url: string, body: unknown, onText: (text: string) => void): Promise<string> {
+  const res = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify(body),
+  });
+  if (!res.ok || !res.body) {
+    throw new Error(`HTTP ${res.status}`);
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let full = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep: number;
+    while ((sep = buffer.indexOf("\n\n")) >= 0) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      const payload = data ? JSON.parse(data) : {};
+      if (event === "error") throw new Error(payload.message || "stream failed");
+      if (event === "done") return full;
+      if (payload.text) {
+        full += payload.text;
+        onText(full);
+      }
+    }
+  }
+  return full;
+}